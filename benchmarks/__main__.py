@@ -0,0 +1,103 @@
+"""Command line entry point: python -m benchmarks"""
+
+import argparse
+import os
+import sys
+from benchmarks.config import BenchmarkConfig
+from benchmarks.runner import (
+    InProcessTransport,
+    WSGIServerTransport,
+    compare,
+    format_report,
+    load_baselines,
+    prepare,
+    run_scenario,
+    save_baseline,
+)
+from benchmarks.workloads import SCENARIOS
+from project import admission
+
+DEFAULT_BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the online shop API")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="mixed")
+    parser.add_argument(
+        "--mode", choices=["inprocess", "wsgi", "both"], default="both"
+    )
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--buyers", type=int, default=200)
+    parser.add_argument("--sellers", type=int, default=20)
+    parser.add_argument("--products-per-seller", type=int, default=50)
+    parser.add_argument("--baselines", default=DEFAULT_BASELINES)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="Allowed relative slowdown before a metric counts as a regression",
+    )
+    args = parser.parse_args(argv)
+    baselines_path = os.path.abspath(args.baselines)
+
+    modes = ["inprocess", "wsgi"] if args.mode == "both" else [args.mode]
+    regressions = []
+    for mode in modes:
+        # Reseed per mode so both runs start from an identical database
+        app, ctx = prepare(
+            BenchmarkConfig,
+            args.buyers,
+            args.sellers,
+            args.products_per_seller,
+            args.seed,
+        )
+        # A server thread per client thread, plus the ones kept for checkout
+        app.config["SERVER_THREADS"] = (
+            args.concurrency + app.config["ADMISSION_CHECKOUT_RESERVE"]
+        )
+        admission.resize(app)
+        transport = (
+            InProcessTransport(app) if mode == "inprocess" else WSGIServerTransport(app)
+        )
+        transport.start()
+        try:
+            result = run_scenario(
+                app,
+                transport,
+                ctx,
+                args.scenario,
+                args.requests,
+                args.concurrency,
+                args.seed,
+            )
+        finally:
+            transport.stop()
+
+        key = f"{args.scenario}:{mode}"
+        print(f"\n== {key} ({args.requests} requests, concurrency {args.concurrency})")
+        if result["skipped"]:
+            print(f"skipped (endpoints missing): {', '.join(result['skipped'])}")
+        print(format_report(result["report"]))
+
+        if args.save_baseline:
+            save_baseline(baselines_path, key, result["report"])
+            print(f"baseline saved to {baselines_path}")
+            continue
+
+        baseline = load_baselines(baselines_path).get(key)
+        if baseline is None:
+            print("no baseline recorded; run with --save-baseline")
+            continue
+        found = compare(result["report"], baseline, args.tolerance)
+        for line in found:
+            print(f"REGRESSION {key}: {line}")
+        regressions.extend(found)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
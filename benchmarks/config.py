@@ -0,0 +1,20 @@
+"""Benchmark configuration"""
+
+import os
+import tempfile
+from project.config.settings import TestingConfig
+
+
+class BenchmarkConfig(TestingConfig):
+    """Testing configuration pointed at a throwaway benchmark database"""
+
+    BENCH_DIR = os.environ.get(
+        "BENCH_DIR", os.path.join(tempfile.gettempdir(), "online_shop_bench")
+    )
+    SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(BENCH_DIR, 'bench.db')}"
+    SQLALCHEMY_ENGINE_OPTIONS = {"connect_args": {"timeout": 30}}
+
+    # Keep login storms CPU-bound like production, but cheap enough that a
+    # run finishes in seconds. Regressions are judged against a baseline
+    # recorded with the same setting.
+    BCRYPT_LOG_ROUNDS = int(os.environ.get("BENCH_BCRYPT_ROUNDS", 6))
@@ -0,0 +1,278 @@
+"""Benchmark runner: drives workloads in-process or over a local WSGI server"""
+
+import http.client
+import io
+import json
+import os
+import random
+import threading
+import time
+from flask_jwt_extended import create_access_token
+from benchmarks.workloads import SCENARIOS, WORKLOADS, multipart_body
+
+METRICS = ("p50", "p95", "p99")
+# Operations with fewer samples than this are too noisy to flag
+MIN_SAMPLES = 20
+
+
+class BenchContext:
+    """Seeded ids plus pre-issued access tokens shared by all workers"""
+
+    def __init__(self, seeded, password, tokens):
+        self.buyer_ids = seeded["buyer_ids"]
+        self.seller_ids = seeded["seller_ids"]
+        self.product_ids = seeded["product_ids"]
+        self.products_by_seller = seeded["products_by_seller"]
+        self.password = password
+        self.tokens = tokens
+
+    def token_for(self, user_id):
+        return self.tokens[user_id]
+
+
+class InProcessTransport:
+    """Calls the WSGI app directly through Flask's test client"""
+
+    name = "inprocess"
+
+    def __init__(self, app):
+        self.app = app
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def session(self):
+        return InProcessSession(self.app.test_client())
+
+
+class InProcessSession:
+    def __init__(self, client):
+        self.client = client
+
+    def send(self, call):
+        kwargs = {"headers": call.headers}
+        if call.json is not None:
+            kwargs["json"] = call.json
+        if call.files:
+            kwargs["data"] = {
+                field: (io.BytesIO(content), filename)
+                for field, (filename, content) in call.files.items()
+            }
+            kwargs["content_type"] = "multipart/form-data"
+        response = self.client.open(call.path, method=call.method, **kwargs)
+        response.close()
+        return response.status_code
+
+
+class WSGIServerTransport:
+    """Serves the app on an ephemeral local port and talks real HTTP to it"""
+
+    name = "wsgi"
+
+    def __init__(self, app, host="127.0.0.1"):
+        self.app = app
+        self.host = host
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.server = make_server(
+            self.host, 0, self.app, threaded=True, request_handler=QuietHandler
+        )
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.thread.join()
+
+    def session(self):
+        return HTTPSession(self.host, self.server.server_port)
+
+
+class HTTPSession:
+    def __init__(self, host, port):
+        self.connection = http.client.HTTPConnection(host, port, timeout=60)
+
+    def send(self, call):
+        headers = dict(call.headers)
+        body = None
+        if call.json is not None:
+            body = json.dumps(call.json).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        elif call.files:
+            headers["Content-Type"], body = multipart_body(call.files)
+        try:
+            self.connection.request(call.method, call.path, body=body, headers=headers)
+            response = self.connection.getresponse()
+        except (http.client.HTTPException, ConnectionError):
+            # The dev server may drop keep-alive connections; retry once fresh
+            self.connection.close()
+            self.connection.request(call.method, call.path, body=body, headers=headers)
+            response = self.connection.getresponse()
+        response.read()
+        return response.status
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(samples, elapsed):
+    """Reduce ``{op: [(seconds, status), ...]}`` to latency/throughput stats"""
+    report = {}
+    everything = []
+    for op, op_samples in sorted(samples.items()):
+        latencies = sorted(seconds * 1000 for seconds, _ in op_samples)
+        everything.extend(latencies)
+        report[op] = {
+            "count": len(op_samples),
+            "errors": sum(1 for _, status in op_samples if status >= 400),
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "rps": len(op_samples) / elapsed if elapsed else 0.0,
+        }
+    everything.sort()
+    report["total"] = {
+        "count": len(everything),
+        "errors": sum(stats["errors"] for stats in report.values()),
+        "p50": percentile(everything, 50),
+        "p95": percentile(everything, 95),
+        "p99": percentile(everything, 99),
+        "rps": len(everything) / elapsed if elapsed else 0.0,
+    }
+    return report
+
+
+def run_scenario(app, transport, ctx, scenario, requests, concurrency, seed):
+    """Run ``requests`` calls of a weighted workload mix on ``concurrency`` threads"""
+    weights = SCENARIOS[scenario]
+    workloads = [
+        (WORKLOADS[name], weight)
+        for name, weight in weights.items()
+        if WORKLOADS[name].available(app)
+    ]
+    skipped = sorted(set(weights) - {workload.name for workload, _ in workloads})
+    if not workloads:
+        raise RuntimeError(f"No workload of scenario '{scenario}' is available")
+
+    samples = {}
+    lock = threading.Lock()
+    quota = max(1, requests // concurrency)
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        session = transport.session()
+        local = {}
+        done = 0
+        while done < quota:
+            workload = rng.choices(
+                [w for w, _ in workloads], weights=[w for _, w in workloads]
+            )[0]
+            for call in workload.steps(ctx, rng):
+                start = time.perf_counter()
+                status = session.send(call)
+                local.setdefault(call.op, []).append(
+                    (time.perf_counter() - start, status)
+                )
+                done += 1
+        with lock:
+            for op, op_samples in local.items():
+                samples.setdefault(op, []).extend(op_samples)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {"report": summarize(samples, elapsed), "skipped": skipped}
+
+
+def issue_tokens(app, user_ids):
+    with app.app_context():
+        return {
+            user_id: create_access_token(identity=str(user_id)) for user_id in user_ids
+        }
+
+
+def prepare(config_class, buyers, sellers, products_per_seller, seed):
+    """Build the app on a freshly seeded database and return (app, ctx)"""
+    from project import create_app
+    from benchmarks.seed import PASSWORD, seed_database
+
+    os.makedirs(config_class.BENCH_DIR, exist_ok=True)
+    # Uploads are written relative to the working directory
+    os.chdir(config_class.BENCH_DIR)
+
+    app = create_app(config_class)
+    with app.app_context():
+        seeded = seed_database(buyers, sellers, products_per_seller, seed)
+    tokens = issue_tokens(app, [*seeded["buyer_ids"], *seeded["seller_ids"]])
+    return app, BenchContext(seeded, PASSWORD, tokens)
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, key, report):
+    baselines = load_baselines(path)
+    baselines[key] = report
+    with open(path, "w") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+
+
+def compare(report, baseline, tolerance):
+    """Return human readable regressions of ``report`` against ``baseline``"""
+    regressions = []
+    for op, base in baseline.items():
+        current = report.get(op)
+        if current is None or min(current["count"], base["count"]) < MIN_SAMPLES:
+            continue
+        for metric in METRICS:
+            if base[metric] and current[metric] > base[metric] * (1 + tolerance):
+                regressions.append(
+                    f"{op} {metric}: {current[metric]:.2f}ms > "
+                    f"baseline {base[metric]:.2f}ms (+{tolerance:.0%})"
+                )
+        if base["rps"] and current["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(
+                f"{op} rps: {current['rps']:.1f} < "
+                f"baseline {base['rps']:.1f} (-{tolerance:.0%})"
+            )
+    return regressions
+
+
+def format_report(report):
+    lines = [
+        f"{'operation':<16}{'count':>8}{'errors':>8}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}"
+    ]
+    for op, stats in report.items():
+        lines.append(
+            f"{op:<16}{stats['count']:>8}{stats['errors']:>8}"
+            f"{stats['p50']:>10.2f}{stats['p95']:>10.2f}{stats['p99']:>10.2f}"
+            f"{stats['rps']:>10.1f}"
+        )
+    return "\n".join(lines)
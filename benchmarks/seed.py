@@ -0,0 +1,21 @@
+"""Deterministic database seeding for benchmarks"""
+
+from project.config.extensions import db
+from project.apps.products import shards
+from project.seed import DEFAULT_PASSWORD as PASSWORD, seed_data
+
+
+def seed_database(buyers=200, sellers=20, products_per_seller=50, seed=42):
+    """Drop, recreate and fill the benchmark database (requires app context)"""
+    shards.drop_all()
+    db.drop_all()
+    db.create_all()
+    shards.create_all()
+    return seed_data(
+        users=buyers + sellers,
+        sellers=sellers,
+        products=sellers * products_per_seller,
+        skew=0,
+        seed=seed,
+        password=PASSWORD,
+    )
@@ -0,0 +1,158 @@
+"""Workload definitions for the benchmark suite"""
+
+import io
+
+# Smallest valid PNG: 1x1 transparent pixel
+PNG_BYTES = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+class Call:
+    """A single HTTP call issued by a workload"""
+
+    def __init__(self, op, method, path, token=None, json=None, files=None):
+        self.op = op
+        self.method = method
+        self.path = path
+        self.token = token
+        self.json = json
+        self.files = files
+
+    @property
+    def headers(self):
+        if self.token:
+            return {"Authorization": f"Bearer {self.token}"}
+        return {}
+
+
+class Workload:
+    """A named step generator, skipped when the app lacks its endpoints"""
+
+    def __init__(self, name, steps, requires=()):
+        self.name = name
+        self.steps = steps
+        self.requires = requires
+
+    def available(self, app):
+        endpoints = set(app.view_functions)
+        return all(endpoint in endpoints for endpoint in self.requires)
+
+
+def login_storm(ctx, rng):
+    index = rng.randrange(len(ctx.buyer_ids))
+    yield Call(
+        "login",
+        "POST",
+        "/api/auth/login",
+        json={"username": f"buyer{index}", "password": ctx.password},
+    )
+
+
+def catalog_browsing(ctx, rng):
+    token = ctx.token_for(rng.choice(ctx.buyer_ids))
+    pages = max(1, len(ctx.product_ids) // 20)
+    yield Call(
+        "list_products",
+        "GET",
+        f"/api/products?page={rng.randint(1, pages)}&per_page=20",
+        token=token,
+    )
+    for _ in range(3):
+        yield Call(
+            "get_product",
+            "GET",
+            f"/api/products/{rng.choice(ctx.product_ids)}",
+            token=token,
+        )
+
+
+def seller_writes(ctx, rng):
+    seller_id = rng.choice(ctx.seller_ids)
+    token = ctx.token_for(seller_id)
+    yield Call(
+        "create_product",
+        "POST",
+        "/api/products",
+        token=token,
+        json={
+            "title": f"Bench item {rng.randrange(1_000_000)}",
+            "description": "Created by the benchmark suite",
+            "quantity": rng.randint(1, 100),
+            "price": round(rng.uniform(1, 500), 2),
+        },
+    )
+    yield Call(
+        "update_product",
+        "PUT",
+        f"/api/products/{rng.choice(ctx.products_by_seller[seller_id])}",
+        token=token,
+        json={"price": round(rng.uniform(1, 500), 2)},
+    )
+
+
+def image_uploads(ctx, rng):
+    token = ctx.token_for(rng.choice(ctx.seller_ids))
+    yield Call(
+        "upload_image",
+        "POST",
+        "/api/products/upload-image",
+        token=token,
+        files={"image": ("bench.png", PNG_BYTES)},
+    )
+
+
+def checkout(ctx, rng):
+    token = ctx.token_for(rng.choice(ctx.buyer_ids))
+    for _ in range(rng.randint(1, 3)):
+        yield Call(
+            "add_to_cart",
+            "POST",
+            "/api/cart",
+            token=token,
+            json={"product_id": rng.choice(ctx.product_ids), "quantity": 1},
+        )
+    yield Call("checkout", "POST", "/api/cart/checkout", token=token)
+
+
+WORKLOADS = {
+    "login": Workload("login", login_storm, requires=("auth.login",)),
+    "browse": Workload(
+        "browse",
+        catalog_browsing,
+        requires=("products.get_products", "products.get_product"),
+    ),
+    "seller_writes": Workload(
+        "seller_writes",
+        seller_writes,
+        requires=("products.create_product", "products.update_product"),
+    ),
+    "uploads": Workload("uploads", image_uploads, requires=("products.upload_image",)),
+    "checkout": Workload(
+        "checkout", checkout, requires=("cart.add_to_cart", "cart.checkout")
+    ),
+}
+
+# Scenario name -> {workload name: weight}
+SCENARIOS = {
+    "mixed": {"login": 1, "browse": 12, "seller_writes": 3, "uploads": 1, "checkout": 3},
+    "login": {"login": 1},
+    "browse": {"browse": 1},
+    "writes": {"seller_writes": 1},
+    "uploads": {"uploads": 1},
+    "checkout": {"checkout": 1},
+}
+
+
+def multipart_body(files):
+    """Encode a ``files`` mapping for clients that speak raw HTTP"""
+    from werkzeug.datastructures import FileStorage
+    from werkzeug.test import encode_multipart
+
+    values = {
+        field: FileStorage(io.BytesIO(content), filename=filename)
+        for field, (filename, content) in files.items()
+    }
+    boundary, body = encode_multipart(values)
+    return f"multipart/form-data; boundary={boundary}", body
@@ -1,26 +1,339 @@
 #!/usr/bin/env python
 """Django-style management script for Flask application"""
 import os
+import sys
+import click
 from flask.cli import FlaskGroup
-from project import create_app, db
 
-app = create_app()
+
+def create_app():
+    """Full application, built lazily by FlaskGroup (run, routes, shell)"""
+    from project import create_app
+
+    return create_app()
+
+
+def command_app_context():
+    """App context without blueprints, for commands that only touch the DB"""
+    from project import create_app, load_models
+
+    load_models()
+    return create_app(register_views=False).app_context()
+
+
+# Commands declared with with_appcontext=False never trigger create_app();
+# the DB-only ones build a blueprint-free app via command_app_context().
 cli = FlaskGroup(create_app=create_app)
 
-@cli.command("init-db")
+@cli.command("init-db", with_appcontext=False)
 def init_db():
     """Initialize the database."""
+    from project import db
+
     print(os.getenv("DATABASE_URL"))
-    with app.app_context():
+    from project.apps.products import shards
+
+    with command_app_context():
         db.create_all()
+        shards.create_all()
         print("Database initialized successfully!")
 
-@cli.command("drop-db")
+@cli.command("drop-db", with_appcontext=False)
 def drop_db():
     """Drop all database tables."""
-    with app.app_context():
+    from project import db
+
+    from project.apps.products import shards
+
+    with command_app_context():
+        shards.drop_all()
         db.drop_all()
         print("Database dropped successfully!")
 
+@cli.command("cleanup-tokens", with_appcontext=False)
+def cleanup_tokens():
+    """Delete expired tokens from the blacklist."""
+    from project.apps.auth.models import TokenBlacklist
+
+    with command_app_context():
+        TokenBlacklist.cleanup_expired_tokens()
+        print("Expired tokens cleaned up successfully!")
+
+@cli.command("purge-idempotency-keys", with_appcontext=False)
+def purge_idempotency_keys():
+    """Delete stored Idempotency-Key responses past their TTL."""
+    from project.apps.idempotency.models import IdempotencyKey
+
+    with command_app_context():
+        print(f"Purged {IdempotencyKey.purge_expired()} expired idempotency keys")
+
+@cli.command("rebuild-seller-stats", with_appcontext=False)
+@click.option("--verify", is_flag=True, help="Only compare; exit 1 on drift.")
+def rebuild_seller_stats(verify):
+    """Recompute seller stats from products and invoices."""
+    from project.apps.products.models import SellerStats
+
+    with command_app_context():
+        if not verify:
+            print(f"Rebuilt stats for {SellerStats.rebuild()} sellers")
+            return
+        mismatches = SellerStats.verify()
+        for user_id, counter, stored, expected in mismatches:
+            print(f"seller {user_id} {counter}: stored {stored}, expected {expected}")
+        if mismatches:
+            raise SystemExit(1)
+        print("Seller stats are consistent")
+
+@cli.command("sweep-reservations", with_appcontext=False)
+@click.option("--loop", is_flag=True, help="Keep running.")
+@click.option("--interval", default=10.0, show_default=True, help="Seconds between sweeps.")
+def sweep_reservations(loop, interval):
+    """Release expired cart reservations in batches."""
+    import time
+    from flask import current_app
+    from project.apps.cart.models import Reservation
+
+    with command_app_context():
+        batch_size = current_app.config["RESERVATION_SWEEP_BATCH"]
+        while True:
+            released = 0
+            while True:
+                batch = Reservation.release_expired(batch_size)
+                released += batch
+                if batch < batch_size:
+                    break
+            print(f"Released {released} expired reservations")
+            if not loop:
+                return
+            time.sleep(interval)
+
+@cli.command("compact-product-changes", with_appcontext=False)
+@click.option(
+    "--tombstone-days",
+    type=int,
+    help="Also drop delete markers older than this many days.",
+)
+def compact_product_changes(tombstone_days):
+    """Drop product changes superseded by a later one."""
+    from project.apps.products.models import ProductChange
+
+    with command_app_context():
+        removed = ProductChange.compact(tombstone_days=tombstone_days)
+        print(f"Removed {removed} superseded product changes")
+
+@cli.command("rollup-sales", with_appcontext=False)
+@click.option("--loop", is_flag=True, help="Keep running, polling for new invoices.")
+@click.option("--interval", default=30.0, show_default=True, help="Seconds between polls.")
+@click.option("--rebuild", is_flag=True, help="Drop rollups and refold every invoice.")
+def rollup_sales(loop, interval, rebuild):
+    """Fold new invoices into the hourly and daily sales rollups."""
+    import time
+    from flask import current_app
+    from project.apps.analytics.models import fold_invoices, reset_rollups
+
+    with command_app_context():
+        if rebuild:
+            reset_rollups()
+        while True:
+            folded = 0
+            while True:
+                batch = fold_invoices(
+                    current_app.config["ROLLUP_BATCH_SIZE"],
+                    current_app.config["ROLLUP_SETTLE_SECONDS"],
+                )
+                folded += batch
+                if not batch:
+                    break
+            print(f"Folded {folded} invoices into sales rollups")
+            if not loop:
+                return
+            time.sleep(interval)
+
+@cli.command("worker", with_appcontext=False)
+@click.option("--queues", help='"name=limit,..." to serve, defaults to JOB_QUEUES.')
+@click.option("--concurrency", type=int, help="Threads, defaults to JOB_CONCURRENCY.")
+@click.option("--burst", is_flag=True, help="Exit once no job is due.")
+def worker(queues, concurrency, burst):
+    """Run background jobs: retries, visibility timeouts and periodic tasks."""
+    from flask import current_app
+    from project import load_tasks
+    from project.apps.jobs.worker import Worker, parse_queues
+
+    load_tasks()
+    with command_app_context():
+        config = current_app.config
+        Worker(
+            current_app._get_current_object(),
+            parse_queues(queues or config["JOB_QUEUES"]),
+            concurrency or config["JOB_CONCURRENCY"],
+            burst=burst,
+            log=click.echo,
+        ).run()
+
+@cli.command("job-stats", with_appcontext=False)
+def job_stats():
+    """Print queue depth per queue."""
+    from project.apps.jobs.models import Job
+
+    with command_app_context():
+        for queue, counters in sorted(Job.stats().items()):
+            click.echo(f"{queue}: " + ", ".join(f"{k}={v}" for k, v in counters.items()))
+        for task, count in sorted(Job.failed_tasks().items()):
+            click.echo(f"failed {task}: {count}")
+
+@cli.command("retry-failed-jobs", with_appcontext=False)
+@click.option("--task", help="Only jobs of this task.")
+def retry_failed_jobs(task):
+    """Requeue failed jobs for another round of attempts."""
+    from project.apps.jobs.models import Job
+
+    with command_app_context():
+        click.echo(f"Requeued {Job.retry_failed(task)} failed jobs")
+
+@cli.command("migrate-images", with_appcontext=False)
+@click.option("--batch-size", default=500, show_default=True, help="Rows updated per commit.")
+def migrate_images(batch_size):
+    """Move flat image files into the sharded layout; safe while serving."""
+    from flask import current_app
+    from project import storage
+    from project.apps.products import shards
+    from project.apps.products.models import ChangeOp, Product, ProductChange
+    from project.apps.uploads.models import Upload
+    from project.config.extensions import db
+
+    with command_app_context():
+        moved = 0
+        for name in storage.legacy_files():
+            storage.migrate_file(name)
+            moved += 1
+        click.echo(f"Moved {moved} images")
+
+        # Old paths keep resolving by file name; this only tidies the rows
+        prefix = current_app.config["UPLOAD_FOLDER"].rstrip("/") + "/"
+        targets = [(shard.session, Product.image_path) for shard in shards.all_shards()]
+        targets.append((db.session, Upload.path))
+        updated = 0
+        for session, column in targets:
+            model = column.class_
+            while True:
+                rows = (
+                    session.query(model)
+                    .filter(column.like(f"{prefix}%"))
+                    .limit(batch_size)
+                    .all()
+                )
+                for row in rows:
+                    setattr(row, column.key, storage.key_for(getattr(row, column.key)))
+                    if model is Product:
+                        ProductChange.record(row, ChangeOp.UPDATE.value)
+                session.commit()
+                updated += len(rows)
+                if len(rows) < batch_size:
+                    break
+        click.echo(f"Updated {updated} image paths")
+
+@cli.command("build-related", with_appcontext=False)
+@click.option("--full", is_flag=True, help="Rescore every product, not just changed ones.")
+def build_related(full):
+    """Refresh the precomputed related products table."""
+    from flask import current_app
+    from project.apps.products import related
+
+    with command_app_context():
+        config = current_app.config
+        rebuilt = related.build(
+            config["RELATED_PRODUCTS_K"],
+            config["RELATED_MIN_SCORE"],
+            config["RELATED_BLOCK_CELLS"],
+            full=full,
+        )
+        click.echo(f"Rebuilt {rebuilt} related product lists")
+
+@cli.command("import-profile", with_appcontext=False)
+@click.option("--module", default="project", show_default=True)
+@click.option("--top", default=15, show_default=True)
+def import_profile(module, top):
+    """Report what importing a module costs at startup."""
+    import subprocess
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    if result.returncode != 0 or not rows:
+        raise click.ClickException(result.stderr.strip() or f"Could not import {module}")
+
+    total = sum(cumulative for _, _, cumulative, depth in rows if depth == 0)
+    click.echo(f"import {module}: {total / 1000:.1f} ms, {len(rows)} modules\n")
+    for title, key in (("cumulative", 2), ("self", 1)):
+        click.echo(f"Top {top} by {title} time:")
+        for row in sorted(rows, key=lambda row: row[key], reverse=True)[:top]:
+            click.echo(f"  {row[key] / 1000:>8.1f} ms  {row[0]}")
+        click.echo()
+
+@cli.command("serve", with_appcontext=False)
+@click.option("--bind", help="host:port, defaults to SERVER_BIND.")
+@click.option("--workers", type=int, help="Processes, defaults to SERVER_WORKERS.")
+@click.option("--threads", type=int, help="Threads per worker, defaults to SERVER_THREADS.")
+@click.option("--backlog", type=int, help="Listen backlog, defaults to SERVER_BACKLOG.")
+def serve(**overrides):
+    """Run the app under gunicorn with preload and per-worker warmup."""
+    try:
+        import gunicorn  # noqa: F401
+    except ImportError:
+        raise click.ClickException("serve requires gunicorn: pip install gunicorn")
+    from project import create_app
+    from project.config.settings import ProductionConfig
+    from project.server import serve as run_server
+
+    run_server(create_app(ProductionConfig), **overrides)
+
+@cli.command("seed", with_appcontext=False)
+@click.option("--users", default=1000, show_default=True, help="Buyers plus sellers.")
+@click.option("--sellers", default=100, show_default=True)
+@click.option("--products", default=10000, show_default=True)
+@click.option(
+    "--skew",
+    default=1.0,
+    show_default=True,
+    help="Zipf exponent of products per seller (0 = uniform).",
+)
+@click.option("--tokens", default=0, show_default=True, help="Blacklisted tokens.")
+@click.option("--invoices", default=0, show_default=True)
+@click.option("--max-items", default=5, show_default=True, help="Items per invoice.")
+@click.option("--seed", default=42, show_default=True, help="RNG seed.")
+@click.option("--prefix", default="", help="Username prefix, to seed twice.")
+@click.option("--password", default="password123", show_default=True)
+@click.option("--chunk-size", default=10000, show_default=True)
+@click.option("--reset", is_flag=True, help="Drop and recreate all tables first.")
+def seed(reset, **options):
+    """Bulk insert deterministic synthetic data."""
+    from project import db
+    from project.apps.products import shards
+    from project.seed import seed_data
+
+    with command_app_context():
+        if reset:
+            shards.drop_all()
+            db.drop_all()
+        db.create_all()
+        shards.create_all()
+        summary = seed_data(log=click.echo, **options)
+        from project.apps.products.models import SellerStats
+
+        click.echo(f"seller stats: {SellerStats.rebuild()} sellers")
+        for table, (rows, seconds) in summary["timings"].items():
+            rate = rows / seconds if seconds else 0
+            click.echo(f"{table:>10}: {rows} rows in {seconds:.2f}s ({rate:,.0f} rows/s)")
+
 if __name__ == '__main__':
     cli()
@@ -2,26 +2,90 @@
 
 from flask import Flask, jsonify
 from project.config.settings import Config
-from project.config.extensions import db, bcrypt, jwt
+from project.config import extensions
+from project.config.extensions import db
 
 
-def create_app(config_class=Config):
+def create_app(config_class=Config, register_views=True):
+    """Build the app; ``register_views=False`` gives a DB-only app for CLI use"""
     app = Flask(__name__)
     app.config.from_object(config_class)
 
     # Initialize extensions
     db.init_app(app)
-    bcrypt.init_app(app)
-    jwt.init_app(app)
+    if app.config.get("PRODUCT_SHARDS"):
+        from project.apps.products import shards
+
+        shards.init_app(app)
+
+    from project import cache, storage
+
+    storage.init_app(app)
+    cache.init_app(app)
+
+    if register_views:
+        register_blueprints(app)
+
+        if app.config["ADMISSION_CONTROL"]:
+            from project import admission
+
+            admission.init_app(app)
+
+        from project import compression
+
+        compression.init_app(app)
+
+        if app.config["CATALOG_SNAPSHOT"]:
+            from project.apps.products import catalog
+
+            catalog.init_app(app)
+
+    return app
+
+
+def load_models():
+    """Import every model so metadata is complete without importing views"""
+    import project.apps.auth.models  # noqa: F401
+    import project.apps.products.models  # noqa: F401
+    import project.apps.invoices.models  # noqa: F401
+    import project.apps.analytics.models  # noqa: F401
+    import project.apps.cart.models  # noqa: F401
+    import project.apps.idempotency.models  # noqa: F401
+    import project.apps.jobs.models  # noqa: F401
+    import project.apps.uploads.models  # noqa: F401
+
+
+def load_tasks():
+    """Import every app's job functions so the worker can run them"""
+    import project.apps.jobs.tasks  # noqa: F401
+    import project.apps.auth.tasks  # noqa: F401
+    import project.apps.products.tasks  # noqa: F401
+    import project.apps.cart.tasks  # noqa: F401
+    import project.apps.idempotency.tasks  # noqa: F401
+    import project.apps.analytics.tasks  # noqa: F401
+    import project.apps.uploads.tasks  # noqa: F401
+
+
+def register_blueprints(app):
+    extensions.bcrypt.init_app(app)
+    extensions.jwt.init_app(app)
 
     register_jwt_callbacks(app)
 
     # Register blueprints
     from project.apps.auth.urls import auth_bp
     from project.apps.products.urls import products_bp
+    from project.apps.analytics.urls import analytics_bp
+    from project.apps.cart.urls import cart_bp
+    from project.apps.jobs.urls import jobs_bp
+    from project.apps.uploads.urls import uploads_bp
 
     app.register_blueprint(auth_bp, url_prefix="/api/auth")
     app.register_blueprint(products_bp, url_prefix="/api/products")
+    app.register_blueprint(analytics_bp, url_prefix="/api/analytics")
+    app.register_blueprint(cart_bp, url_prefix="/api/cart")
+    app.register_blueprint(jobs_bp, url_prefix="/api/jobs")
+    app.register_blueprint(uploads_bp, url_prefix="/api/uploads")
 
     # Register error handlers
     register_error_handlers(app)
@@ -43,19 +107,40 @@ def create_app(config_class=Config):
                         "create": "POST /api/products",
                         "list": "GET /api/products",
                         "get": "GET /api/products/<id>",
+                        "batch": "GET /api/products?ids=1,2 or POST /api/products/batch",
                         "update": "PUT /api/products/<id>",
                         "delete": "DELETE /api/products/<id>",
                     },
+                    "uploads": {
+                        "start": "POST /api/uploads",
+                        "status": "GET /api/uploads/<id>",
+                        "append": "PATCH /api/uploads/<id>",
+                        "complete": "POST /api/uploads/<id>/complete",
+                        "abort": "DELETE /api/uploads/<id>",
+                    },
+                    "cart": {
+                        "add": "POST /api/cart",
+                        "list": "GET /api/cart",
+                        "remove": "DELETE /api/cart/<id>",
+                        "checkout": "POST /api/cart/checkout",
+                    },
+                    "analytics": {
+                        "sales": "GET /api/analytics/sales",
+                        "top_products": "GET /api/analytics/top-products",
+                    },
+                    "jobs": {
+                        "stats": "GET /api/jobs/stats",
+                    },
                 },
             }
         )
 
-    return app
-
 
 def register_jwt_callbacks(app):
     from project.apps.auth.models import TokenBlacklist
 
+    jwt = extensions.jwt
+
     @jwt.token_in_blocklist_loader
     def check_if_token_revoked(jwt_header, jwt_payload):
         jti = jwt_payload["jti"]
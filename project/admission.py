@@ -0,0 +1,297 @@
+"""Admission control: per endpoint class concurrency limits and load shedding
+
+Every request is sorted into a class (``classify``). Cheap reads, bcrypt
+bound logins, disk bound uploads, other writes and checkout each get their
+own ``Limiter``. A burst of one kind then queues behind its own kind only.
+A request that finds its class full waits in a short FIFO queue. If the
+queue is full, or the request's queue deadline passes first, it gets a 503
+with ``Retry-After`` before it touches the database.
+
+The limits adapt to the latency observed in each class (AIMD). While
+requests finish within the class's target, a full class gains about one
+slot per round of requests. When one runs over the target, the limit
+shrinks by ``BACKOFF``, at most once per observed latency. The ceiling is
+the class's ``ADMISSION_SHARES`` of the worker's threads.
+
+Running and waiting requests both hold a server thread, so together they
+never exceed ``SERVER_THREADS``. ``ADMISSION_CHECKOUT_RESERVE`` of those
+threads are for authenticated checkout alone, so checkout still reaches
+``admit`` when every other thread is busy. A request may start waiting
+only while fewer requests wait than its class's ``WAIT_SHARE`` of the
+threads, so under pressure classes are shed in order: logins first, then
+reads and uploads, then other writes, then checkout.
+
+SSE streams hold their thread for as long as the client listens, so they
+are counted apart: at most ``ADMISSION_STREAM_SHARE`` of the threads outside
+the checkout reserve, and always at least one thread fewer. A stream over
+that cap gets a 503 at once instead of waiting. Open streams occupy threads
+like any request, so the other classes see fewer free threads.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+EXTENSION_KEY = "admission"
+READ, WRITE, AUTH, UPLOAD, CHECKOUT = "read", "write", "auth", "upload", "checkout"
+STREAM = "stream"
+ENDPOINT_CLASSES = {
+    "auth.login": AUTH,
+    "auth.register": AUTH,
+    "uploads.append_chunk": UPLOAD,
+    "uploads.complete_upload": UPLOAD,
+    "cart.checkout": CHECKOUT,
+    "products.stream_products": STREAM,
+}
+EXEMPT = {"static"}
+# Share of its threads that may be waiting when a class queues; lower shed first
+WAIT_SHARE = {CHECKOUT: 1.0, WRITE: 0.75, READ: 0.5, UPLOAD: 0.5, AUTH: 0.25}
+BACKOFF = 0.9
+MAX_RETRY_AFTER = 60
+# Open streams rarely close soon, so a refused subscriber should back off
+STREAM_RETRY_AFTER = 30
+
+
+def parse_classes(spec, cast=int):
+    """``"read=16,auth=2"`` -> ``{"read": 16, "auth": 2}``"""
+    classes = {}
+    for part in spec.split(","):
+        name, _, value = part.strip().partition("=")
+        if name and value:
+            classes[name] = cast(value)
+    return classes
+
+
+class Limiter:
+    """Adaptive concurrency limit with a FIFO wait queue"""
+
+    def __init__(self, name, max_limit, queue_seconds, target_seconds):
+        self.name = name
+        self.max_limit = max(1, max_limit)
+        self.limit = float(self.max_limit)
+        self.queue_seconds = queue_seconds
+        self.target_seconds = target_seconds
+        self.lock = threading.Lock()
+        self.waiters = deque()
+        self.in_flight = 0
+        self.latency = target_seconds
+        self.decreased_at = 0.0
+        self.rejected = 0
+
+    def _grant(self):
+        while self.waiters and self.in_flight < int(self.limit):
+            self.waiters.popleft().set()
+            self.in_flight += 1
+
+    def acquire(self, may_wait=True):
+        """Take a slot, waiting up to ``queue_seconds``; False if shed"""
+        with self.lock:
+            if not self.waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            if not may_wait:
+                self.rejected += 1
+                return False
+            waiter = threading.Event()
+            self.waiters.append(waiter)
+        if waiter.wait(self.queue_seconds):
+            return True
+        with self.lock:
+            if waiter.is_set():  # Granted just as the deadline passed
+                return True
+            self.waiters.remove(waiter)
+            self.rejected += 1
+            return False
+
+    def reject(self):
+        with self.lock:
+            self.rejected += 1
+
+    def release(self, seconds):
+        """Give the slot back after a request that ran for ``seconds``"""
+        with self.lock:
+            self.latency += (seconds - self.latency) * 0.2
+            now = time.monotonic()
+            if seconds > self.target_seconds:
+                if now - self.decreased_at >= max(self.latency, self.target_seconds):
+                    self.limit = max(1.0, self.limit * BACKOFF)
+                    self.decreased_at = now
+            elif self.in_flight >= int(self.limit):
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self.in_flight -= 1
+            self._grant()
+
+    def waiting(self):
+        return len(self.waiters)
+
+    def retry_after(self):
+        """Seconds until the current queue has likely drained"""
+        rounds = (len(self.waiters) + 1) / max(int(self.limit), 1)
+        return min(MAX_RETRY_AFTER, max(1, math.ceil(self.latency * rounds)))
+
+    def stats(self):
+        with self.lock:
+            return {
+                "limit": int(self.limit),
+                "in_flight": self.in_flight,
+                "waiting": len(self.waiters),
+                "latency_ms": round(self.latency * 1000, 1),
+                "rejected": self.rejected,
+            }
+
+
+class AdmissionController:
+    """Keeps the requests it holds, running or waiting, within ``threads``"""
+
+    def __init__(self, threads, reserve, max_streams=0):
+        self.threads = threads
+        self.reserve = reserve
+        self.max_streams = max_streams
+        self.limiters = {}
+        self.lock = threading.Lock()
+        self.occupied = 0
+        self.streams = 0
+        self.streams_rejected = 0
+
+    def capacity(self, name):
+        """Threads requests of ``name`` may occupy; the reserve is checkout's"""
+        return self.threads if name == CHECKOUT else self.threads - self.reserve
+
+    def acquire(self, name):
+        """Take a slot of class ``name``; False if shed"""
+        limiter = self.limiters[name]
+        capacity = self.capacity(name)
+        with self.lock:
+            if self.occupied >= capacity:
+                limiter.reject()
+                return False
+            self.occupied += 1
+            waiting = sum(limiter.waiting() for limiter in self.limiters.values())
+            may_wait = waiting < capacity * WAIT_SHARE.get(name, WAIT_SHARE[WRITE])
+        if limiter.acquire(may_wait):
+            return True
+        with self.lock:
+            self.occupied -= 1
+        return False
+
+    def acquire_stream(self):
+        """Take a thread for an SSE stream; False if streams are at their cap"""
+        with self.lock:
+            if self.streams >= self.max_streams or self.occupied >= self.capacity(STREAM):
+                self.streams_rejected += 1
+                return False
+            self.streams += 1
+            self.occupied += 1
+            return True
+
+    def release(self, name, seconds):
+        if name == STREAM:
+            with self.lock:
+                self.streams -= 1
+                self.occupied -= 1
+            return
+        self.limiters[name].release(seconds)
+        with self.lock:
+            self.occupied -= 1
+
+    def stats(self):
+        stats = {name: limiter.stats() for name, limiter in self.limiters.items()}
+        with self.lock:
+            stats[STREAM] = {
+                "limit": self.max_streams,
+                "in_flight": self.streams,
+                "rejected": self.streams_rejected,
+            }
+        return stats
+
+
+def authenticated():
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt_identity() is not None
+    except Exception:
+        return False
+
+
+def classify():
+    """The class of the current request, or None to let it through uncounted"""
+    endpoint = request.endpoint
+    if endpoint is None or endpoint in EXEMPT:
+        return None
+    name = ENDPOINT_CLASSES.get(endpoint)
+    if name == CHECKOUT and not authenticated():
+        # Priority is for real buyers; anonymous checkouts fail anyway
+        return WRITE
+    if name is not None:
+        return name
+    if request.method in ("GET", "HEAD", "OPTIONS"):
+        return READ
+    if request.content_type and "multipart/form-data" in request.content_type:
+        return UPLOAD
+    return WRITE
+
+
+def admit():
+    """before_request hook: take a slot or answer 503 right away"""
+    controller = current_app.extensions[EXTENSION_KEY]
+    name = classify()
+    if name == STREAM:
+        if not controller.acquire_stream():
+            response = jsonify({"error": "Too many live streams, please poll"})
+            response.headers["Retry-After"] = str(STREAM_RETRY_AFTER)
+            return response, 503
+        g.admission = (controller, name, time.monotonic())
+        return None
+    if name not in controller.limiters:
+        return None
+    if not controller.acquire(name):
+        response = jsonify({"error": "Server is busy, please retry later"})
+        response.headers["Retry-After"] = str(controller.limiters[name].retry_after())
+        return response, 503
+    g.admission = (controller, name, time.monotonic())
+    return None
+
+
+def release(exception=None):
+    """teardown_request hook: the slot goes to the next waiter"""
+    admitted = g.pop("admission", None)
+    if admitted is not None:
+        controller, name, started = admitted
+        controller.release(name, time.monotonic() - started)
+
+
+def build_controller(config):
+    """Limits for one worker, sized from its ``SERVER_THREADS``"""
+    threads = max(1, config["SERVER_THREADS"])
+    # A single thread cannot be set aside
+    reserve = min(max(0, config["ADMISSION_CHECKOUT_RESERVE"]), threads - 1)
+    shares = parse_classes(config["ADMISSION_SHARES"], float)
+    queue_seconds = parse_classes(config["ADMISSION_QUEUE_SECONDS"], float)
+    targets = parse_classes(config["ADMISSION_TARGET_SECONDS"], float)
+    shared = threads - reserve
+    # Streams never take the last shared thread, so short requests still run
+    max_streams = min(math.floor(shared * config["ADMISSION_STREAM_SHARE"]), shared - 1)
+    controller = AdmissionController(threads, reserve, max(0, max_streams))
+    for name, share in shares.items():
+        controller.limiters[name] = Limiter(
+            name,
+            math.ceil(controller.capacity(name) * share),
+            queue_seconds.get(name, 0.0),
+            targets.get(name, 1.0),
+        )
+    return controller
+
+
+def resize(app):
+    """Rebuild the limits after ``SERVER_THREADS`` changed, before serving"""
+    if EXTENSION_KEY in app.extensions:
+        app.extensions[EXTENSION_KEY] = build_controller(app.config)
+
+
+def init_app(app):
+    app.extensions[EXTENSION_KEY] = build_controller(app.config)
+    app.before_request(admit)
+    app.teardown_request(release)
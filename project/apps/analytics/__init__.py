@@ -0,0 +1 @@
+"""Sales analytics app"""
@@ -0,0 +1,194 @@
+"""Sales rollup models"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta
+from project.config.extensions import db
+from project.apps.invoices.models import Invoice, InvoiceItem, InvoiceStatus
+from project.apps.products import shards
+from helpers.model import Status
+
+
+class Granularity(Status):
+    HOUR = "hour"
+    DAY = "day"
+
+    @property
+    def seconds(self):
+        return 3600 if self is Granularity.HOUR else 86400
+
+    def truncate(self, moment):
+        if self is Granularity.HOUR:
+            return moment.replace(minute=0, second=0, microsecond=0)
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+# seller_id/product_id value meaning "all" in a rollup key
+ALL = 0
+
+
+class SalesRollup(db.Model):
+    """Revenue, units and orders per time bucket
+
+    Each bucket is stored at three levels: per product (seller_id and
+    product_id set), per seller (product_id = 0) and overall (both 0).
+    """
+
+    __tablename__ = "sales_rollups"
+
+    granularity = db.Column(db.String(8), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    seller_id = db.Column(db.Integer, primary_key=True, default=ALL)
+    product_id = db.Column(db.Integer, primary_key=True, default=ALL)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index(
+            "ix_sales_rollups_series",
+            "granularity",
+            "seller_id",
+            "product_id",
+            "bucket_start",
+        ),
+    )
+
+
+class RollupWatermark(db.Model):
+    """Id of the last invoice folded into the rollups"""
+
+    __tablename__ = "rollup_watermarks"
+
+    name = db.Column(db.String(50), primary_key=True)
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+SALES_WATERMARK = "sales"
+
+
+def fold_invoices(batch_size=1000, settle_seconds=60):
+    """Fold the next batch of done invoices into the rollups
+
+    Invoices are taken in id order after the watermark and the watermark
+    moves in the same transaction as the rollup updates, so each invoice is
+    counted exactly once. Invoices younger than ``settle_seconds`` stop the
+    batch, which gives concurrently committing lower ids time to land.
+    Returns the number of invoices folded.
+    """
+    watermark = db.session.get(RollupWatermark, SALES_WATERMARK)
+    if watermark is None:
+        watermark = RollupWatermark(name=SALES_WATERMARK, last_id=0)
+        db.session.add(watermark)
+        db.session.flush()
+
+    cutoff = datetime.utcnow() - timedelta(seconds=settle_seconds)
+    candidates = (
+        db.session.query(Invoice.id, Invoice.status, Invoice.created_at)
+        .filter(Invoice.id > watermark.last_id)
+        .order_by(Invoice.id)
+        .limit(batch_size)
+        .all()
+    )
+    invoices = {}
+    start_id = last_id = watermark.last_id
+    consumed = 0
+    for invoice_id, status, created_at in candidates:
+        if created_at is None or created_at > cutoff:
+            break
+        last_id = invoice_id
+        consumed += 1
+        if status == InvoiceStatus.DONE.value:
+            invoices[invoice_id] = created_at
+
+    if not consumed:
+        db.session.rollback()
+        return 0
+
+    totals = defaultdict(lambda: [0.0, 0, set()])
+    items = (
+        db.session.query(
+            InvoiceItem.buyer_invoice_id,
+            InvoiceItem.product_id,
+            InvoiceItem.quantity,
+            InvoiceItem.unit_price,
+            InvoiceItem.seller_id,
+        )
+        .filter(InvoiceItem.buyer_invoice_id.in_(list(invoices)))
+        .all()
+        if invoices
+        else []
+    )
+    # Items record their seller. Older items without one fall back to the
+    # product's owner, which may live on another shard.
+    owners = shards.product_owners(
+        {item.product_id for item in items if item.seller_id is None}
+    )
+    for invoice_id, product_id, quantity, unit_price, seller_id in items:
+        if seller_id is None:
+            seller_id = owners.get(product_id)
+        if seller_id is None:
+            continue  # Legacy item of a product deleted since
+        created_at = invoices[invoice_id]
+        for granularity in Granularity:
+            bucket = granularity.truncate(created_at)
+            for key in (
+                (granularity.value, bucket, seller_id, product_id),
+                (granularity.value, bucket, seller_id, ALL),
+                (granularity.value, bucket, ALL, ALL),
+            ):
+                total = totals[key]
+                total[0] += quantity * unit_price
+                total[1] += quantity
+                total[2].add(invoice_id)
+
+    table = SalesRollup.__table__
+    for (granularity, bucket, seller_id, product_id), (revenue, units, orders) in totals.items():
+        key = (
+            (table.c.granularity == granularity)
+            & (table.c.bucket_start == bucket)
+            & (table.c.seller_id == seller_id)
+            & (table.c.product_id == product_id)
+        )
+        updated = db.session.execute(
+            table.update()
+            .where(key)
+            .values(
+                revenue=table.c.revenue + revenue,
+                units=table.c.units + units,
+                orders=table.c.orders + len(orders),
+            )
+        )
+        if not updated.rowcount:
+            db.session.execute(
+                table.insert().values(
+                    granularity=granularity,
+                    bucket_start=bucket,
+                    seller_id=seller_id,
+                    product_id=product_id,
+                    revenue=revenue,
+                    units=units,
+                    orders=len(orders),
+                )
+            )
+
+    # Compare-and-set, so a concurrently running job cannot double count
+    moved = db.session.execute(
+        RollupWatermark.__table__.update()
+        .where(
+            (RollupWatermark.name == SALES_WATERMARK)
+            & (RollupWatermark.last_id == start_id)
+        )
+        .values(last_id=last_id, updated_at=datetime.utcnow())
+    )
+    if not moved.rowcount:
+        db.session.rollback()
+        return 0
+    db.session.commit()
+    return consumed
+
+
+def reset_rollups():
+    SalesRollup.query.delete()
+    RollupWatermark.query.filter_by(name=SALES_WATERMARK).delete()
+    db.session.commit()
@@ -0,0 +1,12 @@
+"""Analytics background jobs"""
+
+from flask import current_app
+from project.apps.analytics.models import fold_invoices
+from project.apps.jobs.registry import task
+
+
+@task("analytics.rollup_sales", queue="maintenance", every=60)
+def rollup_sales():
+    config = current_app.config
+    while fold_invoices(config["ROLLUP_BATCH_SIZE"], config["ROLLUP_SETTLE_SECONDS"]):
+        pass
@@ -0,0 +1,12 @@
+"""Analytics URL patterns (routes)"""
+
+from flask import Blueprint
+from project.apps.analytics import views
+
+analytics_bp = Blueprint("analytics", __name__)
+
+# Register routes
+analytics_bp.add_url_rule("/sales", "sales_series", views.sales_series, methods=["GET"])
+analytics_bp.add_url_rule(
+    "/top-products", "top_products", views.top_products, methods=["GET"]
+)
@@ -0,0 +1,60 @@
+"""Analytics query validators"""
+
+from datetime import datetime
+from project.apps.analytics.models import Granularity
+
+MAX_BUCKETS = 10000
+
+
+def parse_datetime(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def validate_range(args):
+    """Validate a rollup range query; returns (is_valid, errors, query)"""
+    errors = []
+    query = {}
+
+    granularity = args.get("granularity", Granularity.DAY.value)
+    if granularity not in Granularity.filtered_list():
+        errors.append(
+            f'Invalid granularity. Must be one of: {", ".join(Granularity.filtered_list())}'
+        )
+    else:
+        query["granularity"] = Granularity(granularity)
+
+    for name in ("start", "end"):
+        if not args.get(name):
+            errors.append(f"{name} is required (ISO 8601)")
+            continue
+        value = parse_datetime(args[name])
+        if value is None:
+            errors.append(f"{name} must be an ISO 8601 datetime")
+        else:
+            query[name] = value
+
+    if "start" in query and "end" in query and query["start"] >= query["end"]:
+        errors.append("start must be before end")
+
+    try:
+        query["step"] = int(args.get("step", 1))
+        if query["step"] < 1:
+            errors.append("step must be a positive integer")
+    except (TypeError, ValueError):
+        errors.append("step must be a positive integer")
+
+    for name in ("seller_id", "product_id"):
+        try:
+            query[name] = int(args.get(name, 0))
+        except (TypeError, ValueError):
+            errors.append(f"{name} must be an integer")
+
+    if not errors:
+        span = (query["end"] - query["start"]).total_seconds()
+        if span / (query["granularity"].seconds * query["step"]) > MAX_BUCKETS:
+            errors.append(f"Range too large: at most {MAX_BUCKETS} buckets")
+
+    return len(errors) == 0, errors, query
@@ -0,0 +1,163 @@
+"""Analytics views (admin only), answered from the sales rollups"""
+
+import numpy as np
+from datetime import timedelta
+from flask import request, jsonify
+from project.config.extensions import db
+from project.apps.analytics.models import SalesRollup, ALL
+from project.apps.analytics.validators import validate_range
+from project.apps.auth.decorators import admin_required
+from project.apps.products import shards
+
+
+def bucket_rows(query, seller, product):
+    """Rollup rows matching the ``seller`` and ``product`` filters in range"""
+    granularity = query["granularity"]
+    return (
+        db.session.query(
+            SalesRollup.bucket_start,
+            SalesRollup.product_id,
+            SalesRollup.revenue,
+            SalesRollup.units,
+            SalesRollup.orders,
+        )
+        .filter(
+            SalesRollup.granularity == granularity.value,
+            seller,
+            product,
+            SalesRollup.bucket_start >= granularity.truncate(query["start"]),
+            SalesRollup.bucket_start < query["end"],
+        )
+        .all()
+    )
+
+
+def columns(rows):
+    """Turn rollup rows into NumPy columns"""
+    if not rows:
+        empty = np.zeros(0)
+        return np.zeros(0, dtype="datetime64[s]"), empty.astype(np.int64), empty, empty, empty
+    buckets, product_ids, revenue, units, orders = zip(*rows)
+    return (
+        np.array(buckets, dtype="datetime64[s]"),
+        np.array(product_ids, dtype=np.int64),
+        np.array(revenue, dtype=np.float64),
+        np.array(units, dtype=np.float64),
+        np.array(orders, dtype=np.float64),
+    )
+
+
+@admin_required
+def sales_series():
+    """Revenue, units and orders per bucket; ``step`` merges N buckets into one"""
+    is_valid, errors, query = validate_range(request.args)
+    if not is_valid:
+        return jsonify({"errors": errors}), 400
+
+    granularity = query["granularity"]
+    start = granularity.truncate(query["start"])
+    width = granularity.seconds * query["step"]
+    count = -(-int((query["end"] - start).total_seconds()) // width)
+
+    seller = SalesRollup.seller_id == query["seller_id"]
+    if query["product_id"] and not query["seller_id"]:
+        # Product rows are only kept under the product's own seller
+        seller = SalesRollup.seller_id != ALL
+    rows = bucket_rows(query, seller, SalesRollup.product_id == query["product_id"])
+    buckets, _, revenue, units, orders = columns(rows)
+    index = (buckets - np.datetime64(start, "s")).astype(np.int64) // width
+    revenue = np.bincount(index, weights=revenue, minlength=count)
+    units = np.bincount(index, weights=units, minlength=count)
+    orders = np.bincount(index, weights=orders, minlength=count)
+
+    series = [
+        {
+            "bucket_start": (start + timedelta(seconds=i * width)).isoformat(),
+            "revenue": round(float(revenue[i]), 2),
+            "units": int(units[i]),
+            "orders": int(orders[i]),
+        }
+        for i in range(count)
+    ]
+    return (
+        jsonify(
+            {
+                "granularity": granularity.value,
+                "step": query["step"],
+                "seller_id": query["seller_id"],
+                "product_id": query["product_id"],
+                "series": series,
+                "totals": {
+                    "revenue": round(float(revenue.sum()), 2),
+                    "units": int(units.sum()),
+                    "orders": int(orders.sum()),
+                },
+            }
+        ),
+        200,
+    )
+
+
+@admin_required
+def top_products():
+    """Best selling products over a range, optionally for one seller"""
+    is_valid, errors, query = validate_range(request.args)
+    if not is_valid:
+        return jsonify({"errors": errors}), 400
+    limit = min(max(request.args.get("limit", 10, type=int), 1), 100)
+    order_by = request.args.get("order_by", "revenue")
+    if order_by not in ("revenue", "units", "orders"):
+        return jsonify({"errors": ["order_by must be revenue, units or orders"]}), 400
+
+    if query["seller_id"]:
+        rows = bucket_rows(
+            query,
+            SalesRollup.seller_id == query["seller_id"],
+            SalesRollup.product_id != ALL,
+        )
+    else:
+        rows = (
+            db.session.query(
+                SalesRollup.bucket_start,
+                SalesRollup.product_id,
+                SalesRollup.revenue,
+                SalesRollup.units,
+                SalesRollup.orders,
+            )
+            .filter(
+                SalesRollup.granularity == query["granularity"].value,
+                SalesRollup.seller_id != ALL,
+                SalesRollup.product_id != ALL,
+                SalesRollup.bucket_start
+                >= query["granularity"].truncate(query["start"]),
+                SalesRollup.bucket_start < query["end"],
+            )
+            .all()
+        )
+
+    _, product_ids, revenue, units, orders = columns(rows)
+    ids, index = np.unique(product_ids, return_inverse=True)
+    totals = {
+        "revenue": np.bincount(index, weights=revenue, minlength=len(ids)),
+        "units": np.bincount(index, weights=units, minlength=len(ids)),
+        "orders": np.bincount(index, weights=orders, minlength=len(ids)),
+    }
+    top = np.argsort(-totals[order_by], kind="stable")[:limit]
+
+    titles = {
+        product_id: product.title
+        for product_id, product in shards.get_products(
+            [int(ids[i]) for i in top]
+        ).items()
+    }
+    products = [
+        {
+            "product_id": int(ids[i]),
+            "title": titles.get(int(ids[i])),
+            "revenue": round(float(totals["revenue"][i]), 2),
+            "units": int(totals["units"][i]),
+            "orders": int(totals["orders"][i]),
+        }
+        for i in top
+    ]
+    return jsonify({"products": products}), 200
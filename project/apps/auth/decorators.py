@@ -21,12 +21,12 @@ def role_based(is_valid_role, *roles, active_required=True):
         @wraps(fn)
         def wrapper(*args, **kwargs):
             current_user_id = get_jwt_identity()
-            user = User.query.get(current_user_id)
+            user = User.access(current_user_id)
 
             if not user:
                 return jsonify({"error": "User not found"}), 404
 
-            if is_valid_role(user.role, *roles):
+            if not is_valid_role(user.role, *roles):
                 return jsonify({"error": "Insufficient permissions"}), 403
 
             if active_required and user.status in UserStatus.filtered_list(
@@ -60,6 +60,11 @@ def role_restricted(*restricted_roles, active_required=True):
     )
 
 
+def user_required(role, active_required=True):
+    """Require the given role; admins always pass"""
+    return role_required(role, UserRole.ADMIN, active_required=active_required)
+
+
 def seller_required(fn, active_required=True):
     """Decorator to check if user is a seller"""
     return user_required(UserRole.SELLER, active_required=active_required)(fn)
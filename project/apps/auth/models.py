@@ -1,8 +1,14 @@
 """User model for authentication"""
 
+from collections import namedtuple
+from flask import current_app
 from project.config.extensions import db
 from datetime import datetime
 from helpers.model import Status
+from project import cache
+
+# What authorization checks need, without loading the whole row
+UserAccess = namedtuple("UserAccess", "id role status")
 
 
 class UserRole(Status):
@@ -44,6 +50,34 @@ class User(db.Model):
             "created_at": self.created_at.isoformat(),
         }
 
+    @staticmethod
+    def access(user_id):
+        """``UserAccess`` for ``user_id`` or None, cached for every worker
+
+        Writers changing a user's role or status call ``remember_access``
+        after committing.
+        """
+
+        def load():
+            user = db.session.get(User, int(user_id))
+            return [user.id, user.role, user.status] if user else None
+
+        found = cache.cached(
+            "users", str(user_id), current_app.config["USER_CACHE_SECONDS"], load
+        )
+        return UserAccess(*found) if found else None
+
+    @staticmethod
+    def remember_access(user):
+        # Written through rather than deleted, so a check that loaded the row
+        # just before the change cannot cache the old status over it
+        cache.remember(
+            "users",
+            str(user.id),
+            [user.id, user.role, user.status],
+            current_app.config["USER_CACHE_SECONDS"],
+        )
+
 
 class TokenBlacklist(db.Model):
     __tablename__ = "token_blacklist"
@@ -58,10 +92,18 @@ class TokenBlacklist(db.Model):
     def __repr__(self):
         return f"<TokenBlacklist {self.jti}>"
 
+    @staticmethod
+    def is_blacklisted(jti):
+        return TokenBlacklist.query.filter_by(jti=jti).first() is not None
+
     @staticmethod
     def is_token_revoked(jti):
-        token = TokenBlacklist.query.filter_by(jti=jti).first()
-        return token is not None
+        return cache.cached(
+            "revoked",
+            jti,
+            current_app.config["REVOKED_TOKEN_CACHE_SECONDS"],
+            lambda: TokenBlacklist.is_blacklisted(jti),
+        )
 
     @staticmethod
     def add_token_to_blacklist(jti, token_type, user_id, expires_at):
@@ -70,6 +112,11 @@ class TokenBlacklist(db.Model):
         )
         db.session.add(blacklisted_token)
         db.session.commit()
+        # Written through, so a check that read the table just before cannot
+        # cache "not revoked" over it
+        cache.remember(
+            "revoked", jti, True, current_app.config["REVOKED_TOKEN_CACHE_SECONDS"]
+        )
 
     @staticmethod
     def cleanup_expired_tokens():
@@ -0,0 +1,9 @@
+"""Auth background jobs"""
+
+from project.apps.auth.models import TokenBlacklist
+from project.apps.jobs.registry import task
+
+
+@task("auth.cleanup_tokens", queue="maintenance", every=3600)
+def cleanup_tokens():
+    TokenBlacklist.cleanup_expired_tokens()
@@ -10,6 +10,7 @@ from project.config.extensions import db, bcrypt
 from project.apps.auth.models import User, UserRole, UserStatus, TokenBlacklist
 from project.apps.auth.validators import validate_registration, validate_login
 from project.apps.auth.decorators import admin_required, role_restricted
+from project.apps.idempotency.decorators import idempotent
 from datetime import datetime
 
 
@@ -134,7 +135,8 @@ def profile():
     return jsonify({"user": user.to_dict()}), 200
 
 
-@role_restricted
+@role_restricted()
+@idempotent
 def increase_balance():
     """Increase user balance (for testing/admin purposes)"""
     current_user_id = get_jwt_identity()
@@ -204,11 +206,12 @@ def change_user_status():
     try:
         user.status = new_status
         db.session.commit()
+        User.remember_access(user)
         return (
             jsonify(
                 {
                     "message": "User status updated successfully",
-                    "user": user.to_dict(include_status=True),
+                    "user": user.to_dict(),
                 }
             ),
             200,
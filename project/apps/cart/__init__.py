@@ -0,0 +1 @@
+"""Cart app"""
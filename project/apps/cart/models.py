@@ -0,0 +1,142 @@
+"""Cart reservation model"""
+
+from collections import Counter
+from datetime import datetime
+from project.config.extensions import db
+from project.apps.products import shards
+from project.apps.products.models import ChangeOp, Product, ProductChange
+
+
+class Reservation(db.Model):
+    """A time-limited hold on units of a product
+
+    Holding is a single conditional UPDATE on ``products.reserved``; no row
+    lock is kept while the buyer shops. Expired holds are released in
+    batches by ``release_expired``.
+    """
+
+    __tablename__ = "reservations"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
+    # No foreign key: products may live on a shard (see products.shards)
+    product_id = db.Column(db.Integer, nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "product_id": self.product_id,
+            "quantity": self.quantity,
+            "created_at": self.created_at.isoformat(),
+            "expires_at": self.expires_at.isoformat(),
+        }
+
+    @staticmethod
+    def hold(product_id, quantity):
+        """Reserve units if available; returns False when stock is short
+
+        The update goes to the product's shard session (``db.session`` when
+        products are not sharded); the caller commits it.
+        """
+        shard = shards.for_product(product_id)
+        if shard is None:
+            return False
+        table = Product.__table__
+        held = shard.session.execute(
+            table.update()
+            .where(
+                (table.c.id == product_id)
+                & (table.c.quantity - table.c.reserved >= quantity)
+            )
+            .values(reserved=table.c.reserved + quantity)
+        )
+        return held.rowcount == 1
+
+    @staticmethod
+    def unhold(quantities):
+        """Return ``{product_id: units}`` to available stock on their shards"""
+        table = Product.__table__
+        for shard, product_ids in shards.group_ids(quantities).items():
+            for product_id in product_ids:
+                shard.session.execute(
+                    table.update()
+                    .where(table.c.id == product_id)
+                    .values(reserved=table.c.reserved - quantities[product_id])
+                )
+
+    @staticmethod
+    def record_stock(product_ids):
+        """Put the products' new available stock in the change feed
+
+        Holds move ``reserved`` with plain UPDATEs. This adds the matching
+        ``product_changes`` rows to the same shard transactions, so the
+        change feed and SSE subscribers on every worker see holds too.
+        """
+        for shard, ids in shards.group_ids(product_ids).items():
+            products = (
+                shard.session.query(Product)
+                .filter(Product.id.in_(ids))
+                .populate_existing()
+                .all()
+            )
+            for product in products:
+                ProductChange.record(product, ChangeOp.UPDATE.value, hold=True)
+
+    @staticmethod
+    def claim(reservations, now):
+        """Delete unexpired ``reservations``; False if any was lost meanwhile"""
+        claimed = db.session.execute(
+            Reservation.__table__.delete().where(
+                Reservation.id.in_([r.id for r in reservations])
+                & (Reservation.expires_at > now)
+            )
+        )
+        return claimed.rowcount == len(reservations)
+
+    @staticmethod
+    def release_expired(batch_size=1000, attempts=3):
+        """Release one batch of expired holds; returns how many were released"""
+        for _ in range(attempts):
+            released = Reservation._release_batch(batch_size)
+            if released is not None:
+                return released
+        return 0
+
+    @staticmethod
+    def _release_batch(batch_size):
+        now = datetime.utcnow()
+        expired = (
+            db.session.query(Reservation.id, Reservation.product_id, Reservation.quantity)
+            .filter(Reservation.expires_at <= now)
+            .order_by(Reservation.expires_at)
+            .limit(batch_size)
+            .all()
+        )
+        if not expired:
+            db.session.rollback()
+            return 0
+
+        released = db.session.execute(
+            Reservation.__table__.delete().where(
+                Reservation.id.in_([row.id for row in expired])
+                & (Reservation.expires_at <= now)
+            )
+        )
+        if released.rowcount != len(expired):
+            # Something else removed part of the batch; let the caller retry
+            db.session.rollback()
+            return None
+
+        quantities = Counter()
+        for row in expired:
+            quantities[row.product_id] += row.quantity
+        Reservation.unhold(quantities)
+        Reservation.record_stock(quantities)
+        # Reservations go first: a crash before the shards commit leaves
+        # units held too long, never held twice
+        db.session.commit()
+        shards.commit_shards()
+        return len(expired)
@@ -0,0 +1,12 @@
+"""Cart background jobs"""
+
+from flask import current_app
+from project.apps.cart.models import Reservation
+from project.apps.jobs.registry import task
+
+
+@task("cart.sweep_reservations", queue="maintenance", every=60)
+def sweep_reservations():
+    batch_size = current_app.config["RESERVATION_SWEEP_BATCH"]
+    while Reservation.release_expired(batch_size) >= batch_size:
+        pass
@@ -0,0 +1,17 @@
+"""Cart URL patterns (routes)"""
+
+from flask import Blueprint
+from project.apps.cart import views
+
+cart_bp = Blueprint("cart", __name__)
+
+# Register routes
+cart_bp.add_url_rule("", "add_to_cart", views.add_to_cart, methods=["POST"])
+cart_bp.add_url_rule("", "get_cart", views.get_cart, methods=["GET"])
+cart_bp.add_url_rule(
+    "/<int:reservation_id>",
+    "remove_from_cart",
+    views.remove_from_cart,
+    methods=["DELETE"],
+)
+cart_bp.add_url_rule("/checkout", "checkout", views.checkout, methods=["POST"])
@@ -0,0 +1,24 @@
+"""Cart form validators"""
+
+
+def validate_cart_item(data):
+    """Validate an add-to-cart payload"""
+    errors = []
+
+    if data is None:
+        return False, ["Request body must be JSON"]
+
+    try:
+        if int(data.get("product_id")) < 1:
+            errors.append("product_id must be a positive integer")
+    except (ValueError, TypeError):
+        errors.append("product_id must be a valid integer")
+
+    try:
+        quantity = int(data.get("quantity", 1))
+        if quantity < 1:
+            errors.append("Quantity must be at least 1")
+    except (ValueError, TypeError):
+        errors.append("Quantity must be a valid integer")
+
+    return len(errors) == 0, errors
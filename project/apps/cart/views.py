@@ -0,0 +1,228 @@
+"""Cart views (route handlers)"""
+
+from collections import Counter
+from datetime import datetime, timedelta
+from flask import current_app, request, jsonify
+from flask_jwt_extended import get_jwt_identity
+from project.config.extensions import db
+from project.apps.auth.models import User, UserRole
+from project.apps.auth.decorators import role_required
+from project.apps.cart.models import Reservation
+from project.apps.cart.validators import validate_cart_item
+from project.apps.products import shards
+from project.apps.products.models import apply_sale
+from project.apps.products.tasks import apply_sharded_sale
+from project.apps.invoices.models import Invoice, InvoiceItem, InvoiceStatus
+
+
+def notify_stock(product_id):
+    """Record a hold's change to a product's available stock in the feed"""
+    Reservation.record_stock([product_id])
+
+
+@role_required(UserRole.BUYER)
+def add_to_cart():
+    """Hold units of a product for the current buyer"""
+    data = request.get_json(silent=True)
+
+    is_valid, errors = validate_cart_item(data)
+    if not is_valid:
+        return jsonify({"errors": errors}), 400
+
+    product_id = int(data["product_id"])
+    quantity = int(data.get("quantity", 1))
+
+    try:
+        if not Reservation.hold(product_id, quantity):
+            shards.rollback_shards()
+            db.session.rollback()
+            if not shards.get_products([product_id]):
+                return jsonify({"error": "Product not found"}), 404
+            return jsonify({"error": "Insufficient stock"}), 409
+
+        reservation = Reservation(
+            user_id=int(get_jwt_identity()),
+            product_id=product_id,
+            quantity=quantity,
+            expires_at=datetime.utcnow()
+            + timedelta(seconds=current_app.config["RESERVATION_TTL_SECONDS"]),
+        )
+        notify_stock(product_id)
+        # When sharded the hold commits first: a failure in between leaves
+        # units held without a reservation, which is undone below
+        shards.commit_shards()
+        db.session.add(reservation)
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            if shards.enabled():
+                Reservation.unhold({product_id: quantity})
+                notify_stock(product_id)
+                shards.commit_shards()
+            raise
+        return (
+            jsonify(
+                {
+                    "message": "Product reserved",
+                    "reservation": reservation.to_dict(),
+                }
+            ),
+            201,
+        )
+    except Exception as e:
+        shards.rollback_shards()
+        db.session.rollback()
+        return jsonify({"error": f"Failed to reserve product: {str(e)}"}), 500
+
+
+@role_required(UserRole.BUYER)
+def get_cart():
+    """List the current buyer's unexpired reservations"""
+    reservations = (
+        Reservation.query.filter(
+            Reservation.user_id == int(get_jwt_identity()),
+            Reservation.expires_at > datetime.utcnow(),
+        )
+        .order_by(Reservation.id)
+        .all()
+    )
+    return jsonify({"reservations": [r.to_dict() for r in reservations]}), 200
+
+
+@role_required(UserRole.BUYER)
+def remove_from_cart(reservation_id):
+    """Release one of the current buyer's reservations"""
+    reservation = Reservation.query.filter_by(
+        id=reservation_id, user_id=int(get_jwt_identity())
+    ).first()
+    if not reservation:
+        return jsonify({"error": "Reservation not found"}), 404
+
+    try:
+        # Deleting by id decides the race with the sweeper: only the side
+        # that actually removes the row gives the units back
+        removed = db.session.execute(
+            Reservation.__table__.delete().where(Reservation.id == reservation.id)
+        )
+        if removed.rowcount:
+            Reservation.unhold({reservation.product_id: reservation.quantity})
+            notify_stock(reservation.product_id)
+        db.session.commit()
+        shards.commit_shards()
+        return jsonify({"message": "Reservation released"}), 200
+    except Exception as e:
+        shards.rollback_shards()
+        db.session.rollback()
+        return jsonify({"error": f"Failed to release reservation: {str(e)}"}), 500
+
+
+@role_required(UserRole.BUYER)
+def checkout():
+    """Turn the current buyer's reservations into a paid invoice"""
+    current_user_id = int(get_jwt_identity())
+    now = datetime.utcnow()
+
+    reservations = Reservation.query.filter(
+        Reservation.user_id == current_user_id, Reservation.expires_at > now
+    ).all()
+    if not reservations:
+        return jsonify({"error": "Cart is empty"}), 400
+
+    try:
+        # Units are already held, so checkout needs no stock check: it only
+        # has to win its own reservations back from the sweeper
+        if not Reservation.claim(reservations, now):
+            db.session.rollback()
+            return jsonify({"error": "Some reservations expired, please retry"}), 409
+
+        quantities = Counter()
+        for reservation in reservations:
+            quantities[reservation.product_id] += reservation.quantity
+
+        products = shards.get_products(list(quantities))
+        missing = sorted(set(quantities) - set(products))
+        if missing:
+            # Deleted since they were held: drop those holds so the rest of
+            # the cart can still be bought
+            db.session.rollback()
+            Reservation.query.filter(
+                Reservation.user_id == current_user_id,
+                Reservation.product_id.in_(missing),
+            ).delete(synchronize_session=False)
+            db.session.commit()
+            return (
+                jsonify(
+                    {
+                        "error": "Some products are no longer available",
+                        "product_ids": missing,
+                    }
+                ),
+                409,
+            )
+
+        total = round(
+            sum(products[pid].price * units for pid, units in quantities.items()), 2
+        )
+
+        users = User.__table__
+        charged = db.session.execute(
+            users.update()
+            .where((users.c.id == current_user_id) & (users.c.balance >= total))
+            .values(balance=users.c.balance - total)
+        )
+        if not charged.rowcount:
+            db.session.rollback()
+            return jsonify({"error": "Insufficient balance"}), 402
+
+        invoice = Invoice(
+            status=InvoiceStatus.DONE.value,
+            owner_id=current_user_id,
+            quantity=sum(quantities.values()),
+            total_price=total,
+            created_at=now,
+        )
+        db.session.add(invoice)
+        db.session.flush()
+
+        items = []
+        sales = {}
+        for product_id, units in quantities.items():
+            product = products[product_id]
+            items.append(
+                InvoiceItem(
+                    product_id=product_id,
+                    buyer_invoice_id=invoice.id,
+                    quantity=units,
+                    unit_price=product.price,
+                    seller_id=product.user_id,
+                )
+            )
+            sales[product_id] = (units, product.price)
+        db.session.add_all(items)
+
+        if shards.enabled():
+            # The invoice commits with one job per shard, which moves the
+            # held units out of stock there exactly once
+            for shard, product_ids in shards.group_ids(sales).items():
+                apply_sharded_sale.enqueue(
+                    invoice_id=invoice.id,
+                    sales=[[pid, *sales[pid]] for pid in product_ids],
+                )
+        else:
+            apply_sale(db.session, sales)
+        db.session.commit()
+
+        return (
+            jsonify(
+                {
+                    "message": "Checkout successful",
+                    "invoice": invoice.to_dict(),
+                    "items": [item.to_dict() for item in items],
+                }
+            ),
+            201,
+        )
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Failed to checkout: {str(e)}"}), 500
@@ -0,0 +1 @@
+"""Idempotency keys app"""
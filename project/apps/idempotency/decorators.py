@@ -0,0 +1,127 @@
+"""Idempotency-Key handling for mutating endpoints"""
+
+import hashlib
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import current_app, request, jsonify, make_response
+from flask_jwt_extended import get_jwt_identity
+from project.config.extensions import db
+from project.apps.idempotency.models import IdempotencyKey, IdempotencyStatus
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint():
+    """Hash of what the request asks for, so a key cannot be reused for another"""
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.path}?{request.query_string.decode()}".encode())
+    if request.mimetype == "multipart/form-data":
+        for name, value in sorted(request.form.items(multi=True)):
+            digest.update(f"{name}={value}".encode())
+        for name, storage in sorted(request.files.items(multi=True)):
+            digest.update(f"{name}:{storage.filename}".encode())
+            for chunk in iter(lambda: storage.stream.read(64 * 1024), b""):
+                digest.update(chunk)
+            storage.stream.seek(0)
+    else:
+        digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+
+def replay(record):
+    response = make_response(record.response_body, record.response_status)
+    response.mimetype = record.response_mimetype
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def conflict(message, status=409):
+    response = jsonify({"error": message})
+    response.status_code = status
+    if status == 409:
+        response.headers["Retry-After"] = "1"
+    return response
+
+
+def idempotent(fn):
+    """Run ``fn`` at most once per (user, Idempotency-Key)
+
+    The first request stores its status and body; replays get the stored
+    response without running the handler. A duplicate arriving while the
+    first is still running waits for it. Server errors are not stored, so a
+    failed request can be retried with the same key, unless the handler had
+    already committed. The key is marked committed in the handler's own
+    ``db.session`` commit, so a worker dying before the response is stored
+    never makes a retry run the handler again: a key left in flight past
+    ``IDEMPOTENCY_LOCK_SECONDS`` answers 409 instead. Must be applied inside
+    the JWT/role decorators.
+    """
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return fn(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return conflict(f"{HEADER} must be at most {MAX_KEY_LENGTH} characters", 400)
+
+        config = current_app.config
+        ttl = config["IDEMPOTENCY_TTL_SECONDS"]
+        user_id = int(get_jwt_identity())
+        fingerprint = request_fingerprint()
+        deadline = time.monotonic() + config["IDEMPOTENCY_WAIT_SECONDS"]
+        delay = 0.02
+
+        while True:
+            record = IdempotencyKey.acquire(
+                user_id, key, request.endpoint, fingerprint, ttl
+            )
+            if record is not None:
+                break
+
+            record = IdempotencyKey.find(user_id, key)
+            if record is None:
+                continue  # Released between our insert and lookup
+            if record.expired:
+                IdempotencyKey.expire(record.id)
+                continue
+            if record.request_hash != fingerprint or record.endpoint != request.endpoint:
+                return conflict(f"{HEADER} was already used for a different request", 422)
+            if record.status == IdempotencyStatus.DONE.value:
+                return replay(record)
+
+            stale_before = datetime.utcnow() - timedelta(
+                seconds=config["IDEMPOTENCY_LOCK_SECONDS"]
+            )
+            if record.locked_at < stale_before:
+                # The original request died or is still running; either way
+                # running the handler again could apply it twice
+                if record.status == IdempotencyStatus.COMMITTED.value:
+                    return conflict(
+                        "A request with this key was applied, but its response was lost"
+                    )
+                return conflict(
+                    "A request with this key did not finish and its outcome is unknown"
+                )
+
+            if time.monotonic() >= deadline:
+                return conflict("A request with this key is still in progress")
+            # Duplicate of an in-flight request: wait for its result
+            db.session.rollback()
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+        IdempotencyKey.bind(record.id)
+        try:
+            response = make_response(fn(*args, **kwargs))
+        except Exception:
+            IdempotencyKey.release(record.id)
+            raise
+
+        if response.status_code < 500 or not IdempotencyKey.release(record.id):
+            IdempotencyKey.complete(record.id, response)
+        return response
+
+    return wrapper
@@ -0,0 +1,148 @@
+"""Stored responses for Idempotency-Key replays"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from project.config.extensions import db
+from helpers.model import Status
+
+SESSION_KEY = "idempotency_key"
+
+
+class IdempotencyStatus(Status):
+    IN_FLIGHT = "in_flight"
+    # The handler's work committed; its response is not stored yet
+    COMMITTED = "committed"
+    DONE = "done"
+
+
+class IdempotencyKey(db.Model):
+    __tablename__ = "idempotency_keys"
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    endpoint = db.Column(db.String(100), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    response_status = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.LargeBinary, nullable=True)
+    response_mimetype = db.Column(db.String(100), nullable=True)
+    locked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    __table_args__ = (db.UniqueConstraint("user_id", "key"),)
+
+    def __repr__(self):
+        return f"<IdempotencyKey {self.user_id}:{self.key}>"
+
+    @property
+    def expired(self):
+        return self.expires_at <= datetime.utcnow()
+
+    @staticmethod
+    def find(user_id, key):
+        return IdempotencyKey.query.filter_by(user_id=user_id, key=key).first()
+
+    @staticmethod
+    def acquire(user_id, key, endpoint, request_hash, ttl_seconds):
+        """Insert an in-flight record; returns None if the key already exists"""
+        now = datetime.utcnow()
+        record = IdempotencyKey(
+            user_id=user_id,
+            key=key,
+            endpoint=endpoint,
+            request_hash=request_hash,
+            status=IdempotencyStatus.IN_FLIGHT.value,
+            locked_at=now,
+            expires_at=now + timedelta(seconds=ttl_seconds),
+        )
+        try:
+            db.session.add(record)
+            db.session.commit()
+            return record
+        except IntegrityError:
+            db.session.rollback()
+            return None
+
+    @staticmethod
+    def bind(record_id):
+        """Mark the key committed in the same transaction as the handler's work"""
+        db.session.info[SESSION_KEY] = record_id
+
+    @staticmethod
+    def unbind():
+        db.session.info.pop(SESSION_KEY, None)
+
+    @staticmethod
+    def complete(record_id, response):
+        IdempotencyKey.unbind()
+        IdempotencyKey.query.filter_by(id=record_id).update(
+            {
+                "status": IdempotencyStatus.DONE.value,
+                "response_status": response.status_code,
+                "response_body": response.get_data(),
+                "response_mimetype": response.mimetype,
+            }
+        )
+        db.session.commit()
+
+    @staticmethod
+    def release(record_id):
+        """Forget a key whose request failed, so a retry runs again
+
+        Returns False and keeps the key if the handler had already committed
+        its work: running it again could apply that work twice.
+        """
+        IdempotencyKey.unbind()
+        db.session.rollback()
+        released = IdempotencyKey.query.filter_by(
+            id=record_id, status=IdempotencyStatus.IN_FLIGHT.value
+        ).delete()
+        db.session.commit()
+        return released == 1
+
+    @staticmethod
+    def expire(record_id):
+        """Delete a record whose TTL passed, whatever its status"""
+        db.session.rollback()
+        IdempotencyKey.query.filter(
+            IdempotencyKey.id == record_id,
+            IdempotencyKey.expires_at <= datetime.utcnow(),
+        ).delete(synchronize_session=False)
+        db.session.commit()
+
+    @staticmethod
+    def purge_expired(batch_size=10000):
+        """Delete expired records in batches; returns how many were removed"""
+        removed = 0
+        while True:
+            ids = [
+                row.id
+                for row in db.session.query(IdempotencyKey.id)
+                .filter(IdempotencyKey.expires_at < datetime.utcnow())
+                .limit(batch_size)
+            ]
+            if not ids:
+                return removed
+            IdempotencyKey.query.filter(IdempotencyKey.id.in_(ids)).delete(
+                synchronize_session=False
+            )
+            db.session.commit()
+            removed += len(ids)
+
+
+@event.listens_for(Session, "before_commit")
+def _mark_committed(session):
+    record_id = session.info.get(SESSION_KEY)
+    if record_id is not None:
+        table = IdempotencyKey.__table__
+        session.execute(
+            table.update()
+            .where(
+                (table.c.id == record_id)
+                & (table.c.status == IdempotencyStatus.IN_FLIGHT.value)
+            )
+            .values(status=IdempotencyStatus.COMMITTED.value)
+        )
@@ -0,0 +1,9 @@
+"""Idempotency background jobs"""
+
+from project.apps.idempotency.models import IdempotencyKey
+from project.apps.jobs.registry import task
+
+
+@task("idempotency.purge_expired", queue="maintenance", every=3600)
+def purge_expired():
+    IdempotencyKey.purge_expired()
@@ -1,3 +1,4 @@
+from datetime import datetime
 from project.config.extensions import db
 from helpers.model import Status
 
@@ -12,9 +13,10 @@ class Invoice(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     status = db.Column(db.String(20), nullable=False)
-    owner_id = db.Column(db.Integer, db.filtered_listnKey("users.id"), nullable=False)
+    owner_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     quantity = db.Column(db.Integer, nullable=False, default=1)
     total_price = db.Column(db.Float, nullable=False, default=.0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
 
     def to_dict(self):
         return {
@@ -23,6 +25,7 @@ class Invoice(db.Model):
             "owner_id": self.owner_id,
             "quantity": self.quantity,
             "total_price": self.total_price,
+            "created_at": self.created_at.isoformat() if self.created_at else None,
         }
 
 
@@ -30,7 +33,8 @@ class InvoiceItem(db.Model):
     __tablename__ = "invoice_items"
 
     id = db.Column(db.Integer, primary_key=True)
-    product_id = db.Column(db.Integer, db.ForeignKey("products.id"), nullable=False)
+    # No foreign key: products may live on a shard (see products.shards)
+    product_id = db.Column(db.Integer, nullable=False, index=True)
     buyer_invoice_id = db.Column(
         db.Integer, db.ForeignKey("invoices.id"), nullable=False
     )
@@ -38,12 +42,18 @@ class InvoiceItem(db.Model):
         db.Integer, db.ForeignKey("invoices.id"), nullable=True, default=None
     )
     quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Float, nullable=False, default=0.0)
+    # Owner of the product when it was sold, so sales outlive the product.
+    # NULL on items written before the column existed.
+    seller_id = db.Column(db.Integer, nullable=True, index=True)
 
     def to_dict(self):
         return {
             "id": self.id,
             "product_id": self.product_id,
-            "buyer_invoice_id": self.buyer_id,
-            "seller_invoice_id": self.seller_id,
+            "buyer_invoice_id": self.buyer_invoice_id,
+            "seller_invoice_id": self.seller_invoice_id,
             "quantity": self.quantity,
+            "unit_price": self.unit_price,
+            "seller_id": self.seller_id,
         }
@@ -0,0 +1,306 @@
+"""Durable background jobs
+
+Jobs are rows, enqueued on the caller's session so they commit (or roll
+back) together with the request's own writes. Workers select candidate ids,
+then claim them with a conditional UPDATE stamped with a claim token. That
+is safe with several worker processes on SQLite as well as on server
+databases, and avoids ``LIMIT`` in a subquery, which MySQL rejects. A claim
+is only valid until ``locked_until``; a job whose worker died becomes
+claimable again after that visibility timeout.
+"""
+
+import json
+import random
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from project.config.extensions import db
+from helpers.model import Status
+
+
+class JobStatus(Status):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class Job(db.Model):
+    __tablename__ = "jobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    queue = db.Column(db.String(50), nullable=False, default="default")
+    task = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default="{}")
+    status = db.Column(db.String(20), nullable=False, default=JobStatus.QUEUED.value)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_until = db.Column(db.DateTime, nullable=True)
+    claim_token = db.Column(db.String(32), nullable=True, index=True)
+    # Enqueueing twice with the same key is a no-op (periodic jobs)
+    unique_key = db.Column(db.String(150), nullable=True, unique=True)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True, index=True)
+
+    __table_args__ = (db.Index("ix_jobs_claim", "status", "queue", "run_at"),)
+
+    def __repr__(self):
+        return f"<Job {self.id} {self.task} {self.status}>"
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "queue": self.queue,
+            "task": self.task,
+            "status": self.status,
+            "attempts": self.attempts,
+            "max_attempts": self.max_attempts,
+            "run_at": self.run_at.isoformat(),
+            "last_error": self.last_error,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    @staticmethod
+    def enqueue(task, kwargs=None, queue="default", delay=0, max_attempts=5, unique_key=None):
+        """Add a job to the current transaction; the caller commits it"""
+        now = datetime.utcnow()
+        job = Job(
+            queue=queue,
+            task=task,
+            payload=json.dumps(kwargs or {}),
+            max_attempts=max_attempts,
+            run_at=now + timedelta(seconds=delay),
+            unique_key=unique_key,
+            created_at=now,
+        )
+        if unique_key is None:
+            db.session.add(job)
+            return job
+        try:
+            with db.session.begin_nested():
+                db.session.add(job)
+            return job
+        except IntegrityError:
+            return None
+
+    @staticmethod
+    def claim(queues, limit, visibility_timeout):
+        """Atomically take up to ``limit`` due jobs from ``queues``
+
+        Picks queued jobs whose ``run_at`` has passed and running jobs whose
+        claim expired. Returns the claimed jobs, each with its attempt
+        counted.
+        """
+        if limit <= 0:
+            return []
+        now = datetime.utcnow()
+        token = uuid.uuid4().hex
+        table = Job.__table__
+        claimable = (table.c.queue.in_(queues)) & (
+            ((table.c.status == JobStatus.QUEUED.value) & (table.c.run_at <= now))
+            | (
+                (table.c.status == JobStatus.RUNNING.value)
+                & (table.c.locked_until < now)
+                & (table.c.attempts < table.c.max_attempts)
+            )
+        )
+        ids = db.session.execute(
+            db.select(table.c.id)
+            .where(claimable)
+            .order_by(table.c.run_at)
+            .limit(limit)
+        ).scalars().all()
+        if not ids:
+            db.session.rollback()
+            return []
+        # Re-checking ``claimable`` makes the UPDATE lose cleanly to a
+        # concurrent worker that claimed some of the same rows first
+        claimed = db.session.execute(
+            table.update()
+            .where(table.c.id.in_(ids) & claimable)
+            .values(
+                status=JobStatus.RUNNING.value,
+                claim_token=token,
+                locked_until=now + timedelta(seconds=visibility_timeout),
+                attempts=table.c.attempts + 1,
+            )
+        )
+        db.session.commit()
+        if not claimed.rowcount:
+            return []
+        # Plain rows rather than ORM objects, so worker threads can use them
+        return db.session.execute(
+            db.select(table).where(table.c.claim_token == token).order_by(table.c.run_at)
+        ).all()
+
+    @staticmethod
+    def _finish(job, **values):
+        """Update a claimed job, unless its claim expired and was taken over"""
+        updated = Job.query.filter_by(
+            id=job.id, claim_token=job.claim_token, status=JobStatus.RUNNING.value
+        ).update(values, synchronize_session=False)
+        db.session.commit()
+        return updated == 1
+
+    @staticmethod
+    def complete(job):
+        return Job._finish(
+            job,
+            status=JobStatus.DONE.value,
+            claim_token=None,
+            locked_until=None,
+            last_error=None,
+            finished_at=datetime.utcnow(),
+        )
+
+    @staticmethod
+    def retry_or_fail(job, error, base_seconds, max_seconds):
+        """Schedule another attempt with jittered exponential backoff"""
+        now = datetime.utcnow()
+        if job.attempts >= job.max_attempts:
+            return Job._finish(
+                job,
+                status=JobStatus.FAILED.value,
+                claim_token=None,
+                locked_until=None,
+                last_error=error,
+                finished_at=now,
+            )
+        backoff = min(max_seconds, base_seconds * 2 ** (job.attempts - 1))
+        return Job._finish(
+            job,
+            status=JobStatus.QUEUED.value,
+            claim_token=None,
+            locked_until=None,
+            last_error=error,
+            run_at=now + timedelta(seconds=backoff * random.uniform(0.5, 1.0)),
+        )
+
+    @staticmethod
+    def fail_abandoned():
+        """Fail running jobs whose claim expired on their last attempt
+
+        Returns the jobs this call failed.
+        """
+        now = datetime.utcnow()
+        expired = Job.query.filter(
+            Job.status == JobStatus.RUNNING.value,
+            Job.locked_until < now,
+            Job.attempts >= Job.max_attempts,
+        ).all()
+        failed = []
+        for job in expired:
+            # Per job, so that of two pollers only one fails it
+            updated = Job.query.filter(
+                Job.id == job.id,
+                Job.status == JobStatus.RUNNING.value,
+                Job.locked_until < now,
+            ).update(
+                {
+                    "status": JobStatus.FAILED.value,
+                    "claim_token": None,
+                    "last_error": "Visibility timeout expired on the last attempt",
+                    "finished_at": now,
+                },
+                synchronize_session=False,
+            )
+            if updated:
+                failed.append(job)
+        db.session.commit()
+        return failed
+
+    @staticmethod
+    def retry_failed(task=None):
+        """Requeue failed jobs (optionally of one task) for a fresh set of attempts"""
+        query = Job.query.filter_by(status=JobStatus.FAILED.value)
+        if task:
+            query = query.filter_by(task=task)
+        requeued = query.update(
+            {
+                "status": JobStatus.QUEUED.value,
+                "attempts": 0,
+                "run_at": datetime.utcnow(),
+                "finished_at": None,
+            },
+            synchronize_session=False,
+        )
+        db.session.commit()
+        return requeued
+
+    @staticmethod
+    def purge_finished(older_than_seconds, batch_size=10000):
+        """Delete done jobs (and failed ones) finished before the cutoff"""
+        cutoff = datetime.utcnow() - timedelta(seconds=older_than_seconds)
+        removed = 0
+        while True:
+            ids = [
+                row.id
+                for row in db.session.query(Job.id)
+                .filter(
+                    Job.status.in_([JobStatus.DONE.value, JobStatus.FAILED.value]),
+                    Job.finished_at < cutoff,
+                )
+                .limit(batch_size)
+            ]
+            if not ids:
+                return removed
+            Job.query.filter(Job.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit()
+            removed += len(ids)
+
+    @staticmethod
+    def failed_tasks():
+        """Failed job count per task"""
+        return dict(
+            db.session.query(Job.task, db.func.count())
+            .filter(Job.status == JobStatus.FAILED.value)
+            .group_by(Job.task)
+            .all()
+        )
+
+    @staticmethod
+    def stats():
+        """Queue depth metrics per queue"""
+        now = datetime.utcnow()
+        queues = {}
+
+        def entry(queue):
+            return queues.setdefault(
+                queue,
+                {
+                    "ready": 0,
+                    "delayed": 0,
+                    "running": 0,
+                    "failed": 0,
+                    "done": 0,
+                    "oldest_ready_seconds": 0.0,
+                },
+            )
+
+        due = Job.run_at <= now
+        rows = (
+            db.session.query(Job.queue, Job.status, due, db.func.count())
+            .group_by(Job.queue, Job.status, due)
+            .all()
+        )
+        for queue, status, is_due, count in rows:
+            counters = entry(queue)
+            if status == JobStatus.QUEUED.value:
+                counters["ready" if is_due else "delayed"] += count
+            else:
+                counters[status] += count
+
+        oldest = (
+            db.session.query(Job.queue, db.func.min(Job.run_at))
+            .filter(Job.status == JobStatus.QUEUED.value, due)
+            .group_by(Job.queue)
+            .all()
+        )
+        for queue, run_at in oldest:
+            entry(queue)["oldest_ready_seconds"] = round(
+                (now - run_at).total_seconds(), 3
+            )
+        return queues
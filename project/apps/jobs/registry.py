@@ -0,0 +1,50 @@
+"""Task registry
+
+Modules register their job functions with ``@task``; views enqueue them by
+calling ``<task>.enqueue(**kwargs)`` before committing. Each app keeps its
+tasks in a ``tasks.py`` that ``project.load_tasks`` imports for the worker.
+"""
+
+from project.apps.jobs.models import Job
+
+TASKS = {}
+
+
+class Task:
+    def __init__(self, func, name, queue, max_attempts, every, on_failure):
+        self.func = func
+        self.name = name
+        self.queue = queue
+        self.max_attempts = max_attempts
+        self.every = every
+        self.on_failure = on_failure
+
+    def __call__(self, **kwargs):
+        return self.func(**kwargs)
+
+    def enqueue(self, delay=0, unique_key=None, **kwargs):
+        """Add a job to the current session; it runs after the commit"""
+        return Job.enqueue(
+            self.name,
+            kwargs,
+            queue=self.queue,
+            delay=delay,
+            max_attempts=self.max_attempts,
+            unique_key=unique_key,
+        )
+
+
+def task(name, queue="default", max_attempts=5, every=None, on_failure=None):
+    """Register a job function; ``every`` (seconds) also runs it periodically
+
+    ``on_failure(error, **kwargs)`` runs once when a job has used up its
+    attempts, for work that must not fail silently.
+    """
+
+    def decorator(func):
+        if name in TASKS:
+            raise ValueError(f"Task {name} is already registered")
+        TASKS[name] = Task(func, name, queue, max_attempts, every, on_failure)
+        return TASKS[name]
+
+    return decorator
@@ -0,0 +1,10 @@
+"""Job queue housekeeping tasks"""
+
+from flask import current_app
+from project.apps.jobs.models import Job
+from project.apps.jobs.registry import task
+
+
+@task("jobs.purge_finished", queue="maintenance", every=3600)
+def purge_finished():
+    Job.purge_finished(current_app.config["JOB_RETENTION_SECONDS"])
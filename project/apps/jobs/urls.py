@@ -0,0 +1,9 @@
+"""Jobs URL patterns (routes)"""
+
+from flask import Blueprint
+from project.apps.jobs import views
+
+jobs_bp = Blueprint("jobs", __name__)
+
+# Register routes
+jobs_bp.add_url_rule("/stats", "job_stats", views.job_stats, methods=["GET"])
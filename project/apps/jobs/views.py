@@ -0,0 +1,11 @@
+"""Jobs views (admin only)"""
+
+from flask import jsonify
+from project.apps.jobs.models import Job
+from project.apps.auth.decorators import admin_required
+
+
+@admin_required
+def job_stats():
+    """Queue depth, in-flight and failed counts per queue, failures per task"""
+    return jsonify({"queues": Job.stats(), "failed_tasks": Job.failed_tasks()}), 200
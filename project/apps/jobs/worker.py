@@ -0,0 +1,155 @@
+"""Job worker (main.py worker)
+
+One polling loop claims due jobs and hands them to a thread pool. Each
+queue has its own concurrency limit, so slow image work cannot starve
+maintenance jobs, and the total is capped by the pool size. Periodic tasks
+are enqueued with a per-slot unique key, so running several workers never
+runs a periodic task twice for the same slot.
+"""
+
+import json
+import signal
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from project.config.extensions import db
+from project.apps.jobs.models import Job
+from project.apps.jobs.registry import TASKS
+
+
+def parse_queues(spec):
+    """``"default=4,images=2"`` -> ``{"default": 4, "images": 2}``"""
+    queues = {}
+    for part in spec.split(","):
+        name, _, limit = part.strip().partition("=")
+        if name:
+            queues[name] = int(limit or 1)
+    return queues
+
+
+class Worker:
+    def __init__(self, app, queues, concurrency, burst=False, log=None):
+        config = app.config
+        self.app = app
+        self.queues = queues
+        self.concurrency = concurrency
+        self.burst = burst
+        self.log = log or (lambda message: None)
+        self.poll_seconds = config["JOB_POLL_SECONDS"]
+        self.visibility_timeout = config["JOB_VISIBILITY_TIMEOUT"]
+        self.retry_base = config["JOB_RETRY_BASE_SECONDS"]
+        self.retry_max = config["JOB_RETRY_MAX_SECONDS"]
+        self.lock = threading.Lock()
+        self.running = {queue: 0 for queue in queues}
+        self.wake = threading.Event()
+        self.stopping = False
+        self.periodic_slots = {}
+        self.processed = {"done": 0, "retried": 0, "failed": 0}
+
+    def stop(self, *args):
+        if not self.stopping:
+            self.log("Stopping after the running jobs finish")
+        self.stopping = True
+        self.wake.set()
+
+    def run(self):
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, self.stop)
+            signal.signal(signal.SIGINT, self.stop)
+        self.log(
+            f"Worker started: {self.concurrency} threads, queues "
+            + ", ".join(f"{queue}={limit}" for queue, limit in self.queues.items())
+        )
+        with self.app.app_context(), ThreadPoolExecutor(self.concurrency) as pool:
+            while not self.stopping:
+                self.wake.clear()
+                try:
+                    self.schedule_periodic()
+                    for job in Job.fail_abandoned():
+                        self.failed(job, job.last_error)
+                    claimed = self.claim_and_submit(pool)
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("Job worker poll failed")
+                    claimed = 0
+                finally:
+                    db.session.remove()
+                if self.burst and not claimed and not any(self.running.values()):
+                    break
+                if not claimed:
+                    self.wake.wait(self.poll_seconds)
+        self.log(
+            "Worker stopped: "
+            + ", ".join(f"{count} {outcome}" for outcome, count in self.processed.items())
+        )
+
+    def schedule_periodic(self):
+        now = time.time()
+        enqueued = False
+        for task in TASKS.values():
+            if not task.every or task.queue not in self.queues:
+                continue
+            slot = int(now // task.every)
+            if self.periodic_slots.get(task.name) == slot:
+                continue
+            task.enqueue(unique_key=f"periodic:{task.name}:{slot}")
+            self.periodic_slots[task.name] = slot
+            enqueued = True
+        if enqueued:
+            db.session.commit()
+
+    def claim_and_submit(self, pool):
+        claimed = 0
+        for queue, limit in self.queues.items():
+            with self.lock:
+                total_free = self.concurrency - sum(self.running.values())
+                free = min(limit - self.running[queue], total_free)
+            for job in Job.claim([queue], free, self.visibility_timeout):
+                with self.lock:
+                    self.running[queue] += 1
+                pool.submit(self.execute, job)
+                claimed += 1
+        return claimed
+
+    def failed(self, job, error):
+        """Run the task's ``on_failure`` for a job that used up its attempts"""
+        task = TASKS.get(job.task)
+        if task is None or task.on_failure is None:
+            return
+        try:
+            task.on_failure(error=error, **json.loads(job.payload))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            self.app.logger.exception(f"on_failure of {job.task}#{job.id} failed")
+
+    def execute(self, job):
+        started = time.perf_counter()
+        outcome = "retried"
+        with self.app.app_context():
+            try:
+                task = TASKS.get(job.task)
+                if task is None:
+                    raise LookupError(f"Unknown task {job.task}")
+                task.func(**json.loads(job.payload))
+                Job.complete(job)
+                outcome = "done"
+            except Exception:
+                db.session.rollback()
+                error = traceback.format_exc(limit=5)
+                finished = Job.retry_or_fail(job, error, self.retry_base, self.retry_max)
+                if job.attempts >= job.max_attempts:
+                    outcome = "failed"
+                    if finished:
+                        self.failed(job, error)
+            finally:
+                db.session.remove()
+                with self.lock:
+                    self.running[job.queue] -= 1
+                    self.processed[outcome] += 1
+                self.wake.set()
+        self.log(
+            f"{job.task}#{job.id} attempt {job.attempts}: {outcome} "
+            f"in {time.perf_counter() - started:.3f}s"
+        )
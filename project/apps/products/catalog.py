@@ -0,0 +1,292 @@
+"""Per-worker columnar snapshot of the catalog, for facet counts
+
+The snapshot holds one NumPy array per column (id, price, quantity,
+reserved, user_id, created_at), sorted by id: about 36 bytes per product.
+``CatalogSnapshot.current`` refreshes it at most every
+``CATALOG_REFRESH_SECONDS``. It re-reads the products whose ``updated_at``
+moved since the last refresh and drops those with a delete in the change
+feed. The window overlaps the previous one by
+``CATALOG_REFRESH_OVERLAP_SECONDS`` to absorb clock skew and slow commits,
+and a full reload every ``CATALOG_FULL_REFRESH_SECONDS`` repairs anything
+that still slipped through. Refreshes build new arrays and swap them in,
+so a request never sees a half-applied refresh.
+
+``facets`` answers a filter with boolean masks over the arrays; nothing
+hits the database per request.
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from project.apps.products import shards
+from project.apps.products.models import ChangeOp, Product, ProductChange
+
+EXTENSION_KEY = "catalog_snapshot"
+COLUMNS = (
+    ("id", np.int64),
+    ("price", np.float64),
+    ("quantity", np.int32),
+    ("reserved", np.int32),
+    ("user_id", np.int32),
+    ("created_at", "datetime64[s]"),
+)
+
+
+class CatalogTooLarge(Exception):
+    pass
+
+
+def to_columns(rows):
+    """Arrays from ``(id, price, quantity, reserved, user_id, created_at)`` rows"""
+    if not rows:
+        return {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS}
+    values = list(zip(*rows))
+    columns = {
+        name: np.array(
+            [value or 0 for value in column] if name != "created_at" else column,
+            dtype=dtype,
+        )
+        for (name, dtype), column in zip(COLUMNS, values)
+    }
+    order = np.argsort(columns["id"], kind="stable")
+    return {name: array[order] for name, array in columns.items()}
+
+
+def load_rows(updated_since=None):
+    query_columns = (
+        Product.id,
+        Product.price,
+        Product.quantity,
+        Product.reserved,
+        Product.user_id,
+        Product.created_at,
+    )
+    rows = []
+    for shard in shards.all_shards():
+        query = shard.session.query(*query_columns)
+        if updated_since is not None:
+            query = query.filter(Product.updated_at >= updated_since)
+        rows.extend(tuple(row) for row in query.yield_per(5000))
+    return rows
+
+
+def deleted_since(since):
+    ids = []
+    for shard in shards.all_shards():
+        ids.extend(
+            product_id
+            for product_id, in shard.session.query(ProductChange.product_id).filter(
+                ProductChange.op == ChangeOp.DELETE.value,
+                ProductChange.changed_at >= since,
+            )
+        )
+    return np.array(ids, dtype=np.int64)
+
+
+def merge(columns, changed, deleted):
+    """New arrays with ``changed`` rows upserted and ``deleted`` ids removed"""
+    ids = columns["id"]
+    if len(changed["id"]):
+        # Later rows win when a product shows up twice
+        _, last = np.unique(changed["id"][::-1], return_index=True)
+        keep = len(changed["id"]) - 1 - last
+        changed = {name: array[keep] for name, array in changed.items()}
+        position = np.searchsorted(ids, changed["id"])
+        found = position < len(ids)
+        found[found] = ids[position[found]] == changed["id"][found]
+        columns = {name: array.copy() for name, array in columns.items()}
+        for name, array in columns.items():
+            array[position[found]] = changed[name][found]
+        if not found.all():
+            columns = {
+                name: np.insert(array, position[~found], changed[name][~found])
+                for name, array in columns.items()
+            }
+    if len(deleted):
+        keep = ~np.isin(columns["id"], deleted)
+        if not keep.all():
+            columns = {name: array[keep] for name, array in columns.items()}
+    return columns
+
+
+def nbytes(columns):
+    return sum(array.nbytes for array in columns.values())
+
+
+class CatalogSnapshot:
+    def __init__(self, max_rows, refresh_seconds, full_refresh_seconds, overlap_seconds):
+        self.max_rows = max_rows
+        self.refresh_seconds = refresh_seconds
+        self.full_refresh_seconds = full_refresh_seconds
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.lock = threading.Lock()
+        self.columns = None
+        self.too_large = None
+        self.since = None
+        self.refreshed_at = self.loaded_at = 0.0
+
+    def _checked(self, columns):
+        if len(columns["id"]) > self.max_rows:
+            raise CatalogTooLarge(
+                f"{len(columns['id'])} products exceed CATALOG_MAX_ROWS ({self.max_rows})"
+            )
+        return columns
+
+    def _load(self):
+        started = datetime.utcnow()
+        columns = self._checked(to_columns(load_rows()))
+        self.columns, self.since = columns, started
+        self.loaded_at = time.monotonic()
+
+    def _refresh(self):
+        started = datetime.utcnow()
+        since = self.since - self.overlap
+        changed = to_columns(load_rows(updated_since=since))
+        columns = merge(self.columns, changed, deleted_since(since))
+        self.columns, self.since = self._checked(columns), started
+
+    def current(self):
+        """The arrays, refreshed first if they are due
+
+        One thread refreshes while the others keep using the previous
+        arrays; only the very first load makes requests wait.
+        """
+        now = time.monotonic()
+        if self.columns is not None and now - self.refreshed_at < self.refresh_seconds:
+            return self.columns
+        if self.too_large and now - self.refreshed_at < self.full_refresh_seconds:
+            raise self.too_large
+        if not self.lock.acquire(blocking=self.columns is None):
+            return self.columns
+        try:
+            now = time.monotonic()
+            if self.columns is None or now - self.loaded_at >= self.full_refresh_seconds:
+                self._load()
+            elif now - self.refreshed_at >= self.refresh_seconds:
+                self._refresh()
+            self.too_large = None
+        except CatalogTooLarge as e:
+            # Drop the arrays and wait a full refresh interval before retrying
+            self.columns, self.too_large = None, e
+            raise
+        finally:
+            self.refreshed_at = time.monotonic()
+            self.lock.release()
+        return self.columns
+
+    def stats(self):
+        columns = self.columns
+        if columns is None:
+            return {"rows": 0, "bytes": 0, "age_seconds": None}
+        return {
+            "rows": int(len(columns["id"])),
+            "bytes": nbytes(columns),
+            "age_seconds": round(time.monotonic() - self.refreshed_at, 3),
+        }
+
+
+def init_app(app):
+    """Give each worker a snapshot, loaded before it takes traffic"""
+    from project.server import register_warmup
+
+    config = app.config
+    app.extensions[EXTENSION_KEY] = CatalogSnapshot(
+        config["CATALOG_MAX_ROWS"],
+        config["CATALOG_REFRESH_SECONDS"],
+        config["CATALOG_FULL_REFRESH_SECONDS"],
+        config["CATALOG_REFRESH_OVERLAP_SECONDS"],
+    )
+    register_warmup(app, lambda app: app.extensions[EXTENSION_KEY].current())
+
+
+def columns_and_stats():
+    """The snapshot's arrays, or freshly loaded ones when it is disabled"""
+    snapshot = current_app.extensions.get(EXTENSION_KEY)
+    if snapshot is None:
+        columns = to_columns(load_rows())
+        return columns, {"rows": int(len(columns["id"])), "bytes": nbytes(columns)}
+    columns = snapshot.current()
+    return columns, snapshot.stats()
+
+
+def facets(columns, query, seller_id=None):
+    """Counts for a filter; each facet ignores its own filter"""
+    in_stock_rows = (columns["quantity"] - columns["reserved"]) > 0
+    masks = {}
+    if query["min_price"] is not None or query["max_price"] is not None:
+        mask = np.ones(len(columns["id"]), dtype=bool)
+        if query["min_price"] is not None:
+            mask &= columns["price"] >= query["min_price"]
+        if query["max_price"] is not None:
+            mask &= columns["price"] <= query["max_price"]
+        masks["price"] = mask
+    if query["in_stock"] is not None:
+        masks["in_stock"] = in_stock_rows if query["in_stock"] else ~in_stock_rows
+    if query["seller_ids"]:
+        masks["seller"] = np.isin(columns["user_id"], query["seller_ids"])
+    if query["created_after"] is not None or query["created_before"] is not None:
+        mask = np.ones(len(columns["id"]), dtype=bool)
+        if query["created_after"] is not None:
+            mask &= columns["created_at"] >= np.datetime64(query["created_after"], "s")
+        if query["created_before"] is not None:
+            mask &= columns["created_at"] < np.datetime64(query["created_before"], "s")
+        masks["created"] = mask
+    if seller_id is not None:
+        # Sellers only ever see their own products
+        masks["owner"] = columns["user_id"] == seller_id
+
+    def matching(excluding=None):
+        mask = np.ones(len(columns["id"]), dtype=bool)
+        for name, other in masks.items():
+            if name != excluding:
+                mask &= other
+        return mask
+
+    in_stock_scope = matching("in_stock")
+    in_stock = int(np.count_nonzero(in_stock_scope & in_stock_rows))
+
+    prices = columns["price"][matching("price")]
+    histogram = []
+    if len(prices):
+        # Equal-width buckets by direct indexing; several times faster than
+        # np.histogram, which searches the bin edges for every value
+        buckets = query["buckets"]
+        low, high = float(prices.min()), float(prices.max())
+        width = (high - low) / buckets or 1.0
+        index = np.minimum(((prices - low) / width).astype(np.int64), buckets - 1)
+        counts = np.bincount(index, minlength=buckets)
+        histogram = [
+            {
+                "from": round(low + i * width, 2),
+                "to": round(low + (i + 1) * width, 2),
+                "count": int(count),
+            }
+            for i, count in enumerate(counts)
+        ]
+
+    sellers = columns["user_id"][matching("seller")]
+    if len(sellers):
+        per_seller = np.bincount(sellers)
+        present = np.flatnonzero(per_seller)
+        top = present[np.argsort(-per_seller[present], kind="stable")][: query["top_sellers"]]
+        top_sellers = [
+            {"user_id": int(user_id), "count": int(per_seller[user_id])} for user_id in top
+        ]
+    else:
+        top_sellers = []
+
+    return {
+        "total": int(np.count_nonzero(matching())),
+        "in_stock": {
+            "true": in_stock,
+            "false": int(np.count_nonzero(in_stock_scope)) - in_stock,
+        },
+        "price": {
+            "min": round(float(prices.min()), 2) if len(prices) else None,
+            "max": round(float(prices.max()), 2) if len(prices) else None,
+            "histogram": histogram,
+        },
+        "sellers": top_sellers,
+    }
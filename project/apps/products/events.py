@@ -0,0 +1,192 @@
+"""In-process publisher of live product stock and price updates
+
+Writers queue events on the session (``queue_product_event``); they are
+published only after the transaction commits. A background thread also
+tails the ``product_changes`` outbox, so changes committed by other workers
+or processes reach this worker's subscribers too.
+
+Each subscription keeps only the latest pending event per product. Rapid
+changes coalesce, and a slow client never makes memory grow: it skips
+intermediate states instead.
+"""
+
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+SESSION_KEY = "product_events"
+LISTED_KEY = "product_events_listed"
+FIELDS = ("id", "quantity", "available", "price")
+
+
+def product_event(product_dict, deleted=False):
+    data = {field: product_dict.get(field) for field in FIELDS}
+    data["deleted"] = deleted
+    return data
+
+
+def queue_product_event(session, product_dict, deleted=False, hold=False):
+    """Publish ``product_dict`` once ``session`` commits
+
+    ``hold=True`` marks a change that only moved units held in carts.
+    """
+    pending = session.info.setdefault(SESSION_KEY, {})
+    pending[product_dict["id"]] = product_event(product_dict, deleted)
+    if not hold:
+        session.info.setdefault(LISTED_KEY, set()).add(product_dict["id"])
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session):
+    pending = session.info.pop(SESSION_KEY, None)
+    listed = session.info.pop(LISTED_KEY, None)
+    if pending:
+        broker.publish_many(pending.values(), holds_only=not listed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop(SESSION_KEY, None)
+    session.info.pop(LISTED_KEY, None)
+
+
+class Subscription:
+    def __init__(self, product_ids):
+        self.product_ids = frozenset(product_ids)
+        self.pending = {}
+        self.sent = {}
+        self.condition = threading.Condition()
+
+    def offer(self, data):
+        with self.condition:
+            self.pending[data["id"]] = data
+            self.condition.notify()
+
+    def wait(self, timeout, coalesce_seconds):
+        """Block until events arrive (or ``timeout``); returns changed events"""
+        with self.condition:
+            if not self.pending:
+                self.condition.wait(timeout)
+            if not self.pending:
+                return []
+        # Let a burst of updates land before flushing
+        if coalesce_seconds:
+            time.sleep(coalesce_seconds)
+        with self.condition:
+            pending, self.pending = self.pending, {}
+        changed = []
+        for product_id, data in pending.items():
+            if self.sent.get(product_id) != data:
+                self.sent[product_id] = data
+                changed.append(data)
+        return changed
+
+
+class ProductEventBroker:
+    """Fans product events out to subscriptions interested in each id"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        self.count = 0
+        self.tail_thread = None
+        self.listeners = []
+
+    def add_listener(self, callback, remote=True, holds=True):
+        """Call ``callback(events)`` on every publish, e.g. to drop caches
+
+        ``remote=False`` skips events other workers committed (seen while
+        tailing the change feed), for caches that are already shared.
+        ``holds=False`` skips commits that only held or released cart units.
+        The change feed does not tell those apart, so remote events always
+        count as listed changes.
+        """
+        self.listeners.append((callback, remote, holds))
+
+    def subscribe(self, product_ids, limit):
+        subscription = Subscription(product_ids)
+        with self.lock:
+            if self.count >= limit:
+                return None
+            self.count += 1
+            for product_id in subscription.product_ids:
+                self.subscribers.setdefault(product_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.count -= 1
+            for product_id in subscription.product_ids:
+                subscribers = self.subscribers.get(product_id)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.subscribers[product_id]
+
+    def publish_many(self, events, remote=False, holds_only=False):
+        events = list(events)
+        if not events:
+            return
+        for callback, wants_remote, wants_holds in self.listeners:
+            if (wants_remote or not remote) and (wants_holds or not holds_only):
+                callback(events)
+        with self.lock:
+            targets = [
+                (data, tuple(self.subscribers.get(data["id"], ())))
+                for data in events
+            ]
+        for data, subscriptions in targets:
+            for subscription in subscriptions:
+                subscription.offer(data)
+
+    def ensure_tailing(self, app):
+        """Start the outbox tail thread for this worker if not running"""
+        with self.lock:
+            if self.tail_thread and self.tail_thread.is_alive():
+                return
+            self.tail_thread = threading.Thread(
+                target=self._tail_changes, args=(app,), daemon=True
+            )
+            self.tail_thread.start()
+
+    def _tail_changes(self, app):
+        from project.config.extensions import db
+        from project.apps.products import shards
+        from project.apps.products.models import ProductChange, ChangeOp
+
+        interval = app.config["SSE_POLL_SECONDS"]
+        with app.app_context():
+            all_shards = shards.all_shards()
+            cursors = [
+                shard.session.query(db.func.max(ProductChange.id)).scalar() or 0
+                for shard in all_shards
+            ]
+            shards.remove_sessions()
+            while True:
+                time.sleep(interval)
+                with self.lock:
+                    if not self.count:
+                        self.tail_thread = None
+                        return
+                events = []
+                try:
+                    for index, shard in enumerate(all_shards):
+                        changes, _ = ProductChange.read(cursors[index], 1000, shard)
+                        events.extend(
+                            product_event(
+                                change.to_dict()["product"] or {"id": change.product_id},
+                                deleted=change.op == ChangeOp.DELETE.value,
+                            )
+                            for change in changes
+                        )
+                        if changes:
+                            cursors[index] = changes[-1].id
+                except Exception:
+                    app.logger.exception("Failed to tail product changes")
+                finally:
+                    shards.remove_sessions()
+                self.publish_many(events, remote=True)
+
+
+broker = ProductEventBroker()
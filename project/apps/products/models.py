@@ -1,7 +1,15 @@
 """Product model"""
 
+import heapq
+import json
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import object_session
+from sqlalchemy.exc import IntegrityError
 from project.config.extensions import db
-from datetime import datetime
+from datetime import datetime, timedelta
+from helpers.model import Status
+from project.apps.products import shards
 
 
 class Product(db.Model):
@@ -11,6 +19,8 @@ class Product(db.Model):
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
     quantity = db.Column(db.Integer, default=0)
+    # Units held by unexpired cart reservations; available = quantity - reserved
+    reserved = db.Column(db.Integer, nullable=False, default=0, server_default="0")
     price = db.Column(db.Float, default=0.0)
     image_path = db.Column(db.String(255), nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -25,9 +35,456 @@ class Product(db.Model):
             "title": self.title,
             "description": self.description,
             "quantity": self.quantity,
+            "available": (self.quantity or 0) - (self.reserved or 0),
             "price": self.price,
             "image_path": self.image_path,
             "user_id": self.user_id,
             "created_at": self.created_at.isoformat(),
             "updated_at": self.updated_at.isoformat(),
         }
+
+
+class SellerStats(db.Model):
+    """Per-seller dashboard counters, maintained incrementally by the writers
+
+    Every change is applied as ``column = column + delta`` in the writer's
+    own transaction, so reads are a primary key lookup and concurrent
+    writers never overwrite each other.
+    """
+
+    __tablename__ = "seller_stats"
+
+    COUNTERS = (
+        "product_count",
+        "units_in_stock",
+        "inventory_value",
+        "units_sold",
+        "sales_revenue",
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    product_count = db.Column(db.Integer, nullable=False, default=0)
+    units_in_stock = db.Column(db.Integer, nullable=False, default=0)
+    inventory_value = db.Column(db.Float, nullable=False, default=0.0)
+    units_sold = db.Column(db.Integer, nullable=False, default=0)
+    sales_revenue = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(
+        db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow
+    )
+
+    def to_dict(self):
+        return {
+            "user_id": self.user_id,
+            "product_count": self.product_count,
+            "units_in_stock": self.units_in_stock,
+            "inventory_value": round(self.inventory_value, 2),
+            "units_sold": self.units_sold,
+            "sales_revenue": round(self.sales_revenue, 2),
+            "updated_at": self.updated_at.isoformat() if self.updated_at else None,
+        }
+
+    @staticmethod
+    def empty(user_id):
+        return SellerStats(
+            user_id=user_id, **{counter: 0 for counter in SellerStats.COUNTERS}
+        )
+
+    @staticmethod
+    def apply_delta(user_id, session=None, **deltas):
+        """Add ``deltas`` to a seller's counters in the current transaction"""
+        session = session or db.session
+        deltas = {name: value for name, value in deltas.items() if value}
+        if not deltas:
+            return
+        table = SellerStats.__table__
+        values = {name: table.c[name] + value for name, value in deltas.items()}
+        values["updated_at"] = datetime.utcnow()
+        update = table.update().where(table.c.user_id == user_id).values(values)
+        if session.execute(update).rowcount:
+            return
+        # First write for this seller. Another transaction may insert the row
+        # concurrently, in which case the update is retried against it.
+        try:
+            with session.begin_nested():
+                session.execute(
+                    table.insert().values(
+                        user_id=user_id, updated_at=datetime.utcnow(), **deltas
+                    )
+                )
+        except IntegrityError:
+            session.execute(update)
+
+    @staticmethod
+    def record_product(product, sign=1, session=None):
+        """Count a created (``sign=1``) or deleted (``sign=-1``) product
+
+        Only the inventory counters move; a seller keeps the sales of a
+        product they delist.
+        """
+        quantity = product.quantity or 0
+        SellerStats.apply_delta(
+            product.user_id,
+            session,
+            product_count=sign,
+            units_in_stock=sign * quantity,
+            inventory_value=sign * quantity * (product.price or 0.0),
+        )
+
+    @staticmethod
+    def record_stock_change(
+        user_id, old_quantity, old_price, new_quantity, new_price, session=None
+    ):
+        SellerStats.apply_delta(
+            user_id,
+            session,
+            units_in_stock=(new_quantity or 0) - (old_quantity or 0),
+            inventory_value=(new_quantity or 0) * (new_price or 0.0)
+            - (old_quantity or 0) * (old_price or 0.0),
+        )
+
+    @staticmethod
+    def record_sale(user_id, units, unit_price, session=None):
+        """Move ``units`` sold at ``unit_price`` from stock to sales"""
+        SellerStats.apply_delta(
+            user_id,
+            session,
+            units_in_stock=-units,
+            inventory_value=-units * unit_price,
+            units_sold=units,
+            sales_revenue=units * unit_price,
+        )
+
+    @staticmethod
+    def compute_all(shard=None):
+        """Recompute the counters of every seller on ``shard``"""
+        from project.apps.invoices.models import Invoice, InvoiceItem, InvoiceStatus
+
+        shard = shard or shards.DEFAULT_SHARD
+        stats = {}
+
+        inventory = shard.session.query(
+            Product.user_id,
+            func.count(Product.id),
+            func.coalesce(func.sum(Product.quantity), 0),
+            func.coalesce(func.sum(Product.quantity * Product.price), 0.0),
+        ).group_by(Product.user_id)
+        for user_id, count, units, value in inventory:
+            row = stats.setdefault(user_id, SellerStats.empty(user_id))
+            row.product_count = count
+            row.units_in_stock = units
+            row.inventory_value = value
+
+        # Invoices live on the main database, so sales are summed per item
+        # seller there. Items older than their seller_id column are
+        # attributed through the shard's products instead.
+        sales = (
+            db.session.query(
+                InvoiceItem.product_id,
+                InvoiceItem.seller_id,
+                func.coalesce(func.sum(InvoiceItem.quantity), 0),
+                func.coalesce(
+                    func.sum(InvoiceItem.quantity * InvoiceItem.unit_price), 0.0
+                ),
+            )
+            .join(Invoice, Invoice.id == InvoiceItem.buyer_invoice_id)
+            .filter(Invoice.status == InvoiceStatus.DONE.value)
+        )
+        if shard is not shards.DEFAULT_SHARD:
+            sales = sales.filter(
+                InvoiceItem.product_id % shards.MAX_SHARDS == shard.index
+            )
+        sales = sales.group_by(InvoiceItem.product_id, InvoiceItem.seller_id).all()
+        unattributed = [
+            product_id for product_id, seller_id, _, _ in sales if seller_id is None
+        ]
+        owners = {}
+        for start in range(0, len(unattributed), 500):
+            owners.update(
+                shard.session.query(Product.id, Product.user_id).filter(
+                    Product.id.in_(unattributed[start : start + 500])
+                )
+            )
+        for product_id, user_id, units, revenue in sales:
+            if user_id is None:
+                user_id = owners.get(product_id)
+            if user_id is None:
+                continue  # Legacy item of a product deleted since
+            row = stats.setdefault(user_id, SellerStats.empty(user_id))
+            row.units_sold += units
+            row.sales_revenue += revenue
+
+        return stats
+
+    @staticmethod
+    def verify(tolerance=0.01):
+        """Return ``(user_id, counter, stored, expected)`` for every mismatch"""
+        mismatches = []
+        for shard in shards.all_shards():
+            expected = SellerStats.compute_all(shard)
+            stored = {row.user_id: row for row in shard.session.query(SellerStats)}
+            for user_id in sorted(set(expected) | set(stored)):
+                want = expected.get(user_id) or SellerStats.empty(user_id)
+                have = stored.get(user_id) or SellerStats.empty(user_id)
+                for counter in SellerStats.COUNTERS:
+                    if abs(getattr(have, counter) - getattr(want, counter)) > tolerance:
+                        mismatches.append(
+                            (user_id, counter, getattr(have, counter), getattr(want, counter))
+                        )
+        return mismatches
+
+    @staticmethod
+    def rebuild():
+        """Replace the table (on every shard) with freshly computed counters"""
+        total = 0
+        for shard in shards.all_shards():
+            rows = SellerStats.compute_all(shard)
+            now = datetime.utcnow()
+            shard.session.query(SellerStats).delete()
+            if rows:
+                shard.session.execute(
+                    SellerStats.__table__.insert(),
+                    [
+                        dict(
+                            user_id=row.user_id,
+                            updated_at=now,
+                            **{c: getattr(row, c) for c in SellerStats.COUNTERS},
+                        )
+                        for row in rows.values()
+                    ],
+                )
+            shard.session.commit()
+            total += len(rows)
+        return total
+
+
+class ChangeOp(Status):
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+
+
+class ProductChange(db.Model):
+    """Outbox of product writes, read by downstream consumers by cursor (id)
+
+    Rows are written in the same transaction as the product change, so the
+    feed never shows a change that was rolled back and never misses one
+    that committed.
+    """
+
+    __tablename__ = "product_changes"
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)
+    payload = db.Column(db.Text, nullable=True)
+    changed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (db.Index("ix_product_changes_product", "product_id", "id"),)
+
+    def to_dict(self):
+        return {
+            "cursor": self.id,
+            "product_id": self.product_id,
+            "user_id": self.user_id,
+            "op": self.op,
+            "changed_at": self.changed_at.isoformat(),
+            "product": json.loads(self.payload) if self.payload else None,
+        }
+
+    @staticmethod
+    def record(product, op, hold=False):
+        """Queue a change for ``product`` in the current transaction
+
+        ``hold=True`` for changes to ``reserved`` alone (see ``queue_product_event``).
+        """
+        from project.apps.products.events import queue_product_event
+
+        # The product's own session, which is its shard's when sharded
+        session = object_session(product) or db.session
+        deleted = op == ChangeOp.DELETE.value
+        if not deleted:
+            session.flush()  # Defaults and onupdate values for the snapshot
+        snapshot = product.to_dict()
+        session.add(
+            ProductChange(
+                product_id=product.id,
+                user_id=product.user_id,
+                op=op,
+                payload=None if deleted else json.dumps(snapshot),
+            )
+        )
+        queue_product_event(session, snapshot, deleted=deleted, hold=hold)
+
+    @staticmethod
+    def read(since, limit, shard=None):
+        """Up to ``limit`` changes after cursor ``since``, plus has_more
+
+        Ids are handed out at insert, not at commit: on Postgres or MySQL a
+        transaction holding a lower id can commit after a higher one was
+        read. Changes younger than ``PRODUCT_CHANGES_SETTLE_SECONDS`` stop
+        the batch to give such commits time to land, as ``fold_invoices``
+        does. SQLite serializes writers, so it needs no window by default.
+        """
+        session = (shard or shards.DEFAULT_SHARD).session
+        settle = current_app.config["PRODUCT_CHANGES_SETTLE_SECONDS"]
+        if settle is None:
+            settle = 0 if session.get_bind().dialect.name == "sqlite" else 2
+        rows = (
+            session.query(ProductChange)
+            .filter(ProductChange.id > since)
+            .order_by(ProductChange.id)
+            .limit(limit + 1)
+            .all()
+        )
+        if settle > 0:
+            cutoff = datetime.utcnow() - timedelta(seconds=settle)
+            for index, row in enumerate(rows):
+                if row.changed_at > cutoff:
+                    return rows[: min(index, limit)], index > limit
+        return rows[:limit], len(rows) > limit
+
+    @staticmethod
+    def read_all(cursors, limit):
+        """Read every shard from its own cursor, oldest changes first
+
+        ``cursors`` has one entry per shard. Returns the changes, the
+        advanced cursors and has_more. Per-product order is preserved
+        because a product's changes all live on one shard.
+        """
+        batches = []
+        has_more = False
+        for index, shard in enumerate(shards.all_shards()):
+            rows, more = ProductChange.read(cursors[index], limit, shard)
+            batches.append([(row.changed_at, index, row) for row in rows])
+            has_more = has_more or more
+        merged = list(heapq.merge(*batches, key=lambda entry: entry[:2]))
+        has_more = has_more or len(merged) > limit
+        cursors = list(cursors)
+        changes = []
+        for _, index, row in merged[:limit]:
+            cursors[index] = row.id
+            changes.append(row)
+        return changes, cursors, has_more
+
+    @staticmethod
+    def compact(batch_size=10000, tombstone_days=None):
+        """Drop changes superseded by a later one for the same product
+
+        Consumers only need the latest state of each product, so this is safe
+        for any cursor. With ``tombstone_days``, delete markers older than
+        that are dropped too. Consumers further behind than that must resync.
+        Returns the number of rows removed.
+        """
+        removed = 0
+        for shard in shards.all_shards():
+            session = shard.session
+            latest = (
+                session.query(
+                    ProductChange.product_id,
+                    func.max(ProductChange.id).label("last_id"),
+                )
+                .group_by(ProductChange.product_id)
+                .subquery()
+            )
+            while True:
+                ids = [
+                    row.id
+                    for row in session.query(ProductChange.id)
+                    .join(latest, latest.c.product_id == ProductChange.product_id)
+                    .filter(ProductChange.id < latest.c.last_id)
+                    .limit(batch_size)
+                ]
+                if not ids:
+                    break
+                session.query(ProductChange).filter(
+                    ProductChange.id.in_(ids)
+                ).delete(synchronize_session=False)
+                session.commit()
+                removed += len(ids)
+
+            if tombstone_days is not None:
+                cutoff = datetime.utcnow() - timedelta(days=tombstone_days)
+                removed += session.query(ProductChange).filter(
+                    ProductChange.op == ChangeOp.DELETE.value,
+                    ProductChange.changed_at < cutoff,
+                ).delete(synchronize_session=False)
+                session.commit()
+        return removed
+
+
+class AppliedSale(db.Model):
+    """Checkouts whose stock changes were applied to a product shard
+
+    Only used when products are sharded: checkout commits the invoice on the
+    main database and queues one job per shard. The job inserts this row in
+    the same transaction as the stock update, which makes retries harmless.
+    """
+
+    __tablename__ = "applied_sales"
+
+    invoice_id = db.Column(db.Integer, primary_key=True)
+    applied_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+def apply_sale(session, sales, invoice_id=None):
+    """Take sold units out of stock and out of the reserved count
+
+    ``sales`` maps product ids to ``(units, unit_price)``. With
+    ``invoice_id`` (sharded checkout) the sale is also recorded in
+    ``applied_sales``, so applying it twice is a no-op. Returns False if it
+    had already been applied.
+    """
+    if invoice_id is not None:
+        try:
+            with session.begin_nested():
+                session.add(AppliedSale(invoice_id=invoice_id))
+        except IntegrityError:
+            return False
+
+    table = Product.__table__
+    for product_id, (units, _) in sales.items():
+        session.execute(
+            table.update()
+            .where(table.c.id == product_id)
+            .values(
+                quantity=table.c.quantity - units,
+                reserved=table.c.reserved - units,
+            )
+        )
+    # Pick up the stock the bulk update just wrote
+    products = (
+        session.query(Product)
+        .filter(Product.id.in_(list(sales)))
+        .populate_existing()
+        .all()
+    )
+    for product in products:
+        units, unit_price = sales[product.id]
+        SellerStats.record_sale(product.user_id, units, unit_price, session=session)
+        ProductChange.record(product, ChangeOp.UPDATE.value)
+    return True
+
+
+class RelatedProduct(db.Model):
+    """Precomputed nearest neighbours of a product by text similarity
+
+    Built by ``products.related``; requests only read it. Kept on the main
+    database, since neighbours can live on any shard.
+    """
+
+    __tablename__ = "related_products"
+
+    product_id = db.Column(db.Integer, primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    related_id = db.Column(db.Integer, nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+
+
+class RelatedSource(db.Model):
+    """Digest of the text each product's neighbours were computed from"""
+
+    __tablename__ = "related_sources"
+
+    product_id = db.Column(db.Integer, primary_key=True)
+    digest = db.Column(db.String(40), nullable=False)
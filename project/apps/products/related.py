@@ -0,0 +1,282 @@
+"""Related products from TF-IDF cosine similarity
+
+``build`` turns every product's title (weighted double) and description
+into an L2-normalized TF-IDF row of a sparse matrix. Each product's top-k
+neighbours then come from ``matrix[block] @ matrix.T``, a block of rows at
+a time: a block is at most ``RELATED_BLOCK_CELLS`` dense scores, so memory
+does not grow with the square of the catalog.
+
+Only products whose text changed since the last build are scored again
+(``related_sources`` keeps a digest per product). Lists that contained a
+changed or deleted product are recomputed too. The other lists can only
+gain a changed product, which is merged in when it beats their k-th score.
+Term weights drift a little between full builds (``full=True``). A full
+build also swaps the lists in chunk by chunk, so readers keep the old lists
+until theirs is replaced and never see an empty table.
+"""
+
+import hashlib
+import re
+from collections import Counter
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func
+from project.config.extensions import db
+from project.apps.products import shards
+from project.apps.products.models import Product, RelatedProduct, RelatedSource
+
+TOKEN = re.compile(r"[a-z0-9]{2,}")
+TITLE_WEIGHT = 2
+LOAD_BATCH = 5000
+CHUNK = 500
+
+
+def digest(title, description):
+    return hashlib.sha1(f"{title}\0{description or ''}".encode()).hexdigest()
+
+
+def tokens(title, description):
+    words = TOKEN.findall((title or "").lower()) * TITLE_WEIGHT
+    return words + TOKEN.findall((description or "").lower())
+
+
+def load_products():
+    """``(id, title, description)`` of every product on every shard, by id"""
+    rows = []
+    for shard in shards.all_shards():
+        query = shard.session.query(Product.id, Product.title, Product.description)
+        rows.extend(tuple(row) for row in query.yield_per(LOAD_BATCH))
+    rows.sort()
+    return rows
+
+
+def tfidf(documents):
+    """L2-normalized TF-IDF rows (CSR) with sublinear term frequency"""
+    vocabulary = {}
+    indptr, indices, counts = [0], [], []
+    for document in documents:
+        terms = Counter(vocabulary.setdefault(term, len(vocabulary)) for term in document)
+        indices.extend(terms.keys())
+        counts.extend(terms.values())
+        indptr.append(len(indices))
+    matrix = sparse.csr_matrix(
+        (np.asarray(counts, dtype=np.float32), indices, indptr),
+        shape=(len(documents), max(len(vocabulary), 1)),
+    )
+    matrix.data = 1 + np.log(matrix.data)
+    document_frequency = np.bincount(matrix.indices, minlength=matrix.shape[1])
+    idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1
+    matrix = (matrix @ sparse.diags(idf.astype(np.float32))).tocsr()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return (sparse.diags((1 / norms).astype(np.float32)) @ matrix).tocsr()
+
+
+def score_blocks(matrix, rows, block_cells):
+    """``(rows of the block, dense scores against every product)`` per block"""
+    transposed = matrix.T.tocsr()
+    per_block = max(1, block_cells // max(matrix.shape[0], 1))
+    for start in range(0, len(rows), per_block):
+        block = rows[start : start + per_block]
+        scores = (matrix[block] @ transposed).toarray()
+        scores[np.arange(len(block)), block] = 0  # Not related to itself
+        yield block, scores
+
+
+def best(scores, k, min_score):
+    """Per row of ``scores``: its top ``k`` columns and scores, best first"""
+    k = min(k, scores.shape[1])
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    for columns, values in zip(top, top_scores):
+        keep = (values > 0) & (values >= min_score)
+        yield columns[keep], values[keep]
+
+
+def chunks(values):
+    values = list(values)
+    for start in range(0, len(values), CHUNK):
+        yield values[start : start + CHUNK]
+
+
+def lists_containing(product_ids):
+    """Products whose neighbour list includes any of ``product_ids``"""
+    found = set()
+    for chunk in chunks(product_ids):
+        found.update(
+            product_id
+            for product_id, in db.session.query(RelatedProduct.product_id)
+            .filter(RelatedProduct.related_id.in_(chunk))
+            .distinct()
+        )
+    return found
+
+
+def entry_thresholds(ids, k, min_score):
+    """Score a newcomer must reach to enter each product's current list"""
+    thresholds = np.full(len(ids), min_score, dtype=np.float32)
+    position = {product_id: i for i, product_id in enumerate(ids.tolist())}
+    full_lists = (
+        db.session.query(RelatedProduct.product_id, func.min(RelatedProduct.score))
+        .group_by(RelatedProduct.product_id)
+        .having(func.count() >= k)
+    )
+    for product_id, lowest in full_lists:
+        if product_id in position:
+            thresholds[position[product_id]] = max(lowest, min_score)
+    return thresholds
+
+
+def write_lists(lists):
+    """Replace the neighbour lists of ``{product_id: [(score, related_id)]}``"""
+    table = RelatedProduct.__table__
+    for chunk in chunks(lists):
+        db.session.execute(table.delete().where(table.c.product_id.in_(chunk)))
+        rows = [
+            {"product_id": product_id, "rank": rank, "related_id": related_id, "score": score}
+            for product_id in chunk
+            for rank, (score, related_id) in enumerate(lists[product_id])
+        ]
+        if rows:
+            db.session.execute(table.insert(), rows)
+        db.session.commit()
+
+
+def merge_candidates(candidates, k):
+    """Merge newcomers into otherwise unchanged lists"""
+    merged = {}
+    for chunk in chunks(candidates):
+        current = {product_id: {} for product_id in chunk}
+        for product_id, related_id, score in db.session.query(
+            RelatedProduct.product_id, RelatedProduct.related_id, RelatedProduct.score
+        ).filter(RelatedProduct.product_id.in_(chunk)):
+            current[product_id][related_id] = score
+        for product_id in chunk:
+            scores = current[product_id]
+            for score, related_id in candidates[product_id]:
+                scores[related_id] = score
+            merged[product_id] = sorted(
+                ((score, related_id) for related_id, score in scores.items()),
+                key=lambda item: (-item[0], item[1]),
+            )[:k]
+    write_lists(merged)
+
+
+def write_sources(digests, deleted):
+    table = RelatedSource.__table__
+    for chunk in chunks(deleted):
+        db.session.execute(table.delete().where(table.c.product_id.in_(chunk)))
+        db.session.execute(
+            RelatedProduct.__table__.delete().where(
+                RelatedProduct.__table__.c.product_id.in_(chunk)
+            )
+        )
+    for chunk in chunks(digests):
+        db.session.execute(table.delete().where(table.c.product_id.in_(chunk)))
+        db.session.execute(
+            table.insert(),
+            [{"product_id": product_id, "digest": digests[product_id]} for product_id in chunk],
+        )
+    db.session.commit()
+
+
+def drop_orphans(product_ids):
+    """Delete the lists of products not in ``product_ids`` (gone since)"""
+    table = RelatedProduct.__table__
+    orphans = [
+        product_id
+        for product_id, in db.session.query(RelatedProduct.product_id).distinct()
+        if product_id not in product_ids
+    ]
+    for chunk in chunks(orphans):
+        db.session.execute(table.delete().where(table.c.product_id.in_(chunk)))
+        db.session.commit()
+
+
+def build(k, min_score, block_cells, full=False):
+    """Refresh the related products table; returns how many lists were rebuilt"""
+    products = load_products()
+    ids = np.array([row[0] for row in products], dtype=np.int64)
+    position = {product_id: i for i, product_id in enumerate(ids.tolist())}
+    digests = {row[0]: digest(row[1], row[2]) for row in products}
+    stored = dict(db.session.query(RelatedSource.product_id, RelatedSource.digest))
+
+    full = full or not stored
+    changed = [pid for pid, value in digests.items() if full or stored.get(pid) != value]
+    deleted = [pid for pid in stored if pid not in digests]
+    if not full and not changed and not deleted:
+        return 0
+
+    recompute = set(changed)
+    if not full:
+        recompute |= lists_containing(changed + deleted) & position.keys()
+        thresholds = entry_thresholds(ids, k, min_score)
+        changed_positions = np.array([position[pid] for pid in changed], dtype=np.int64)
+    rows = np.array(sorted(position[pid] for pid in recompute), dtype=np.int64)
+    skip = np.zeros(len(ids), dtype=bool)
+    skip[rows] = True
+
+    lists, candidates = {}, {}
+    if len(ids) > 1:
+        matrix = tfidf([tokens(row[1], row[2]) for row in products])
+        for block, scores in score_blocks(matrix, rows, block_cells):
+            for row, (columns, values) in zip(block, best(scores, k, min_score)):
+                lists[int(ids[row])] = list(
+                    zip(values.astype(float).tolist(), ids[columns].tolist())
+                )
+            if full:
+                continue
+            # Cosine is symmetric: a changed product's row is also its
+            # score in every other product's list
+            from_changed = np.isin(block, changed_positions)
+            scores = scores[from_changed]
+            hits = (scores > 0) & (scores >= thresholds) & ~skip
+            for source, column in zip(*np.nonzero(hits)):
+                candidates.setdefault(int(ids[column]), []).append(
+                    (float(scores[source, column]), int(ids[block[from_changed][source]]))
+                )
+    else:
+        lists = {int(product_id): [] for product_id in ids[rows]}
+
+    # Neighbour lists first, digests last, so a crash in between only
+    # means the same products are scored again next time
+    merge_candidates(candidates, k)
+    write_lists(lists)
+    write_sources({pid: digests[pid] for pid in changed}, deleted)
+    if full:
+        # Every current product's list was swapped in above
+        drop_orphans(position)
+    return len(lists) + len(candidates)
+
+
+def related_products(product_id, limit, user_id=None):
+    """``[(Product, score)]`` for ``product_id``, best first; no scoring here
+
+    Unsharded this is one indexed join; sharded, the neighbour ids are read
+    and the products fetched with one IN query per shard.
+    """
+    if not shards.enabled():
+        query = (
+            db.session.query(Product, RelatedProduct.score)
+            .join(RelatedProduct, RelatedProduct.related_id == Product.id)
+            .filter(RelatedProduct.product_id == product_id)
+        )
+        if user_id is not None:
+            query = query.filter(Product.user_id == user_id)
+        return query.order_by(RelatedProduct.rank).limit(limit).all()
+
+    neighbours = (
+        db.session.query(RelatedProduct.related_id, RelatedProduct.score)
+        .filter(RelatedProduct.product_id == product_id)
+        .order_by(RelatedProduct.rank)
+        .all()
+    )
+    found = shards.get_products([related_id for related_id, _ in neighbours], user_id)
+    return [
+        (found[related_id], score)
+        for related_id, score in neighbours
+        if related_id in found
+    ][:limit]
@@ -0,0 +1,303 @@
+"""Optional sharding of the products app by seller
+
+With ``PRODUCT_SHARDS`` empty there is one pseudo shard wrapping
+``db.session`` and nothing changes. Otherwise it lists ``SQLALCHEMY_BINDS``
+keys. A seller's products, seller_stats and product_changes rows all live on
+one shard, so every product write stays a single local transaction. The
+shard comes from ``PRODUCT_SHARD_MAP`` (``seller_id=bind,...``, for pinning
+big sellers to their own database) or else ``user_id % len(shards)``.
+
+Product ids carry their shard in the low bits, ``id = seq * MAX_SHARDS +
+index``, so a lookup by id needs no directory. Each shard hands out
+sequence numbers in blocks from its ``shard_sequences`` row.
+
+Pin a seller before their first product: moving a seller that already has
+products needs a data migration, which is not provided.
+"""
+
+import heapq
+import threading
+from functools import lru_cache
+from flask import current_app
+from flask.globals import app_ctx
+from flask_sqlalchemy.query import Query
+from sqlalchemy import MetaData, Table, Column, String, Integer
+from sqlalchemy.orm import scoped_session, sessionmaker
+from project.config.extensions import db
+
+MAX_SHARDS = 64
+ID_BLOCK = 100
+SHARD_TABLES = ("products", "seller_stats", "product_changes", "applied_sales")
+EXTENSION_KEY = "product_shards"
+
+
+def _app_ctx_id():
+    return id(app_ctx._get_current_object())
+
+
+@lru_cache(maxsize=None)
+def shard_metadata():
+    """The shard-local tables, without foreign keys to the main database"""
+    metadata = MetaData()
+    for name in SHARD_TABLES:
+        table = db.metadata.tables[name].to_metadata(metadata)
+        for constraint in list(table.foreign_key_constraints):
+            table.constraints.discard(constraint)
+        table.foreign_keys.clear()
+        for column in table.columns:
+            column.foreign_keys.clear()
+    Table(
+        "shard_sequences",
+        metadata,
+        Column("name", String(50), primary_key=True),
+        Column("next_value", Integer, nullable=False),
+    )
+    return metadata
+
+
+class DefaultShard:
+    """Everything on the main database (sharding disabled)"""
+
+    index = 0
+    key = None
+
+    @property
+    def session(self):
+        return db.session
+
+    def owns(self, product_id):
+        return True
+
+    def allocate_ids(self, count):
+        """Leave ids to the database's autoincrement"""
+        return None
+
+
+class Shard:
+    def __init__(self, index, key, engine):
+        self.index = index
+        self.key = key
+        self.engine = engine
+        self.session = scoped_session(
+            sessionmaker(bind=engine, query_cls=Query), _app_ctx_id
+        )
+        self.lock = threading.Lock()
+        self.next_seq = self.last_seq = 0
+
+    def __repr__(self):
+        return f"<Shard {self.index} {self.key}>"
+
+    def owns(self, product_id):
+        return product_id % MAX_SHARDS == self.index
+
+    def _reserve(self, count):
+        """Take ``count`` sequence numbers in their own committed transaction
+
+        The UPDATE locks the row until commit, so the SELECT after it reads
+        this transaction's value on every backend; MySQL has no RETURNING.
+        """
+        table = shard_metadata().tables["shard_sequences"]
+        with self.engine.begin() as connection:
+            connection.execute(
+                table.update()
+                .where(table.c.name == "products")
+                .values(next_value=table.c.next_value + count)
+            )
+            end = connection.execute(
+                table.select()
+                .with_only_columns(table.c.next_value)
+                .where(table.c.name == "products")
+            ).scalar_one()
+        return end - count
+
+    def allocate_ids(self, count):
+        """``count`` unused product ids, as a range"""
+        if count > ID_BLOCK:
+            first = self._reserve(count)
+        else:
+            with self.lock:
+                if self.last_seq - self.next_seq < count:
+                    self.next_seq = self._reserve(ID_BLOCK)
+                    self.last_seq = self.next_seq + ID_BLOCK
+                first = self.next_seq
+                self.next_seq += count
+        return range(
+            first * MAX_SHARDS + self.index,
+            (first + count) * MAX_SHARDS + self.index,
+            MAX_SHARDS,
+        )
+
+    def create_tables(self):
+        metadata = shard_metadata()
+        metadata.create_all(self.engine)
+        table = metadata.tables["shard_sequences"]
+        with self.engine.begin() as connection:
+            exists = connection.execute(
+                table.select().where(table.c.name == "products")
+            ).first()
+            if not exists:
+                connection.execute(table.insert().values(name="products", next_value=1))
+
+    def drop_tables(self):
+        shard_metadata().drop_all(self.engine)
+
+
+DEFAULT_SHARD = DefaultShard()
+
+
+def parse_shard_map(spec, keys):
+    """``"7=big,9=big"`` -> ``{7: index of "big", 9: ...}``"""
+    overrides = {}
+    for part in spec.split(","):
+        seller_id, _, key = part.strip().partition("=")
+        if not seller_id:
+            continue
+        if key not in keys:
+            raise ValueError(f"PRODUCT_SHARD_MAP names unknown shard {key}")
+        overrides[int(seller_id)] = keys.index(key)
+    return overrides
+
+
+def init_app(app):
+    """Set up one session per configured shard bind"""
+    keys = [key.strip() for key in app.config["PRODUCT_SHARDS"].split(",") if key.strip()]
+    if not keys:
+        return
+    if len(keys) > MAX_SHARDS:
+        raise ValueError(f"At most {MAX_SHARDS} product shards are supported")
+    with app.app_context():
+        engines = db.engines
+        missing = [key for key in keys if key not in engines]
+        if missing:
+            raise ValueError(f"PRODUCT_SHARDS names unknown binds: {', '.join(missing)}")
+        shards = [Shard(index, key, engines[key]) for index, key in enumerate(keys)]
+    app.extensions[EXTENSION_KEY] = {
+        "shards": shards,
+        "overrides": parse_shard_map(app.config["PRODUCT_SHARD_MAP"], keys),
+    }
+
+    @app.teardown_appcontext
+    def remove_shard_sessions(exception=None):
+        for shard in shards:
+            shard.session.remove()
+
+
+def _state():
+    return current_app.extensions.get(EXTENSION_KEY)
+
+
+def enabled():
+    return _state() is not None
+
+
+def all_shards():
+    state = _state()
+    return state["shards"] if state else [DEFAULT_SHARD]
+
+
+def for_seller(user_id):
+    state = _state()
+    if not state:
+        return DEFAULT_SHARD
+    user_id = int(user_id)
+    index = state["overrides"].get(user_id, user_id % len(state["shards"]))
+    return state["shards"][index]
+
+
+def for_product(product_id):
+    """The shard holding ``product_id``, or None if no shard could"""
+    state = _state()
+    if not state:
+        return DEFAULT_SHARD
+    index = int(product_id) % MAX_SHARDS
+    if index >= len(state["shards"]):
+        return None
+    return state["shards"][index]
+
+
+def group_ids(product_ids):
+    """``{shard: [ids]}`` for ids that map onto a shard"""
+    groups = {}
+    for product_id in product_ids:
+        shard = for_product(product_id)
+        if shard is not None:
+            groups.setdefault(shard, []).append(product_id)
+    return groups
+
+
+def get_products(product_ids, user_id=None):
+    """``{id: Product}`` in one IN query per shard involved"""
+    from project.apps.products.models import Product
+
+    found = {}
+    for shard, ids in group_ids(product_ids).items():
+        query = shard.session.query(Product).filter(Product.id.in_(ids))
+        if user_id is not None:
+            query = query.filter_by(user_id=user_id)
+        found.update((product.id, product) for product in query)
+    return found
+
+
+def product_owners(product_ids):
+    """``{product_id: seller_id}`` for the ids that still exist"""
+    from project.apps.products.models import Product
+
+    owners = {}
+    for shard, ids in group_ids(product_ids).items():
+        owners.update(
+            shard.session.query(Product.id, Product.user_id).filter(Product.id.in_(ids))
+        )
+    return owners
+
+
+def merged_page(queries, key, limit, after=None, offset=0):
+    """One page of rows ordered by ``key`` across several shards
+
+    Each shard returns its first ``offset + limit`` rows after ``after``,
+    already in order, and they are merged. With keyset paging (``after``,
+    no offset) that is O(shards * limit) whatever the page depth; offset
+    paging grows with the offset. Returns the rows and whether more remain.
+    """
+    streams = []
+    for query in queries:
+        if after is not None:
+            query = query.filter(key > after)
+        streams.append(query.order_by(key).limit(offset + limit + 1).all())
+    merged = list(heapq.merge(*streams, key=lambda row: getattr(row, key.key)))
+    return merged[offset : offset + limit], len(merged) > offset + limit
+
+
+def commit_shards():
+    """Commit product writes on every shard, after the main session
+
+    A request that touches both the main database and a shard is not atomic
+    across the two. Callers commit the main session first and pick which
+    side that is so that a crash in between errs on the safe side.
+    """
+    if enabled():
+        for shard in all_shards():
+            shard.session.commit()
+
+
+def rollback_shards():
+    if enabled():
+        for shard in all_shards():
+            shard.session.rollback()
+
+
+def remove_sessions():
+    """Give back every session's connection, e.g. before a long stream"""
+    db.session.remove()
+    if enabled():
+        for shard in all_shards():
+            shard.session.remove()
+
+
+def create_all():
+    for shard in all_shards() if enabled() else []:
+        shard.create_tables()
+
+
+def drop_all():
+    for shard in all_shards() if enabled() else []:
+        shard.drop_tables()
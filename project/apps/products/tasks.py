@@ -0,0 +1,45 @@
+"""Products background jobs"""
+
+from flask import current_app
+from project.apps.jobs.registry import task
+from project import storage
+from project.apps.products import shards
+from project.apps.products.models import apply_sale
+from project.apps.products import related
+
+
+@task("products.delete_image", queue="images")
+def delete_image(path):
+    """Remove a replaced or deleted product's image from storage"""
+    storage.delete(path)
+
+
+def sale_not_applied(error, invoice_id, sales):
+    """Checkout is paid but its units stay reserved on the shard: alert"""
+    current_app.logger.error(
+        f"Invoice {invoice_id}: the sold units of products "
+        f"{', '.join(str(sale[0]) for sale in sales)} were never taken out of "
+        "stock and stay reserved. Fix the shard, then run "
+        "`main.py retry-failed-jobs --task products.apply_sale`.\n" + (error or "")
+    )
+
+
+@task("products.apply_sale", max_attempts=20, on_failure=sale_not_applied)
+def apply_sharded_sale(invoice_id, sales):
+    """Apply one shard's part of a checkout (sharded products only)"""
+    sales = {product_id: (units, price) for product_id, units, price in sales}
+    shard = shards.for_product(next(iter(sales)))
+    apply_sale(shard.session, sales, invoice_id=invoice_id)
+    shard.session.commit()
+
+
+@task("products.build_related", queue="maintenance", every=3600)
+def build_related(full=False):
+    """Refresh related products for products whose text changed"""
+    config = current_app.config
+    related.build(
+        config["RELATED_PRODUCTS_K"],
+        config["RELATED_MIN_SCORE"],
+        config["RELATED_BLOCK_CELLS"],
+        full=full,
+    )
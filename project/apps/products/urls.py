@@ -8,15 +8,36 @@ products_bp = Blueprint("products", __name__)
 # Register routes
 products_bp.add_url_rule("", "create_product", views.create_product, methods=["POST"])
 products_bp.add_url_rule("", "get_products", views.get_products, methods=["GET"])
+products_bp.add_url_rule(
+    "/facets", "get_product_facets", views.get_product_facets, methods=["GET"]
+)
+products_bp.add_url_rule(
+    "/batch", "get_products_batch", views.get_products_batch, methods=["POST"]
+)
 products_bp.add_url_rule(
     "/<int:product_id>", "get_product", views.get_product, methods=["GET"]
 )
+products_bp.add_url_rule(
+    "/<int:product_id>/related",
+    "get_related_products",
+    views.get_related_products,
+    methods=["GET"],
+)
 products_bp.add_url_rule(
     "/<int:product_id>", "update_product", views.update_product, methods=["PUT"]
 )
 products_bp.add_url_rule(
     "/<int:product_id>", "delete_product", views.delete_product, methods=["DELETE"]
 )
+products_bp.add_url_rule(
+    "/stream", "stream_products", views.stream_products, methods=["GET"]
+)
+products_bp.add_url_rule(
+    "/changes", "get_product_changes", views.get_product_changes, methods=["GET"]
+)
+products_bp.add_url_rule(
+    "/stats", "get_seller_stats", views.get_seller_stats, methods=["GET"]
+)
 products_bp.add_url_rule(
     "/upload-image", "upload_image", views.upload_image, methods=["POST"]
 )
@@ -1,5 +1,10 @@
 """Product form validators"""
 
+from datetime import datetime, timezone
+
+MAX_PRICE_BUCKETS = 50
+MAX_TOP_SELLERS = 100
+
 
 def validate_product(data, is_update=False):
     """Validate product data"""
@@ -39,3 +44,56 @@ def validate_product(data, is_update=False):
             errors.append("Price must be a valid number")
 
     return len(errors) == 0, errors
+
+
+def validate_facets(args):
+    """Validate a facet query; returns (is_valid, errors, query)"""
+    errors = []
+    query = {}
+
+    for name in ("min_price", "max_price"):
+        if args.get(name) is None:
+            query[name] = None
+            continue
+        try:
+            query[name] = float(args[name])
+        except (TypeError, ValueError):
+            errors.append(f"{name} must be a valid number")
+
+    in_stock = args.get("in_stock")
+    if in_stock is None:
+        query["in_stock"] = None
+    elif in_stock.lower() in ("1", "true", "0", "false"):
+        query["in_stock"] = in_stock.lower() in ("1", "true")
+    else:
+        errors.append("in_stock must be true or false")
+
+    try:
+        query["seller_ids"] = [int(value) for value in args.getlist("seller_id")]
+    except (TypeError, ValueError):
+        errors.append("seller_id must be an integer")
+
+    for name in ("created_after", "created_before"):
+        if args.get(name) is None:
+            query[name] = None
+            continue
+        try:
+            value = datetime.fromisoformat(args[name])
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            query[name] = value
+        except (TypeError, ValueError):
+            errors.append(f"{name} must be an ISO 8601 datetime")
+
+    for name, default, limit in (
+        ("buckets", 10, MAX_PRICE_BUCKETS),
+        ("top_sellers", 10, MAX_TOP_SELLERS),
+    ):
+        try:
+            query[name] = int(args.get(name, default))
+            if not 1 <= query[name] <= limit:
+                errors.append(f"{name} must be between 1 and {limit}")
+        except (TypeError, ValueError):
+            errors.append(f"{name} must be an integer")
+
+    return len(errors) == 0, errors, query
@@ -1,45 +1,143 @@
 """Products views (route handlers)"""
 
-from flask import request, jsonify, send_from_directory
+import json
+import time
+from flask import (
+    Response,
+    current_app,
+    request,
+    jsonify,
+    stream_with_context,
+)
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
 import os
 from project.config.extensions import db
-from project.apps.products.models import Product
-from project.apps.products.validators import validate_product
+from project.apps.products.models import (
+    Product,
+    SellerStats,
+    ProductChange,
+    ChangeOp,
+)
+from project.apps.products.validators import validate_facets, validate_product
+from project.apps.products.tasks import delete_image
+from project.apps.products import catalog, shards
+from project.apps.products.related import related_products
+from project.compression import PrecompressedCache
+from project.cache import get_cache
 from project.apps.auth.models import User, UserRole
+from project.apps.uploads.models import Upload
 from project.apps.auth.decorators import seller_required, admin_required
+from project.apps.idempotency.decorators import idempotent
+from project.apps.products.events import broker, product_event
+from project import storage
 
-UPLOAD_FOLDER = "uploads/products"
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
 
 
+def catalog_cache():
+    """This app's cache of buyer-wide listing pages, dropped on product writes"""
+    cache = current_app.extensions.get("catalog_cache")
+    if cache is None:
+        config = current_app.config
+        shared = get_cache()
+        cache = current_app.extensions.setdefault(
+            "catalog_cache",
+            PrecompressedCache(
+                config["RESPONSE_CACHE_MAX_ENTRIES"],
+                config["RESPONSE_CACHE_SECONDS"],
+                shared=shared,
+                namespace="catalog",
+            ),
+        )
+        # Local commits; other workers' too while SSE tails the change feed,
+        # unless the shared tier already passes their clears on. Cart holds
+        # only move ``available``, which may lag until the page expires.
+        broker.add_listener(cache.clear, remote=shared is None, holds=False)
+    return cache
+
+
+def parse_ids(raw, limit):
+    """Parse ``1,2,3`` into unique positive ints; returns (ids, error)"""
+    try:
+        ids = [int(part) for part in raw.split(",") if part.strip()]
+    except ValueError:
+        return None, "ids must be a comma separated list of integers"
+    return check_ids(ids, limit)
+
+
+def check_ids(ids, limit):
+    """Sorted unique ``ids``, or an error if empty, not positive or too many"""
+    ids = sorted(set(ids))
+    if not ids or ids[0] < 1:
+        return None, "ids must contain positive product ids"
+    if len(ids) > limit:
+        return None, f"At most {limit} ids are allowed"
+    return ids, None
+
+
+def find_product(product_id, user_id=None):
+    """Look a product up on its shard; ``user_id`` restricts it to that seller"""
+    shard = shards.for_product(product_id)
+    if shard is None:
+        return None
+    query = shard.session.query(Product).filter_by(id=product_id)
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    return query.first()
+
+
+def products_by_ids(user, ids):
+    """Visible products among ``ids`` (one IN query per shard) plus the rest"""
+    owner = None
+    if not (user.role == UserRole.BUYER or user.role == UserRole.ADMIN):
+        owner = user.id
+    found = shards.get_products(ids, user_id=owner)
+    return (
+        jsonify(
+            {
+                "products": [found[pid].to_dict() for pid in ids if pid in found],
+                "missing": [pid for pid in ids if pid not in found],
+            }
+        ),
+        200,
+    )
+
+
+def claim_upload(data, user_id):
+    """Path of the completed upload named by ``upload_id``, taken for a product
+
+    Returns ``(path, error response)``; both None without ``upload_id``.
+    """
+    upload_id = data.get("upload_id")
+    if not upload_id:
+        return None, None
+    path = Upload.claim(str(upload_id), user_id)
+    if not path:
+        return None, (jsonify({"error": "Upload not found or not complete"}), 400)
+    return path, None
+
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
 def save_product_image(file, product_id):
-    """Save product image to local storage"""
+    """Save product image to the configured storage"""
     if file and allowed_file(file.filename):
-        # Create upload directory if it doesn't exist
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
         # Generate secure filename
         filename = secure_filename(file.filename)
         ext = filename.rsplit(".", 1)[1].lower()
         new_filename = f"product_{product_id}_{os.urandom(8).hex()}.{ext}"
 
-        # Save file
-        filepath = os.path.join(UPLOAD_FOLDER, new_filename)
-        file.save(filepath)
-
-        return filepath
+        return storage.save(file.stream, new_filename)
     return None
 
 
 @jwt_required()
 @seller_required
+@idempotent
 def upload_image():
     """Upload an image and return the path (sellers and admins only)"""
     if "image" not in request.files:
@@ -61,17 +159,12 @@ def upload_image():
         )
 
     try:
-        # Create upload directory if it doesn't exist
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
         # Generate secure filename
         filename = secure_filename(image_file.filename)
         ext = filename.rsplit(".", 1)[1].lower()
         new_filename = f"temp_{os.urandom(16).hex()}.{ext}"
 
-        # Save file
-        filepath = os.path.join(UPLOAD_FOLDER, new_filename)
-        image_file.save(filepath)
+        filepath = storage.save(image_file.stream, new_filename)
 
         return (
             jsonify({"message": "Image uploaded successfully", "image_path": filepath}),
@@ -83,6 +176,7 @@ def upload_image():
 
 @jwt_required()
 @seller_required
+@idempotent
 def create_product():
     """Create a new product (sellers and admins only)"""
     current_user_id = get_jwt_identity()
@@ -99,8 +193,16 @@ def create_product():
     if not is_valid:
         return jsonify({"errors": errors}), 400
 
-    # Create new product
+    uploaded_path, error = claim_upload(data, current_user_id)
+    if error:
+        return error
+
+    # Create new product on the seller's shard
+    shard = shards.for_seller(current_user_id)
+    session = shard.session
+    ids = shard.allocate_ids(1)
     new_product = Product(
+        id=ids[0] if ids else None,
         title=data["title"],
         description=data.get("description", ""),
         quantity=int(data.get("quantity", 0)),
@@ -109,15 +211,19 @@ def create_product():
     )
 
     try:
-        db.session.add(new_product)
-        db.session.flush()  # Get product ID before commit
+        session.add(new_product)
+        session.flush()  # Get product ID before commit
 
-        if image_file:
+        if uploaded_path:
+            new_product.image_path = uploaded_path
+        elif image_file:
             image_path = save_product_image(image_file, new_product.id)
             if image_path:
                 new_product.image_path = image_path
 
-        db.session.commit()
+        SellerStats.record_product(new_product, session=session)
+        ProductChange.record(new_product, ChangeOp.CREATE.value)
+        session.commit()
         return (
             jsonify(
                 {
@@ -128,7 +234,9 @@ def create_product():
             201,
         )
     except Exception as e:
-        db.session.rollback()
+        session.rollback()
+        if uploaded_path:
+            Upload.release(str(data["upload_id"]), current_user_id)
         return jsonify({"error": f"Failed to create product: {str(e)}"}), 500
 
 
@@ -136,44 +244,100 @@ def create_product():
 def get_products():
     """Get all products (buyers see all, sellers see their own)"""
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = User.access(current_user_id)
+
+    if "ids" in request.args:
+        ids, error = parse_ids(
+            request.args["ids"], current_app.config["PRODUCT_BATCH_MAX_IDS"]
+        )
+        if error:
+            return jsonify({"errors": [error]}), 400
+        return products_by_ids(user, ids)
 
     # Get query parameters for pagination
     page = request.args.get("page", 1, type=int)
     per_page = request.args.get("per_page", 10, type=int)
+    after = request.args.get("after", type=int)
 
+    cache = None
     if user.role == UserRole.BUYER or user.role == UserRole.ADMIN:
-        products = Product.query.paginate(page=page, per_page=per_page, error_out=False)
+        # The same for every buyer, so whole pages are cached precompressed
+        if current_app.config["RESPONSE_CACHE_SECONDS"] > 0:
+            cache = catalog_cache()
+            key = tuple(sorted(request.args.items(multi=True)))
+            entry = cache.get(key)
+            if entry is not None:
+                return cache.respond(entry)
+            generation = cache.generation
+        queries = [shard.session.query(Product) for shard in shards.all_shards()]
+    else:
+        shard = shards.for_seller(current_user_id)
+        queries = [shard.session.query(Product).filter_by(user_id=current_user_id)]
+
+    if after is not None:
+        # Keyset paging, merged across shards; cost does not grow with depth
+        items, has_more = shards.merged_page(queries, Product.id, per_page, after=after)
+        body = {
+            "products": [product.to_dict() for product in items],
+            "next_after": items[-1].id if items else None,
+            "has_more": has_more,
+        }
+
+    elif len(queries) == 1:
+        products = queries[0].paginate(page=page, per_page=per_page, error_out=False)
+        body = {
+            "products": [product.to_dict() for product in products.items],
+            "total": products.total,
+            "page": products.page,
+            "pages": products.pages,
+        }
     else:
-        products = Product.query.filter_by(user_id=current_user_id).paginate(
-            page=page, per_page=per_page, error_out=False
+        page, per_page = max(page, 1), max(per_page, 1)
+        items, _ = shards.merged_page(
+            queries, Product.id, per_page, offset=(page - 1) * per_page
         )
+        total = sum(query.order_by(None).count() for query in queries)
+        body = {
+            "products": [product.to_dict() for product in items],
+            "total": total,
+            "page": page,
+            "pages": -(-total // per_page),
+        }
 
-    return (
-        jsonify(
-            {
-                "products": [product.to_dict() for product in products.products],
-                "total": products.total,
-                "page": products.page,
-                "pages": products.pages,
-            }
-        ),
-        200,
-    )
+    response = jsonify(body)
+    if cache is None:
+        return response, 200
+    return cache.respond(cache.put(key, response.get_data(), generation), hit=False)
+
+
+@jwt_required()
+def get_products_batch():
+    """Get up to PRODUCT_BATCH_MAX_IDS products by id: {"ids": [1, 2, 3]}"""
+    current_user_id = get_jwt_identity()
+    user = User.access(current_user_id)
+
+    data = request.get_json(silent=True) or {}
+    raw = data.get("ids")
+    if not isinstance(raw, list) or not all(
+        isinstance(pid, int) and not isinstance(pid, bool) for pid in raw
+    ):
+        return jsonify({"errors": ["ids must be a list of integers"]}), 400
+    ids, error = check_ids(raw, current_app.config["PRODUCT_BATCH_MAX_IDS"])
+    if error:
+        return jsonify({"errors": [error]}), 400
+    return products_by_ids(user, ids)
 
 
 @jwt_required()
 def get_product(product_id):
     """Get a single product"""
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = User.access(current_user_id)
 
     if user.role == UserRole.BUYER or user.role == UserRole.ADMIN:
-        product = Product.query.get(product_id)
+        product = find_product(product_id)
     else:
-        product = Product.query.filter_by(
-            id=product_id, user_id=current_user_id
-        ).first()
+        product = find_product(product_id, current_user_id)
 
     if not product:
         return jsonify({"error": "Product not found"}), 404
@@ -181,22 +345,83 @@ def get_product(product_id):
     return jsonify({"product": product.to_dict()}), 200
 
 
+@jwt_required()
+def get_product_facets():
+    """Facet counts and a price histogram for a filter, from the catalog snapshot
+
+    Filters: min_price, max_price, in_stock, seller_id (repeatable),
+    created_after, created_before. Each facet is counted with every filter
+    except its own, so a storefront can show the alternatives.
+    """
+    current_user_id = get_jwt_identity()
+    user = User.access(current_user_id)
+
+    is_valid, errors, query = validate_facets(request.args)
+    if not is_valid:
+        return jsonify({"errors": errors}), 400
+
+    try:
+        columns, stats = catalog.columns_and_stats()
+    except catalog.CatalogTooLarge as e:
+        return jsonify({"error": str(e)}), 503
+
+    seller_id = None
+    if not (user.role == UserRole.BUYER or user.role == UserRole.ADMIN):
+        seller_id = user.id
+    started = time.perf_counter()
+    body = catalog.facets(columns, query, seller_id=seller_id)
+    body["snapshot"] = {
+        **stats,
+        "compute_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+    return jsonify(body), 200
+
+
+@jwt_required()
+def get_related_products(product_id):
+    """Products similar to ``product_id``, from the precomputed neighbour table"""
+    current_user_id = get_jwt_identity()
+    user = User.access(current_user_id)
+    max_limit = current_app.config["RELATED_PRODUCTS_K"]
+    limit = request.args.get("limit", max_limit, type=int)
+    if limit < 1 or limit > max_limit:
+        return jsonify({"error": f"limit must be between 1 and {max_limit}"}), 400
+
+    owner = None
+    if not (user.role == UserRole.BUYER or user.role == UserRole.ADMIN):
+        owner = user.id
+    if not find_product(product_id, owner):
+        return jsonify({"error": "Product not found"}), 404
+    related = related_products(product_id, limit, user_id=owner)
+    return (
+        jsonify(
+            {
+                "product_id": product_id,
+                "related": [
+                    {**product.to_dict(), "score": round(score, 4)}
+                    for product, score in related
+                ],
+            }
+        ),
+        200,
+    )
+
+
 @jwt_required()
 @seller_required
 def update_product(product_id):
     """Update a product (sellers can update their own, admins can update any)"""
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = User.access(current_user_id)
 
     if user.role == UserRole.ADMIN:
-        product = Product.query.get(product_id)
+        product = find_product(product_id)
     else:
-        product = Product.query.filter_by(
-            id=product_id, user_id=current_user_id
-        ).first()
+        product = find_product(product_id, current_user_id)
 
     if not product:
         return jsonify({"error": "Product not found"}), 404
+    session = shards.for_product(product_id).session
 
     if request.content_type and "multipart/form-data" in request.content_type:
         data = request.form.to_dict()
@@ -210,6 +435,43 @@ def update_product(product_id):
     if not is_valid:
         return jsonify({"errors": errors}), 400
 
+    if "quantity" in data and int(data["quantity"]) < product.reserved:
+        return (
+            jsonify(
+                {
+                    "errors": [
+                        f"Quantity cannot be below the {product.reserved} units held in carts"
+                    ]
+                }
+            ),
+            400,
+        )
+
+    # Claimed before any field changes: the claim commits the main session
+    uploaded_path, error = claim_upload(data, current_user_id)
+    if error:
+        return error
+
+    old_quantity, old_price = product.quantity, product.price
+
+    if "quantity" in data:
+        # Guarded in the UPDATE itself: a hold committing after the check
+        # above must not leave quantity below reserved
+        table = Product.__table__
+        guarded = session.execute(
+            table.update()
+            .where((table.c.id == product.id) & (table.c.reserved <= int(data["quantity"])))
+            .values(quantity=int(data["quantity"]))
+        )
+        if guarded.rowcount != 1:
+            session.rollback()
+            if uploaded_path:
+                Upload.release(str(data["upload_id"]), current_user_id)
+            return (
+                jsonify({"error": "Quantity cannot be below the units held in carts"}),
+                409,
+            )
+
     # Update product fields
     if "title" in data:
         product.title = data["title"]
@@ -220,16 +482,26 @@ def update_product(product_id):
     if "price" in data:
         product.price = float(data["price"])
 
-    if image_file:
-        # Delete old image if exists
-        if product.image_path and os.path.exists(product.image_path):
-            os.remove(product.image_path)
-
-        image_path = save_product_image(image_file, product.id)
+    if uploaded_path or image_file:
+        image_path = uploaded_path or save_product_image(image_file, product.id)
         if image_path:
+            # The old file goes only once the new path is committed
+            if product.image_path:
+                delete_image.enqueue(path=product.image_path)
             product.image_path = image_path
 
     try:
+        SellerStats.record_stock_change(
+            product.user_id,
+            old_quantity,
+            old_price,
+            product.quantity,
+            product.price,
+            session=session,
+        )
+        ProductChange.record(product, ChangeOp.UPDATE.value)
+        session.commit()
+        # Separate only when sharded; the old image is just kept on failure
         db.session.commit()
         return (
             jsonify(
@@ -241,7 +513,10 @@ def update_product(product_id):
             200,
         )
     except Exception as e:
+        session.rollback()
         db.session.rollback()
+        if uploaded_path:
+            Upload.release(str(data["upload_id"]), current_user_id)
         return jsonify({"error": f"Failed to update product: {str(e)}"}), 500
 
 
@@ -250,30 +525,162 @@ def update_product(product_id):
 def delete_product(product_id):
     """Delete a product (sellers can delete their own, admins can delete any)"""
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    user = User.access(current_user_id)
 
     if user.role == UserRole.ADMIN:
-        product = Product.query.get(product_id)
+        product = find_product(product_id)
     else:
-        product = Product.query.filter_by(
-            id=product_id, user_id=current_user_id
-        ).first()
+        product = find_product(product_id, current_user_id)
 
     if not product:
         return jsonify({"error": "Product not found"}), 404
+    session = shards.for_product(product_id).session
+
+    if product.reserved:
+        return jsonify({"error": "Product is held in buyers' carts"}), 409
 
     try:
-        if product.image_path and os.path.exists(product.image_path):
-            os.remove(product.image_path)
+        # A hold may have committed since the check above; the DELETE only
+        # goes through while nothing is reserved
+        table = Product.__table__
+        deleted = session.execute(
+            table.delete().where((table.c.id == product.id) & (table.c.reserved == 0))
+        )
+        if deleted.rowcount != 1:
+            session.rollback()
+            return jsonify({"error": "Product is held in buyers' carts"}), 409
 
-        db.session.delete(product)
+        if product.image_path:
+            delete_image.enqueue(path=product.image_path)
+
+        SellerStats.record_product(product, sign=-1, session=session)
+        ProductChange.record(product, ChangeOp.DELETE.value)
+        session.commit()
         db.session.commit()
         return jsonify({"message": "Product deleted successfully"}), 200
     except Exception as e:
+        session.rollback()
         db.session.rollback()
         return jsonify({"error": f"Failed to delete product: {str(e)}"}), 500
 
 
+@jwt_required()
+@seller_required
+def get_seller_stats():
+    """Dashboard counters for the current seller (admins may pass seller_id)"""
+    current_user_id = get_jwt_identity()
+    user = User.access(current_user_id)
+
+    seller_id = int(current_user_id)
+    if user.role == UserRole.ADMIN:
+        seller_id = request.args.get("seller_id", seller_id, type=int)
+
+    session = shards.for_seller(seller_id).session
+    stats = session.get(SellerStats, seller_id) or SellerStats.empty(seller_id)
+    return jsonify({"stats": stats.to_dict()}), 200
+
+
+def sse_message(data):
+    return f"event: product\ndata: {json.dumps(data)}\n\n"
+
+
+@jwt_required()
+def stream_products():
+    """Server-Sent Events with live stock and price of the requested products"""
+    current_user_id = get_jwt_identity()
+    user = User.access(current_user_id)
+    config = current_app.config
+
+    ids, error = parse_ids(request.args.get("ids", ""), config["SSE_MAX_IDS"])
+    if error:
+        return jsonify({"errors": [error]}), 400
+
+    owner = None
+    if not (user.role == UserRole.BUYER or user.role == UserRole.ADMIN):
+        owner = current_user_id
+    products = shards.get_products(ids, user_id=owner)
+    snapshot = [product_event(products[pid].to_dict()) for pid in sorted(products)]
+    visible = [data["id"] for data in snapshot]
+
+    subscription = broker.subscribe(visible, config["SSE_MAX_SUBSCRIBERS"])
+    if subscription is None:
+        response = jsonify({"error": "Too many live subscribers, please poll"})
+        response.status_code = 503
+        response.headers["Retry-After"] = "30"
+        return response
+    broker.ensure_tailing(current_app._get_current_object())
+
+    # Hand the DB connections back; the stream may stay open for hours
+    shards.remove_sessions()
+    heartbeat = config["SSE_HEARTBEAT_SECONDS"]
+    coalesce = config["SSE_COALESCE_SECONDS"]
+
+    def events():
+        try:
+            yield "retry: 5000\n\n"
+            for data in snapshot:
+                subscription.sent[data["id"]] = data
+                yield sse_message(data)
+            while True:
+                changed = subscription.wait(heartbeat, coalesce)
+                if not changed:
+                    yield ": keep-alive\n\n"
+                for data in changed:
+                    yield sse_message(data)
+        finally:
+            broker.unsubscribe(subscription)
+
+    return Response(
+        stream_with_context(events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def parse_cursor(raw, shard_count):
+    """``since`` is an id, or one id per shard joined by dots when sharded"""
+    if not raw:
+        return [0] * shard_count
+    try:
+        cursors = [int(part) for part in raw.split(".")]
+    except ValueError:
+        return None
+    return cursors if len(cursors) == shard_count else None
+
+
+@admin_required
+def get_product_changes():
+    """Product changes after a cursor, oldest first, for downstream sync"""
+    shard_count = len(shards.all_shards())
+    since = parse_cursor(request.args.get("since", ""), shard_count)
+    if since is None:
+        return jsonify({"errors": ["since must be a cursor returned by this feed"]}), 400
+    limit = min(
+        max(request.args.get("limit", 500, type=int), 1),
+        current_app.config["PRODUCT_CHANGES_MAX_BATCH"],
+    )
+
+    changes, cursors, has_more = ProductChange.read_all(since, limit)
+    return (
+        jsonify(
+            {
+                "changes": [change.to_dict() for change in changes],
+                "next_cursor": cursors[0]
+                if shard_count == 1
+                else ".".join(map(str, cursors)),
+                "has_more": has_more,
+            }
+        ),
+        200,
+    )
+
+
 def serve_image(filename):
-    """Serve product images from local storage"""
-    return send_from_directory(UPLOAD_FOLDER, filename)
+    """Serve product images from the configured storage"""
+    try:
+        response = storage.response(filename)
+    except ValueError:
+        response = None
+    if response is None:
+        return jsonify({"error": "Image not found"}), 404
+    return response
@@ -0,0 +1 @@
+"""Uploads app"""
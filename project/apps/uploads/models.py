@@ -0,0 +1,183 @@
+"""Resumable upload sessions"""
+
+import os
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func
+from project.config.extensions import db
+from helpers.model import Status
+from project import storage
+
+
+class UploadStatus(Status):
+    OPEN = "open"
+    COMPLETE = "complete"
+    ATTACHED = "attached"
+
+
+class Upload(db.Model):
+    """One file arriving in chunks
+
+    Bytes go to ``staging_path`` as they arrive; the file's size on disk is
+    the upload offset. Completing moves it into image storage and sets
+    ``path``, which a product then takes over (``attached``).
+    """
+
+    __tablename__ = "uploads"
+
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    extension = db.Column(db.String(10), nullable=False)
+    size = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default=UploadStatus.OPEN.value)
+    path = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<Upload {self.id} {self.status}>"
+
+    @property
+    def expired(self):
+        return self.expires_at <= datetime.utcnow()
+
+    @property
+    def staging_path(self):
+        return os.path.join(
+            current_app.config["UPLOAD_STAGING_FOLDER"], f"{self.id}.part"
+        )
+
+    @property
+    def offset(self):
+        if self.status != UploadStatus.OPEN.value:
+            return self.size
+        try:
+            return os.path.getsize(self.staging_path)
+        except OSError:
+            return 0
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "filename": self.filename,
+            "size": self.size,
+            "offset": self.offset,
+            "status": self.status,
+            "image_path": self.path,
+            "expires_at": self.expires_at.isoformat(),
+        }
+
+    @staticmethod
+    def start(user_id, filename, size, ttl_seconds, max_open, quota):
+        """Add an open session and create its empty staging file
+
+        The limits are checked by the INSERT itself (``INSERT ... SELECT
+        ... WHERE``), so two sessions started at once cannot both slip
+        under them. Returns None if the user is over ``max_open`` or
+        ``quota``.
+        """
+        now = datetime.utcnow()
+        values = {
+            "id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "filename": filename,
+            "extension": filename.rsplit(".", 1)[1].lower(),
+            "size": size,
+            "status": UploadStatus.OPEN.value,
+            "created_at": now,
+            "expires_at": now + timedelta(seconds=ttl_seconds),
+        }
+        table = Upload.__table__
+        open_count, held = (
+            column.scalar_subquery() for column in Upload._usage_query(user_id, now)
+        )
+        row = db.select(
+            *(db.literal(value, table.c[name].type) for name, value in values.items())
+        ).where((open_count < max_open) & (held + size <= quota))
+        inserted = db.session.execute(table.insert().from_select(list(values), row))
+        if inserted.rowcount != 1:
+            return None
+        upload = db.session.get(Upload, values["id"])
+        os.makedirs(current_app.config["UPLOAD_STAGING_FOLDER"], exist_ok=True)
+        open(upload.staging_path, "xb").close()
+        return upload
+
+    @staticmethod
+    def _usage_query(user_id, now):
+        """Selects of the open session count and the bytes held"""
+        counted = (
+            (Upload.user_id == user_id)
+            & Upload.status.in_([UploadStatus.OPEN.value, UploadStatus.COMPLETE.value])
+            & (Upload.expires_at > now)
+        )
+        open_count = func.coalesce(
+            func.sum(db.case((Upload.status == UploadStatus.OPEN.value, 1), else_=0)), 0
+        )
+        return (
+            db.select(open_count).where(counted),
+            db.select(func.coalesce(func.sum(Upload.size), 0)).where(counted),
+        )
+
+    @staticmethod
+    def usage(user_id):
+        """Open sessions and bytes held (open or not yet attached) by a user"""
+        return tuple(
+            int(db.session.execute(query).scalar_one())
+            for query in Upload._usage_query(user_id, datetime.utcnow())
+        )
+
+    @staticmethod
+    def _move(upload_id, user_id, old, new):
+        table = Upload.__table__
+        moved = db.session.execute(
+            table.update()
+            .where(
+                (table.c.id == upload_id)
+                & (table.c.user_id == user_id)
+                & (table.c.status == old)
+                & (table.c.expires_at > datetime.utcnow())
+            )
+            .values(status=new)
+        )
+        db.session.commit()
+        return moved.rowcount == 1
+
+    @staticmethod
+    def claim(upload_id, user_id):
+        """Take a completed upload for a product; returns its path or None
+
+        Commits on its own so that a claimed file is never purged. A product
+        write that fails afterwards calls ``release``.
+        """
+        if not Upload._move(
+            upload_id, user_id, UploadStatus.COMPLETE.value, UploadStatus.ATTACHED.value
+        ):
+            return None
+        return db.session.get(Upload, upload_id).path
+
+    @staticmethod
+    def release(upload_id, user_id):
+        Upload._move(
+            upload_id, user_id, UploadStatus.ATTACHED.value, UploadStatus.COMPLETE.value
+        )
+
+    def discard(self):
+        """Remove this upload's files; an attached file belongs to its product"""
+        try:
+            os.remove(self.staging_path)
+        except FileNotFoundError:
+            pass
+        if self.path and self.status != UploadStatus.ATTACHED.value:
+            storage.delete(self.path)
+
+    @staticmethod
+    def purge_expired():
+        """Drop expired sessions and any file no product took over"""
+        expired = Upload.query.filter(Upload.expires_at <= datetime.utcnow()).all()
+        for upload in expired:
+            upload.discard()
+            db.session.delete(upload)
+        db.session.commit()
+        return len(expired)
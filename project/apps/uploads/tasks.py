@@ -0,0 +1,9 @@
+"""Uploads background jobs"""
+
+from project.apps.uploads.models import Upload
+from project.apps.jobs.registry import task
+
+
+@task("uploads.purge_expired", queue="maintenance", every=3600)
+def purge_expired():
+    Upload.purge_expired()
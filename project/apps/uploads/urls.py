@@ -0,0 +1,21 @@
+"""Uploads URL patterns (routes)"""
+
+from flask import Blueprint
+from project.apps.uploads import views
+
+uploads_bp = Blueprint("uploads", __name__)
+
+# Register routes
+uploads_bp.add_url_rule("", "create_upload", views.create_upload, methods=["POST"])
+uploads_bp.add_url_rule(
+    "/<upload_id>", "get_upload", views.get_upload, methods=["GET"]
+)
+uploads_bp.add_url_rule(
+    "/<upload_id>", "append_chunk", views.append_chunk, methods=["PATCH"]
+)
+uploads_bp.add_url_rule(
+    "/<upload_id>", "delete_upload", views.delete_upload, methods=["DELETE"]
+)
+uploads_bp.add_url_rule(
+    "/<upload_id>/complete", "complete_upload", views.complete_upload, methods=["POST"]
+)
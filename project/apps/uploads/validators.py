@@ -0,0 +1,54 @@
+"""Upload validators"""
+
+SNIFF_BYTES = 12
+# Length of uploads.filename
+MAX_FILENAME_LENGTH = 255
+
+# Leading bytes of each allowed image type
+SIGNATURES = {
+    "png": (b"\x89PNG\r\n\x1a\n",),
+    "jpg": (b"\xff\xd8\xff",),
+    "gif": (b"GIF87a", b"GIF89a"),
+}
+
+
+def detect_image_type(head):
+    """``png``, ``jpg``, ``gif``, ``webp`` or None from a file's first bytes"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    for kind, signatures in SIGNATURES.items():
+        if head.startswith(signatures):
+            return kind
+    return None
+
+
+def matches_extension(head, extension):
+    kind = detect_image_type(head)
+    return kind is not None and kind == ("jpg" if extension == "jpeg" else extension)
+
+
+def validate_upload(data, allowed_extensions, max_size):
+    """Validate an upload session request"""
+    errors = []
+
+    filename = data.get("filename")
+    if not filename or not isinstance(filename, str):
+        errors.append("Filename is required")
+    elif len(filename) > MAX_FILENAME_LENGTH:
+        errors.append(f"Filename cannot exceed {MAX_FILENAME_LENGTH} characters")
+    elif "." not in filename or (
+        filename.rsplit(".", 1)[1].lower() not in allowed_extensions
+    ):
+        errors.append(
+            f'Invalid file type. Allowed types: {", ".join(sorted(allowed_extensions))}'
+        )
+
+    size = data.get("size")
+    if isinstance(size, bool) or not isinstance(size, int):
+        errors.append("Size must be an integer number of bytes")
+    elif size <= 0:
+        errors.append("Size must be positive")
+    elif size > max_size:
+        errors.append(f"Size cannot exceed {max_size} bytes")
+
+    return len(errors) == 0, errors
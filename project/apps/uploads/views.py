@@ -0,0 +1,276 @@
+"""Uploads views: resumable, chunked image uploads
+
+A client starts a session with the file's name and size, sends the bytes
+in order with ``PATCH`` (``Upload-Offset`` says where the chunk starts) and
+completes it. After a dropped connection ``GET`` tells where to resume.
+Chunks are streamed to disk in small blocks, never buffered whole.
+"""
+
+import hashlib
+import os
+from flask import current_app, jsonify, request
+from flask_jwt_extended import get_jwt_identity
+from werkzeug.exceptions import ClientDisconnected
+from project.config.extensions import db
+from project import storage
+from project.apps.uploads.models import Upload, UploadStatus
+from project.apps.uploads.validators import (
+    SNIFF_BYTES,
+    matches_extension,
+    validate_upload,
+)
+from project.apps.auth.decorators import seller_required
+from project.apps.idempotency.decorators import idempotent
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows; appends are then not serialized
+    fcntl = None
+
+BLOCK_SIZE = 64 * 1024
+
+
+def find_upload(upload_id):
+    upload = db.session.get(Upload, upload_id)
+    if not upload or upload.user_id != int(get_jwt_identity()) or upload.expired:
+        return None
+    return upload
+
+
+def lock(file):
+    """Hold ``file`` for this request; False if another request has it"""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+def offset_response(message, offset, status):
+    response = jsonify({"error": message, "offset": offset})
+    response.status_code = status
+    response.headers["Upload-Offset"] = str(offset)
+    return response
+
+
+def has_valid_head(file, extension):
+    file.seek(0)
+    return matches_extension(file.read(SNIFF_BYTES), extension)
+
+
+@seller_required
+@idempotent
+def create_upload():
+    """Start an upload session (sellers and admins only)"""
+    current_user_id = int(get_jwt_identity())
+    config = current_app.config
+    data = request.get_json(silent=True) or {}
+
+    is_valid, errors = validate_upload(
+        data, config["ALLOWED_EXTENSIONS"], config["UPLOAD_MAX_SIZE"]
+    )
+    if not is_valid:
+        return jsonify({"errors": errors}), 400
+
+    try:
+        upload = Upload.start(
+            current_user_id,
+            data["filename"],
+            data["size"],
+            config["UPLOAD_SESSION_SECONDS"],
+            config["UPLOAD_MAX_OPEN"],
+            config["UPLOAD_USER_QUOTA"],
+        )
+        if upload is not None:
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Failed to start upload: {str(e)}"}), 500
+
+    if upload is None:
+        open_count, held = Upload.usage(current_user_id)
+        if open_count >= config["UPLOAD_MAX_OPEN"]:
+            return (
+                jsonify(
+                    {"error": f"At most {config['UPLOAD_MAX_OPEN']} uploads can be open"}
+                ),
+                429,
+            )
+        return (
+            jsonify(
+                {
+                    "error": "Upload quota exceeded",
+                    "quota": config["UPLOAD_USER_QUOTA"],
+                    "used": held,
+                }
+            ),
+            413,
+        )
+
+    response = jsonify(
+        {"upload": upload.to_dict(), "chunk_size": config["UPLOAD_CHUNK_SIZE"]}
+    )
+    response.status_code = 201
+    response.headers["Upload-Offset"] = "0"
+    return response
+
+
+@seller_required
+def get_upload(upload_id):
+    """Session state; ``offset`` is where the next chunk must start"""
+    upload = find_upload(upload_id)
+    if not upload:
+        return jsonify({"error": "Upload not found"}), 404
+    response = jsonify({"upload": upload.to_dict()})
+    response.headers["Upload-Offset"] = str(upload.offset)
+    return response
+
+
+@seller_required
+def append_chunk(upload_id):
+    """Append the raw request body at ``Upload-Offset``"""
+    upload = find_upload(upload_id)
+    if not upload:
+        return jsonify({"error": "Upload not found"}), 404
+    if upload.status != UploadStatus.OPEN.value:
+        return jsonify({"error": "Upload is already complete"}), 409
+
+    try:
+        offset = int(request.headers["Upload-Offset"])
+    except (KeyError, ValueError):
+        return jsonify({"error": "Upload-Offset header must be an integer"}), 400
+    length = request.content_length
+    if length is None:
+        return jsonify({"error": "Content-Length is required"}), 411
+    if length > current_app.config["UPLOAD_CHUNK_SIZE"]:
+        return (
+            jsonify(
+                {
+                    "error": f"Chunks cannot exceed {current_app.config['UPLOAD_CHUNK_SIZE']} bytes"
+                }
+            ),
+            413,
+        )
+
+    try:
+        file = open(upload.staging_path, "r+b")
+    except FileNotFoundError:
+        return jsonify({"error": "Upload is no longer open"}), 409
+    with file:
+        if not lock(file):
+            return jsonify({"error": "Another chunk is being written"}), 409
+        received = os.fstat(file.fileno()).st_size
+        if offset != received:
+            return offset_response("Offset does not match", received, 409)
+        if received + length > upload.size:
+            return offset_response("Chunk goes past the declared size", received, 413)
+
+        file.seek(received)
+        remaining = length
+        try:
+            while remaining:
+                block = request.stream.read(min(BLOCK_SIZE, remaining))
+                if not block:
+                    break
+                file.write(block)
+                remaining -= len(block)
+        except ClientDisconnected:
+            pass
+        file.flush()
+        received += length - remaining
+
+        # The type is checked as soon as the first bytes are in
+        if offset < SNIFF_BYTES <= received or received == upload.size:
+            if not has_valid_head(file, upload.extension):
+                file.truncate(0)
+                return (
+                    jsonify(
+                        {"error": f"File content is not a valid {upload.extension} image"}
+                    ),
+                    415,
+                )
+
+    if remaining:
+        return offset_response("Chunk ended early", received, 400)
+    response = jsonify({"offset": received, "size": upload.size})
+    response.headers["Upload-Offset"] = str(received)
+    return response
+
+
+@seller_required
+def complete_upload(upload_id):
+    """Check and publish the file; optional JSON ``sha256`` is verified"""
+    upload = find_upload(upload_id)
+    if not upload:
+        return jsonify({"error": "Upload not found"}), 404
+    if upload.status != UploadStatus.OPEN.value:
+        return jsonify({"upload": upload.to_dict(), "image_path": upload.path}), 200
+    data = request.get_json(silent=True) or {}
+
+    try:
+        file = open(upload.staging_path, "rb")
+    except FileNotFoundError:
+        return jsonify({"error": "Upload is no longer open"}), 409
+    with file:
+        if not lock(file):
+            return jsonify({"error": "Another chunk is being written"}), 409
+        received = os.fstat(file.fileno()).st_size
+        if received != upload.size:
+            return offset_response("Upload is incomplete", received, 409)
+        if not has_valid_head(file, upload.extension):
+            return (
+                jsonify(
+                    {"error": f"File content is not a valid {upload.extension} image"}
+                ),
+                415,
+            )
+        if data.get("sha256"):
+            digest = hashlib.sha256()
+            file.seek(0)
+            for block in iter(lambda: file.read(BLOCK_SIZE), b""):
+                digest.update(block)
+            if digest.hexdigest() != str(data["sha256"]).lower():
+                return jsonify({"error": "Checksum does not match"}), 422
+
+        try:
+            # A rename for local storage on the same filesystem
+            upload.path = storage.move_in(
+                upload.staging_path, f"upload_{os.urandom(16).hex()}.{upload.extension}"
+            )
+            upload.status = UploadStatus.COMPLETE.value
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({"error": f"Failed to complete upload: {str(e)}"}), 500
+
+    return (
+        jsonify(
+            {
+                "message": "Upload complete",
+                "upload": upload.to_dict(),
+                "image_path": upload.path,
+            }
+        ),
+        200,
+    )
+
+
+@seller_required
+def delete_upload(upload_id):
+    """Abandon an upload that no product has taken"""
+    upload = find_upload(upload_id)
+    if not upload:
+        return jsonify({"error": "Upload not found"}), 404
+    if upload.status == UploadStatus.ATTACHED.value:
+        return jsonify({"error": "Upload is attached to a product"}), 409
+
+    try:
+        upload.discard()
+        db.session.delete(upload)
+        db.session.commit()
+        return jsonify({"message": "Upload deleted"}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"error": f"Failed to delete upload: {str(e)}"}), 500
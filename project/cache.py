@@ -0,0 +1,477 @@
+"""Two-tier cache shared by every worker
+
+``TieredCache`` looks in a small in-process LRU first, then in a shared
+store that all workers see: one SQLite file per host (``SQLiteStore``, WAL
+mode) or Redis (``RedisStore``, needs the ``redis`` package). Any
+Redis-compatible server works as a local stand-in. ``MemoryStore`` keeps
+everything in the process, for tests and one-process setups.
+
+``delete`` and ``clear`` also append to an invalidation log in the shared
+store. Each worker replays new log entries at most every
+``CACHE_POLL_SECONDS`` before it answers from its local tier, so a write
+in one worker reaches the others within that time. A worker that has not
+polled for half of ``CACHE_LOG_SECONDS`` may have missed trimmed entries
+and drops its local tier instead. ``clear(namespace)`` bumps the
+namespace's generation, which is part of every key, so old entries simply
+stop being found.
+
+A value a loader read from the database is stored with ``add``, which never
+replaces a live entry. A writer that stores the new state with ``set``
+therefore wins even against a loader that read the old state just before.
+
+Values are bytes or anything JSON can encode.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+try:
+    import redis
+except ImportError:  # Optional: SQLite or in-process stores only
+    redis = None
+
+EXTENSION_KEY = "shared_cache"
+CLEAR = "clear:"
+KEY = "key:"
+
+
+def encode(value):
+    if isinstance(value, bytes):
+        return b"b" + value
+    return b"j" + json.dumps(value).encode()
+
+
+def decode(data):
+    if data[:1] == b"b":
+        return bytes(data[1:])
+    return json.loads(data[1:])
+
+
+class MemoryStore:
+    """Shared tier inside this process only"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.generations = {}
+        self.log = []
+        self.next_id = 1
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None or entry[1] <= time.time():
+            return None, None
+        return entry
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (value, time.time() + ttl)
+
+    def add(self, key, value, ttl):
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] > now:
+                return False
+            self.entries[key] = (value, now + ttl)
+            return True
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def generation(self, namespace):
+        with self.lock:
+            return self.generations.get(namespace, 0)
+
+    def bump(self, namespace):
+        with self.lock:
+            self.generations[namespace] = self.generations.get(namespace, 0) + 1
+            return self.generations[namespace]
+
+    def publish(self, name):
+        with self.lock:
+            self.log.append((self.next_id, name))
+            self.next_id += 1
+            if len(self.log) > 10000:
+                del self.log[:5000]
+
+    def last_id(self):
+        return self.next_id - 1
+
+    def since(self, last_id):
+        with self.lock:
+            return [(entry_id, name) for entry_id, name in self.log if entry_id > last_id]
+
+
+class SQLiteStore:
+    """Shared tier in one SQLite file, for all workers on a host
+
+    Each thread of each process opens its own connection. WAL mode lets
+    readers run while one writer commits.
+    """
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS entries "
+        "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS generations "
+        "(namespace TEXT PRIMARY KEY, value INTEGER NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS invalidations "
+        "(id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, at REAL NOT NULL)",
+    )
+
+    def __init__(self, path, log_seconds=300):
+        self.path = path
+        self.log_seconds = log_seconds
+        self.local = threading.local()
+        self.writes = 0
+        connection = self._connection()
+        for statement in self.SCHEMA:
+            connection.execute(statement)
+
+    def _connection(self):
+        # A connection must not cross a fork, so it is keyed by process too
+        connection = getattr(self.local, "connection", None)
+        if connection is None or self.local.pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection, self.local.pid = connection, os.getpid()
+        return connection
+
+    def get(self, key):
+        row = (
+            self._connection()
+            .execute("SELECT value, expires FROM entries WHERE key = ?", (key,))
+            .fetchone()
+        )
+        if row is None or row[1] <= time.time():
+            return None, None
+        return row
+
+    def _wrote(self, connection):
+        """Now and then, drop expired entries and old log lines"""
+        self.writes += 1
+        if self.writes % 1000 == 0:
+            now = time.time()
+            connection.execute("DELETE FROM entries WHERE expires <= ?", (now,))
+            connection.execute(
+                "DELETE FROM invalidations WHERE at < ?", (now - self.log_seconds,)
+            )
+
+    def set(self, key, value, ttl):
+        connection = self._connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO entries (key, value, expires) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl),
+        )
+        self._wrote(connection)
+
+    def add(self, key, value, ttl):
+        connection = self._connection()
+        now = time.time()
+        added = connection.execute(
+            "INSERT INTO entries (key, value, expires) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, "
+            "expires = excluded.expires WHERE entries.expires <= ?",
+            (key, value, now + ttl, now),
+        ).rowcount
+        self._wrote(connection)
+        return added == 1
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def generation(self, namespace):
+        row = (
+            self._connection()
+            .execute("SELECT value FROM generations WHERE namespace = ?", (namespace,))
+            .fetchone()
+        )
+        return row[0] if row else 0
+
+    def bump(self, namespace):
+        return (
+            self._connection()
+            .execute(
+                "INSERT INTO generations (namespace, value) VALUES (?, 1) "
+                "ON CONFLICT (namespace) DO UPDATE SET value = value + 1 "
+                "RETURNING value",
+                (namespace,),
+            )
+            .fetchone()[0]
+        )
+
+    def publish(self, name):
+        connection = self._connection()
+        connection.execute(
+            "INSERT INTO invalidations (name, at) VALUES (?, ?)", (name, time.time())
+        )
+        self._wrote(connection)
+
+    def last_id(self):
+        return (
+            self._connection().execute("SELECT MAX(id) FROM invalidations").fetchone()[0]
+            or 0
+        )
+
+    def since(self, last_id):
+        return (
+            self._connection()
+            .execute(
+                "SELECT id, name FROM invalidations WHERE id > ? ORDER BY id", (last_id,)
+            )
+            .fetchall()
+        )
+
+
+class RedisStore:
+    """Shared tier in Redis; the invalidation log is a capped stream"""
+
+    def __init__(self, url, prefix="cache:", log_length=100000):
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND=redis needs the redis package")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.stream = f"{prefix}invalidations"
+        self.log_length = log_length
+
+    def get(self, key):
+        pipeline = self.client.pipeline()
+        pipeline.get(self.prefix + key)
+        pipeline.pttl(self.prefix + key)
+        value, ttl = pipeline.execute()
+        if value is None:
+            return None, None
+        return value, time.time() + max(ttl, 0) / 1000
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, px=max(1, int(ttl * 1000)))
+
+    def add(self, key, value, ttl):
+        return bool(
+            self.client.set(self.prefix + key, value, px=max(1, int(ttl * 1000)), nx=True)
+        )
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def generation(self, namespace):
+        return int(self.client.get(f"{self.prefix}generation:{namespace}") or 0)
+
+    def bump(self, namespace):
+        return self.client.incr(f"{self.prefix}generation:{namespace}")
+
+    def publish(self, name):
+        self.client.xadd(
+            self.stream, {"name": name}, maxlen=self.log_length, approximate=True
+        )
+
+    def last_id(self):
+        entries = self.client.xrevrange(self.stream, count=1)
+        return entries[0][0].decode() if entries else "0-0"
+
+    def since(self, last_id):
+        found = self.client.xread({self.stream: last_id}, count=10000)
+        if not found:
+            return []
+        return [
+            (entry_id.decode(), fields[b"name"].decode())
+            for entry_id, fields in found[0][1]
+        ]
+
+
+class TieredCache:
+    """In-process LRU in front of a shared store; keys live in namespaces"""
+
+    def __init__(
+        self, store, local_entries=10000, local_seconds=60, poll_seconds=0.5, log_seconds=300
+    ):
+        self.store = store
+        self.local_entries = local_entries
+        self.local_seconds = local_seconds
+        self.poll_seconds = poll_seconds
+        self.log_seconds = log_seconds
+        self.lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.local = OrderedDict()
+        self.generations = {}
+        self.last_id = store.last_id()
+        self.polled_at = time.monotonic()
+
+    def _drop_local(self, key=None):
+        with self.lock:
+            if key is None:
+                self.local.clear()
+                self.generations.clear()
+            else:
+                self.local.pop(key, None)
+
+    def sync(self):
+        """Apply invalidations other workers published since the last poll"""
+        now = time.monotonic()
+        if now - self.polled_at < self.poll_seconds:
+            return
+        if not self.sync_lock.acquire(blocking=False):
+            return
+        try:
+            if now - self.polled_at > self.log_seconds / 2:
+                self._drop_local()
+                self.last_id = self.store.last_id()
+            else:
+                for entry_id, name in self.store.since(self.last_id):
+                    self.last_id = entry_id
+                    if name.startswith(CLEAR):
+                        with self.lock:
+                            self.generations.pop(name[len(CLEAR) :], None)
+                    else:
+                        self._drop_local(name[len(KEY) :])
+            self.polled_at = now
+        finally:
+            self.sync_lock.release()
+
+    def generation(self, namespace):
+        self.sync()
+        with self.lock:
+            generation = self.generations.get(namespace)
+        if generation is None:
+            generation = self.store.generation(namespace)
+            with self.lock:
+                self.generations[namespace] = generation
+        return generation
+
+    def _key(self, namespace, key):
+        return f"{namespace}:{self.generation(namespace)}:{key}"
+
+    def _remember(self, full_key, value, expires):
+        with self.lock:
+            self.local[full_key] = (value, expires)
+            self.local.move_to_end(full_key)
+            while len(self.local) > self.local_entries:
+                self.local.popitem(last=False)
+
+    def get(self, namespace, key, local=True):
+        """The cached value, or None"""
+        full_key = self._key(namespace, key)
+        now = time.monotonic()
+        if local:
+            with self.lock:
+                entry = self.local.get(full_key)
+                if entry is not None:
+                    if entry[1] > now:
+                        self.local.move_to_end(full_key)
+                        return entry[0]
+                    del self.local[full_key]
+        data, expires = self.store.get(full_key)
+        if data is None:
+            return None
+        value = decode(data)
+        if local:
+            remaining = min(self.local_seconds, expires - time.time())
+            self._remember(full_key, value, now + remaining)
+        return value
+
+    def set(self, namespace, key, value, ttl, local=True, publish=False):
+        """Store ``value``; ``publish`` also drops other workers' local copies"""
+        full_key = self._key(namespace, key)
+        self.store.set(full_key, encode(value), ttl)
+        if local:
+            expires = time.monotonic() + min(ttl, self.local_seconds)
+            self._remember(full_key, value, expires)
+        if publish:
+            self.store.publish(KEY + full_key)
+
+    def add(self, namespace, key, value, ttl, local=True):
+        """Store ``value`` unless the key holds a live entry; True if stored"""
+        full_key = self._key(namespace, key)
+        if not self.store.add(full_key, encode(value), ttl):
+            return False
+        if local:
+            expires = time.monotonic() + min(ttl, self.local_seconds)
+            self._remember(full_key, value, expires)
+        return True
+
+    def delete(self, namespace, key):
+        """Remove an entry here, in the shared store and in other workers"""
+        full_key = self._key(namespace, key)
+        self._drop_local(full_key)
+        self.store.delete(full_key)
+        self.store.publish(KEY + full_key)
+
+    def clear(self, namespace):
+        """Invalidate every entry of ``namespace`` for all workers"""
+        generation = self.store.bump(namespace)
+        with self.lock:
+            self.generations[namespace] = generation
+        self.store.publish(CLEAR + namespace)
+
+    def stats(self):
+        with self.lock:
+            return {"local_entries": len(self.local), "generations": dict(self.generations)}
+
+
+def create_store(config):
+    backend = config["CACHE_BACKEND"]
+    if backend == "memory":
+        return MemoryStore()
+    if backend == "sqlite":
+        return SQLiteStore(config["CACHE_SQLITE_PATH"], config["CACHE_LOG_SECONDS"])
+    if backend == "redis":
+        return RedisStore(config["CACHE_REDIS_URL"])
+    raise ValueError(f"Unknown CACHE_BACKEND {backend}")
+
+
+def init_app(app):
+    config = app.config
+    app.extensions[EXTENSION_KEY] = TieredCache(
+        create_store(config),
+        local_entries=config["CACHE_LOCAL_ENTRIES"],
+        local_seconds=config["CACHE_LOCAL_SECONDS"],
+        poll_seconds=config["CACHE_POLL_SECONDS"],
+        log_seconds=config["CACHE_LOG_SECONDS"],
+    )
+
+
+def get_cache():
+    """This app's shared cache, or None in apps built without one"""
+    return current_app.extensions.get(EXTENSION_KEY)
+
+
+def cached(namespace, key, ttl, load):
+    """``load()``, remembered under ``namespace``/``key`` for ``ttl`` seconds
+
+    If a writer stored the key while ``load`` ran, its value is returned.
+    """
+    cache = get_cache()
+    if cache is None:
+        return load()
+    value = cache.get(namespace, key)
+    if value is None:
+        value = load()
+        if value is not None and not cache.add(namespace, key, value, ttl):
+            stored = cache.get(namespace, key, local=False)
+            if stored is not None:
+                value = stored
+    return value
+
+
+def remember(namespace, key, value, ttl):
+    """Store the new state of ``key`` for every worker, replacing older values"""
+    cache = get_cache()
+    if cache is not None:
+        cache.set(namespace, key, value, ttl, publish=True)
+
+
+def invalidate(namespace, key):
+    cache = get_cache()
+    if cache is not None:
+        cache.delete(namespace, key)
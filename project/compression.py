@@ -0,0 +1,227 @@
+"""Accept-Encoding negotiated response compression
+
+``init_app`` compresses eligible responses after the view runs: JSON and
+text bodies of at least ``COMPRESS_MIN_SIZE`` bytes. Streams (SSE) and
+files are left alone. Brotli is used when the ``brotli`` package is
+installed and the client accepts it, otherwise gzip.
+
+``PrecompressedCache`` keeps whole response bodies per encoding, so a hot
+page is compressed once (at a higher level) instead of on every request.
+"""
+
+import gzip
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from flask import Response, current_app, request
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only
+    brotli = None
+
+IDENTITY = "identity"
+COMPRESSIBLE = ("application/json", "text/html", "text/plain", "text/csv")
+
+
+def available_encodings():
+    """Supported encodings, most preferred first"""
+    return ("br", "gzip") if brotli else ("gzip",)
+
+
+def negotiate(accept_encoding, encodings=None):
+    """Pick the best of ``encodings`` for an Accept-Encoding header"""
+    encodings = encodings or available_encodings()
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[name] = weight
+
+    best, best_weight = IDENTITY, 0.0
+    for encoding in encodings:
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(data, encoding, cached=False):
+    """``data`` in ``encoding``; ``cached`` bodies get the slower, tighter level"""
+    config = current_app.config
+    if encoding == "gzip":
+        level = config["COMPRESS_CACHED_LEVEL" if cached else "COMPRESS_LEVEL"]
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == "br":
+        quality = config[
+            "COMPRESS_CACHED_BROTLI_QUALITY" if cached else "COMPRESS_BROTLI_QUALITY"
+        ]
+        return brotli.compress(data, quality=quality)
+    return data
+
+
+def add_vary(response):
+    vary = response.headers.get("Vary")
+    if not vary:
+        response.headers["Vary"] = "Accept-Encoding"
+    elif "accept-encoding" not in vary.lower():
+        response.headers["Vary"] = f"{vary}, Accept-Encoding"
+
+
+def compress_response(response):
+    """after_request hook: compress eligible responses in place"""
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 206, 304)
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE
+    ):
+        return response
+    data = response.get_data()
+    if len(data) < current_app.config["COMPRESS_MIN_SIZE"]:
+        return response
+
+    add_vary(response)
+    encoding = negotiate(request.headers.get("Accept-Encoding"))
+    if encoding == IDENTITY:
+        return response
+    response.set_data(compress(data, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
+
+
+class PrecompressedCache:
+    """Bounded LRU of response bodies, each kept in every encoding served
+
+    Entries expire after ``ttl`` seconds. Writers call ``clear`` when the
+    data behind them changes; a body computed from a read that started
+    before the last ``clear`` is not stored.
+
+    With ``shared`` (a ``project.cache.TieredCache``) bodies are also kept
+    under ``namespace`` for the other workers: the uncompressed body, and
+    each encoding under its own key once some worker has compressed it, so
+    a page is compressed once for all of them. ``clear`` reaches all of
+    them.
+    """
+
+    def __init__(self, max_entries=256, ttl=5.0, shared=None, namespace="responses"):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self.namespace = namespace
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.local_generation = 0
+
+    @property
+    def generation(self):
+        if self.shared is None:
+            return self.local_generation
+        return self.shared.generation(self.namespace)
+
+    def clear(self, *args):
+        if self.shared is not None:
+            self.shared.clear(self.namespace)
+        with self.lock:
+            self.entries.clear()
+            self.local_generation += 1
+
+    def _remember(self, key, entry):
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get(self, key):
+        generation = self.generation
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                if entry["expires"] > time.monotonic() and entry["generation"] == generation:
+                    self.entries.move_to_end(key)
+                    return entry
+                del self.entries[key]
+        if self.shared is None:
+            return None
+        data = self.shared.get(self.namespace, json.dumps(key), local=False)
+        if data is None:
+            return None
+        header, _, body = data.partition(b"\n")
+        entry = self._entry(key, body, generation, **json.loads(header))
+        self._remember(key, entry)
+        return entry
+
+    def _entry(self, key, body, generation, status, mimetype, tag=None):
+        return {
+            "key": key,
+            # Names this body's encoded variants in the shared tier
+            "tag": tag or uuid.uuid4().hex,
+            "expires": time.monotonic() + self.ttl,
+            "generation": generation,
+            "status": status,
+            "mimetype": mimetype,
+            IDENTITY: body,
+        }
+
+    def put(self, key, body, generation, status=200, mimetype="application/json"):
+        """Store ``body`` unless the cache was cleared since ``generation``"""
+        entry = self._entry(key, body, generation, status, mimetype)
+        if generation != self.generation:
+            return entry
+        self._remember(key, entry)
+        if self.shared is not None:
+            header = json.dumps(
+                {"status": status, "mimetype": mimetype, "tag": entry["tag"]}
+            ).encode()
+            self.shared.set(
+                self.namespace, json.dumps(key), header + b"\n" + body, self.ttl, local=False
+            )
+        return entry
+
+    def _encoded(self, entry, encoding):
+        """``entry``'s body in ``encoding``, compressed once across workers"""
+        if self.shared is None:
+            return compress(entry[IDENTITY], encoding, cached=True)
+        shared_key = json.dumps([entry["key"], entry["tag"], encoding])
+        body = self.shared.get(self.namespace, shared_key, local=False)
+        if body is None:
+            body = compress(entry[IDENTITY], encoding, cached=True)
+            ttl = entry["expires"] - time.monotonic()
+            if ttl > 0 and entry["generation"] == self.generation:
+                self.shared.set(self.namespace, shared_key, body, ttl, local=False)
+        return body
+
+    def respond(self, entry, hit=True):
+        """A response from ``entry`` in the encoding this request accepts"""
+        body = entry[IDENTITY]
+        headers = {"X-Cache": "HIT" if hit else "MISS"}
+        if len(body) >= current_app.config["COMPRESS_MIN_SIZE"]:
+            headers["Vary"] = "Accept-Encoding"
+            encoding = negotiate(request.headers.get("Accept-Encoding"))
+            if encoding != IDENTITY:
+                if encoding not in entry:
+                    # Racing threads may both compress; either result is fine
+                    entry[encoding] = self._encoded(entry, encoding)
+                body = entry[encoding]
+                headers["Content-Encoding"] = encoding
+        return Response(
+            body, status=entry["status"], mimetype=entry["mimetype"], headers=headers
+        )
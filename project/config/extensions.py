@@ -1,8 +1,22 @@
 """Flask extensions initialization"""
+import importlib
 from flask_sqlalchemy import SQLAlchemy
-from flask_bcrypt import Bcrypt
-from flask_jwt_extended import JWTManager
 
 db = SQLAlchemy()
-bcrypt = Bcrypt()
-jwt = JWTManager()
+
+# bcrypt and jwt are only needed by the views, so importing them is deferred
+# until first attribute access. CLI commands that only touch the database
+# never pay for them.
+LAZY_EXTENSIONS = {
+    "bcrypt": ("flask_bcrypt", "Bcrypt"),
+    "jwt": ("flask_jwt_extended", "JWTManager"),
+}
+
+
+def __getattr__(name):
+    if name not in LAZY_EXTENSIONS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, class_name = LAZY_EXTENSIONS[name]
+    extension = getattr(importlib.import_module(module_name), class_name)()
+    globals()[name] = extension
+    return extension
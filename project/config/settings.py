@@ -4,6 +4,16 @@ import os
 from datetime import timedelta
 
 
+def parse_binds(spec):
+    """``"shard0=sqlite:///shard0.db,shard1=..."`` -> SQLALCHEMY_BINDS"""
+    binds = {}
+    for part in spec.split(","):
+        key, _, url = part.strip().partition("=")
+        if key and url:
+            binds[key] = url
+    return binds
+
+
 class Config:
     """Base configuration"""
 
@@ -11,6 +21,13 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", "sqlite:///app.db")
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Product sharding by seller (see project/apps/products/shards.py). Empty
+    # keeps products on DATABASE_URL; otherwise "bind=url,..." per shard.
+    SQLALCHEMY_BINDS = parse_binds(os.environ.get("PRODUCT_SHARD_URLS", ""))
+    PRODUCT_SHARDS = ",".join(SQLALCHEMY_BINDS)
+    # Pin sellers to a shard before their first product: "seller_id=bind,..."
+    PRODUCT_SHARD_MAP = os.environ.get("PRODUCT_SHARD_MAP", "")
+
     # JWT
     JWT_SECRET_KEY = os.environ.get(
         "JWT_SECRET_KEY", "your-secret-key-change-in-production"
@@ -24,9 +41,157 @@ class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-key")
 
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
-    UPLOAD_FOLDER = "uploads/products"
+    UPLOAD_FOLDER = os.environ.get("UPLOAD_FOLDER", "uploads/products")
     ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp"}
 
+    # Image storage: "local" (UPLOAD_FOLDER) or "s3" (needs boto3). Set the
+    # endpoint for MinIO or another S3-compatible service.
+    IMAGE_STORAGE = os.environ.get("IMAGE_STORAGE", "local")
+    IMAGE_S3_BUCKET = os.environ.get("IMAGE_S3_BUCKET", "")
+    IMAGE_S3_PREFIX = os.environ.get("IMAGE_S3_PREFIX", "products")
+    IMAGE_S3_ENDPOINT_URL = os.environ.get("IMAGE_S3_ENDPOINT_URL", "")
+    IMAGE_S3_REGION = os.environ.get("IMAGE_S3_REGION", "")
+    # > 0: redirect image requests to presigned URLs valid this long
+    IMAGE_S3_PRESIGN_SECONDS = int(os.environ.get("IMAGE_S3_PRESIGN_SECONDS", 0))
+
+    # Resumable uploads (/api/uploads); chunks must fit in MAX_CONTENT_LENGTH
+    UPLOAD_STAGING_FOLDER = os.environ.get("UPLOAD_STAGING_FOLDER", "uploads/partial")
+    UPLOAD_MAX_SIZE = int(os.environ.get("UPLOAD_MAX_SIZE", 64 * 1024 * 1024))
+    UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", 4 * 1024 * 1024))
+    # Per user: bytes in open or not yet attached uploads, and open sessions
+    UPLOAD_USER_QUOTA = int(os.environ.get("UPLOAD_USER_QUOTA", 256 * 1024 * 1024))
+    UPLOAD_MAX_OPEN = int(os.environ.get("UPLOAD_MAX_OPEN", 5))
+    UPLOAD_SESSION_SECONDS = int(os.environ.get("UPLOAD_SESSION_SECONDS", 24 * 3600))
+
+    # Response compression (gzip, and brotli when installed)
+    COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+    COMPRESS_LEVEL = int(os.environ.get("COMPRESS_LEVEL", 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get("COMPRESS_BROTLI_QUALITY", 4))
+    # Cached pages are compressed once, so they can afford tighter settings
+    COMPRESS_CACHED_LEVEL = int(os.environ.get("COMPRESS_CACHED_LEVEL", 9))
+    COMPRESS_CACHED_BROTLI_QUALITY = int(
+        os.environ.get("COMPRESS_CACHED_BROTLI_QUALITY", 9)
+    )
+    # Buyer-wide product listing pages; 0 disables the cache
+    RESPONSE_CACHE_SECONDS = float(os.environ.get("RESPONSE_CACHE_SECONDS", 5))
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 256))
+
+    # GET /api/products?ids=... and POST /api/products/batch
+    PRODUCT_BATCH_MAX_IDS = int(os.environ.get("PRODUCT_BATCH_MAX_IDS", 200))
+
+    # Per-worker columnar catalog snapshot behind GET /api/products/facets;
+    # off: the columns are read on every facet request instead
+    CATALOG_SNAPSHOT = os.environ.get("CATALOG_SNAPSHOT", "true").lower() == "true"
+    CATALOG_REFRESH_SECONDS = float(os.environ.get("CATALOG_REFRESH_SECONDS", 2))
+    CATALOG_REFRESH_OVERLAP_SECONDS = float(
+        os.environ.get("CATALOG_REFRESH_OVERLAP_SECONDS", 5)
+    )
+    CATALOG_FULL_REFRESH_SECONDS = float(
+        os.environ.get("CATALOG_FULL_REFRESH_SECONDS", 300)
+    )
+    # About 36 bytes per product per worker
+    CATALOG_MAX_ROWS = int(os.environ.get("CATALOG_MAX_ROWS", 5_000_000))
+
+    # Cache shared by the workers of a host (project/cache.py): "sqlite" (one
+    # file per host), "redis" (needs the redis package; any Redis-compatible
+    # server) or "memory" (this process only)
+    CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "sqlite")
+    CACHE_SQLITE_PATH = os.environ.get("CACHE_SQLITE_PATH", "instance/cache.sqlite")
+    CACHE_REDIS_URL = os.environ.get("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    # In-process tier in front of the shared one
+    CACHE_LOCAL_ENTRIES = int(os.environ.get("CACHE_LOCAL_ENTRIES", 10000))
+    CACHE_LOCAL_SECONDS = float(os.environ.get("CACHE_LOCAL_SECONDS", 60))
+    # How stale another worker's invalidation may be seen
+    CACHE_POLL_SECONDS = float(os.environ.get("CACHE_POLL_SECONDS", 0.5))
+    # How long the invalidation log is kept
+    CACHE_LOG_SECONDS = int(os.environ.get("CACHE_LOG_SECONDS", 300))
+    USER_CACHE_SECONDS = int(os.environ.get("USER_CACHE_SECONDS", 300))
+    REVOKED_TOKEN_CACHE_SECONDS = int(os.environ.get("REVOKED_TOKEN_CACHE_SECONDS", 300))
+
+    # Related products (TF-IDF neighbours, rebuilt by products.build_related)
+    RELATED_PRODUCTS_K = int(os.environ.get("RELATED_PRODUCTS_K", 10))
+    RELATED_MIN_SCORE = float(os.environ.get("RELATED_MIN_SCORE", 0.05))
+    # Dense similarity scores held at once: rows per block = this // products
+    RELATED_BLOCK_CELLS = int(os.environ.get("RELATED_BLOCK_CELLS", 8_000_000))
+
+    # Product change feed
+    PRODUCT_CHANGES_MAX_BATCH = int(os.environ.get("PRODUCT_CHANGES_MAX_BATCH", 1000))
+    # Changes younger than this wait for lower ids still committing; unset
+    # means 0 on SQLite (writers serialize) and 2 s on other databases
+    PRODUCT_CHANGES_SETTLE_SECONDS = (
+        float(os.environ["PRODUCT_CHANGES_SETTLE_SECONDS"])
+        if os.environ.get("PRODUCT_CHANGES_SETTLE_SECONDS")
+        else None
+    )
+
+    # Live product updates (Server-Sent Events)
+    SSE_MAX_IDS = int(os.environ.get("SSE_MAX_IDS", 200))
+    SSE_MAX_SUBSCRIBERS = int(os.environ.get("SSE_MAX_SUBSCRIBERS", 5000))
+    SSE_HEARTBEAT_SECONDS = float(os.environ.get("SSE_HEARTBEAT_SECONDS", 15))
+    SSE_COALESCE_SECONDS = float(os.environ.get("SSE_COALESCE_SECONDS", 0.25))
+    # How often each worker tails product_changes for other workers' writes
+    SSE_POLL_SECONDS = float(os.environ.get("SSE_POLL_SECONDS", 1))
+
+    # Idempotency-Key replays
+    IDEMPOTENCY_TTL_SECONDS = int(os.environ.get("IDEMPOTENCY_TTL_SECONDS", 24 * 3600))
+    # A duplicate of an in-flight key older than this gets a 409 saying the
+    # outcome is unknown; the handler is never run a second time
+    IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get("IDEMPOTENCY_LOCK_SECONDS", 60))
+    # How long a duplicate waits for the in-flight request before a 409
+    IDEMPOTENCY_WAIT_SECONDS = float(os.environ.get("IDEMPOTENCY_WAIT_SECONDS", 10))
+
+    # Cart reservations (main.py sweep-reservations)
+    RESERVATION_TTL_SECONDS = int(os.environ.get("RESERVATION_TTL_SECONDS", 15 * 60))
+    RESERVATION_SWEEP_BATCH = int(os.environ.get("RESERVATION_SWEEP_BATCH", 1000))
+
+    # Sales rollups (main.py rollup-sales)
+    ROLLUP_BATCH_SIZE = int(os.environ.get("ROLLUP_BATCH_SIZE", 1000))
+    ROLLUP_SETTLE_SECONDS = int(os.environ.get("ROLLUP_SETTLE_SECONDS", 60))
+
+    # Background jobs (main.py worker)
+    # Per-queue concurrency limits, "name=limit,..."; the pool caps the total
+    JOB_QUEUES = os.environ.get("JOB_QUEUES", "default=4,images=2,maintenance=1")
+    JOB_CONCURRENCY = int(os.environ.get("JOB_CONCURRENCY", 4))
+    JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", 1))
+    # A claimed job not finished within this is handed to another worker
+    JOB_VISIBILITY_TIMEOUT = int(os.environ.get("JOB_VISIBILITY_TIMEOUT", 300))
+    JOB_RETRY_BASE_SECONDS = float(os.environ.get("JOB_RETRY_BASE_SECONDS", 5))
+    JOB_RETRY_MAX_SECONDS = float(os.environ.get("JOB_RETRY_MAX_SECONDS", 3600))
+    JOB_RETENTION_SECONDS = int(os.environ.get("JOB_RETENTION_SECONDS", 7 * 86400))
+
+    # Admission control (project/admission.py), per endpoint class: read,
+    # write, auth (login/register), upload and checkout. "name=value,..."
+    ADMISSION_CONTROL = os.environ.get("ADMISSION_CONTROL", "true").lower() == "true"
+    # Most requests of a class running at once, as a share of SERVER_THREADS
+    # (checkout) or of the threads outside the checkout reserve (the rest);
+    # the adaptive limit stays at or below it
+    ADMISSION_SHARES = os.environ.get(
+        "ADMISSION_SHARES", "read=1,write=0.75,auth=0.5,upload=0.5,checkout=1"
+    )
+    # Threads of each worker only authenticated checkout may use
+    ADMISSION_CHECKOUT_RESERVE = int(os.environ.get("ADMISSION_CHECKOUT_RESERVE", 1))
+    # How long a request may wait for a slot before a 503
+    ADMISSION_QUEUE_SECONDS = os.environ.get(
+        "ADMISSION_QUEUE_SECONDS", "read=0.5,write=1,auth=1,upload=1,checkout=5"
+    )
+    # Latency each class is steered to; slower requests shrink its limit
+    ADMISSION_TARGET_SECONDS = os.environ.get(
+        "ADMISSION_TARGET_SECONDS", "read=0.1,write=0.25,auth=0.5,upload=1,checkout=1"
+    )
+    # Most SSE streams open at once, as a share of the threads outside the
+    # checkout reserve; each holds a thread until the client disconnects
+    ADMISSION_STREAM_SHARE = float(os.environ.get("ADMISSION_STREAM_SHARE", 0.5))
+
+    # Production server (main.py serve)
+    SERVER_BIND = os.environ.get("SERVER_BIND", "0.0.0.0:8000")
+    SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", 2 * (os.cpu_count() or 1) + 1))
+    SERVER_THREADS = int(os.environ.get("SERVER_THREADS", 4))
+    # e.g. "gevent", so idle SSE subscribers cost a greenlet instead of a thread
+    SERVER_WORKER_CLASS = os.environ.get("SERVER_WORKER_CLASS")
+    SERVER_BACKLOG = int(os.environ.get("SERVER_BACKLOG", 2048))
+    SERVER_TIMEOUT = int(os.environ.get("SERVER_TIMEOUT", 30))
+    SERVER_KEEPALIVE = int(os.environ.get("SERVER_KEEPALIVE", 5))
+
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -47,3 +212,4 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.environ.get(
         "DATABASE_URL_TEST", "sqlite:///app_test.db"
     )
+    CACHE_BACKEND = os.environ.get("CACHE_BACKEND_TEST", "memory")
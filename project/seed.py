@@ -0,0 +1,382 @@
+"""Deterministic high-volume synthetic data generator
+
+Rows are generated as plain tuples from a seeded RNG and written with
+executemany in chunks, bypassing ORM object construction entirely.
+"""
+
+import random
+import time
+import uuid
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import func, select
+from project.config.extensions import db
+from project.apps.auth.models import User, UserRole, UserStatus, TokenBlacklist
+from project.apps.products import shards
+from project.apps.products.models import Product
+from project.apps.invoices.models import Invoice, InvoiceItem, InvoiceStatus
+
+DEFAULT_PASSWORD = "password123"
+
+WORDS = (
+    "classic", "compact", "wireless", "organic", "premium", "portable", "smart",
+    "vintage", "eco", "deluxe", "mini", "pro", "ultra", "handmade", "modern",
+)
+NOUNS = (
+    "lamp", "chair", "headphones", "backpack", "kettle", "sneakers", "watch",
+    "notebook", "jacket", "camera", "blender", "desk", "speaker", "mug", "rug",
+)
+
+
+def seller_product_counts(sellers, products, skew, rng):
+    """Split ``products`` across sellers with a Zipf(skew) popularity curve
+
+    ``skew=0`` gives every seller the same share; larger values concentrate
+    the catalog in a few big sellers. Shares are shuffled so the big sellers
+    are not always the lowest ids.
+    """
+    if sellers == 0:
+        return []
+    weights = [1 / (rank**skew) for rank in range(1, sellers + 1)]
+    rng.shuffle(weights)
+    total = sum(weights)
+    exact = [products * weight / total for weight in weights]
+    counts = [int(share) for share in exact]
+    # Largest remainder so the counts add up exactly
+    remainders = sorted(
+        range(sellers), key=lambda i: exact[i] - counts[i], reverse=True
+    )
+    for i in remainders[: products - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+def next_id(model):
+    return (db.session.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def insert_statement(connection, table, columns):
+    placeholder = "?" if connection.dialect.paramstyle == "qmark" else "%s"
+    return (
+        f"INSERT INTO {table.name} ({', '.join(columns)}) "
+        f"VALUES ({', '.join(placeholder for _ in columns)})"
+    )
+
+
+def bulk_insert(table, columns, rows, chunk_size, session=None):
+    """executemany ``rows`` (tuples matching ``columns``) in chunks"""
+    connection = (session or db.session).connection()
+    statement = insert_statement(connection, table, columns)
+    written = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            connection.exec_driver_sql(statement, chunk)
+            written += len(chunk)
+            chunk = []
+    if chunk:
+        connection.exec_driver_sql(statement, chunk)
+        written += len(chunk)
+    return written
+
+
+def routed_insert(table, columns, rows, chunk_size):
+    """Like ``bulk_insert``, for ``(shard, row)`` pairs going to each shard"""
+    buffers = {}
+    written = 0
+
+    def flush(shard):
+        connection = shard.session.connection()
+        connection.exec_driver_sql(
+            insert_statement(connection, table, columns), buffers.pop(shard)
+        )
+
+    for shard, row in rows:
+        buffer = buffers.setdefault(shard, [])
+        buffer.append(row)
+        written += 1
+        if len(buffer) >= chunk_size:
+            flush(shard)
+    for shard in list(buffers):
+        flush(shard)
+    return written
+
+
+def timestamp_pool(now, max_age_seconds, rng, size=4096):
+    """Pre-bound timestamps to draw from instead of building one per row
+
+    SQLite gets them pre-formatted, which skips the driver's per-row
+    datetime adaptation; other drivers get datetime objects.
+    """
+    stamps = sorted(
+        now - timedelta(seconds=rng.randrange(max_age_seconds)) for _ in range(size)
+    )
+    if db.session.connection().dialect.name == "sqlite":
+        return [stamp.strftime("%Y-%m-%d %H:%M:%S.%f") for stamp in stamps]
+    return stamps
+
+
+@contextmanager
+def fast_sqlite_pragmas():
+    """Trade durability for speed while seeding SQLite databases
+
+    The pragmas stick to pooled connections, so on the way out the sessions
+    are removed and file-backed SQLite engines disposed; later work opens
+    connections with the database's own settings. In-memory databases live
+    on their one connection and have no durability to restore.
+    """
+    sessions = [db.session] + [shard.session for shard in shards.all_shards()]
+    for session in sessions:
+        connection = session.connection()
+        if connection.dialect.name == "sqlite":
+            connection.exec_driver_sql("PRAGMA synchronous = OFF")
+            connection.exec_driver_sql("PRAGMA journal_mode = MEMORY")
+    try:
+        yield
+    finally:
+        db.session.remove()
+        for shard in shards.all_shards():
+            shard.session.remove()
+        for engine in db.engines.values():
+            if engine.dialect.name == "sqlite" and engine.url.database not in (
+                None,
+                "",
+                ":memory:",
+            ):
+                engine.dispose()
+
+
+def seed_data(
+    users=1000,
+    sellers=100,
+    products=10000,
+    skew=1.0,
+    tokens=0,
+    invoices=0,
+    max_items=5,
+    seed=42,
+    prefix="",
+    password=DEFAULT_PASSWORD,
+    chunk_size=10000,
+    password_hash=None,
+    log=None,
+):
+    """Generate and bulk insert synthetic data (requires an app context)
+
+    ``users`` counts buyers and sellers together; the first ``sellers`` of
+    them are sellers. Returns a summary with the generated id ranges.
+    """
+    log = log or (lambda message: None)
+    rng = random.Random(seed)
+    sellers = min(sellers, users)
+    buyers = users - sellers
+    now = datetime.utcnow()
+
+    with fast_sqlite_pragmas():
+        if password_hash is None:
+            # One bcrypt round trip for the whole run, not one per user
+            from flask import current_app
+            from project.config.extensions import bcrypt
+
+            bcrypt.init_app(current_app)
+            password_hash = bcrypt.generate_password_hash(password).decode("utf-8")
+
+        timings = {}
+        random_float = rng.random
+        user_stamps = timestamp_pool(now, 365 * 86400, rng)
+        product_stamps = timestamp_pool(now, 180 * 86400, rng)
+        token_stamps = timestamp_pool(now, 7 * 86400, rng)
+        invoice_stamps = timestamp_pool(now, 90 * 86400, rng)
+        # Centered on now, so about half of the blacklist is already expired
+        expiry_stamps = timestamp_pool(now + timedelta(days=2), 4 * 86400, rng)
+        pick = len(user_stamps)
+
+        # Users
+        started = time.perf_counter()
+        user_base = next_id(User)
+        seller_ids = range(user_base, user_base + sellers)
+        buyer_ids = range(user_base + sellers, user_base + users)
+
+        def user_rows():
+            for i in range(sellers):
+                yield (
+                    seller_ids[i],
+                    f"{prefix}seller{i}",
+                    f"{prefix}seller{i}@seed.local",
+                    password_hash,
+                    UserRole.SELLER.value,
+                    UserStatus.ACTIVE.value,
+                    0.0,
+                    user_stamps[int(random_float() * pick)],
+                )
+            for i in range(buyers):
+                yield (
+                    buyer_ids[i],
+                    f"{prefix}buyer{i}",
+                    f"{prefix}buyer{i}@seed.local",
+                    password_hash,
+                    UserRole.BUYER.value,
+                    UserStatus.ACTIVE.value,
+                    1_000_000.0,
+                    user_stamps[int(random_float() * pick)],
+                )
+
+        bulk_insert(
+            User.__table__,
+            ("id", "username", "email", "password_hash", "role", "status", "balance",
+             "created_at"),
+            user_rows(),
+            chunk_size,
+        )
+        timings["users"] = (users, time.perf_counter() - started)
+        log(f"users: {users}")
+
+        # Products, consecutive ids per seller (every MAX_SHARDS-th when sharded)
+        started = time.perf_counter()
+        counts = seller_product_counts(sellers, products, skew, rng)
+        prices = array("d")
+        owners = array("q")
+        products_by_seller = {}
+        seller_shards = {}
+        if shards.enabled():
+            for seller_id, count in zip(seller_ids, counts):
+                seller_shards[seller_id] = shard = shards.for_seller(seller_id)
+                products_by_seller[seller_id] = (
+                    shard.allocate_ids(count) if count else range(0)
+                )
+            product_ids = array("q")
+            for ids in products_by_seller.values():
+                product_ids.extend(ids)
+        else:
+            cursor = product_base = next_id(Product)
+            for seller_id, count in zip(seller_ids, counts):
+                seller_shards[seller_id] = shards.DEFAULT_SHARD
+                products_by_seller[seller_id] = range(cursor, cursor + count)
+                cursor += count
+            product_ids = range(product_base, cursor)
+
+        titles = [f"{word.title()} {noun}" for word in WORDS for noun in NOUNS]
+        descriptions = [f"{word} {noun}" for word in WORDS for noun in NOUNS]
+        n_titles = len(titles)
+
+        def product_rows():
+            append_price = prices.append
+            append_owner = owners.append
+            for seller_id in seller_ids:
+                suffix = f" by seller {seller_id}"
+                shard = seller_shards[seller_id]
+                for product_id in products_by_seller[seller_id]:
+                    price = int(random_float() * 49900 + 100) / 100
+                    append_price(price)
+                    append_owner(seller_id)
+                    created_at = product_stamps[int(random_float() * pick)]
+                    yield shard, (
+                        product_id,
+                        f"{titles[int(random_float() * n_titles)]} {product_id}",
+                        descriptions[int(random_float() * n_titles)] + suffix,
+                        int(random_float() * 1001),
+                        price,
+                        seller_id,
+                        created_at,
+                        created_at,
+                    )
+
+        routed_insert(
+            Product.__table__,
+            ("id", "title", "description", "quantity", "price", "user_id",
+             "created_at", "updated_at"),
+            product_rows(),
+            chunk_size,
+        )
+        timings["products"] = (products, time.perf_counter() - started)
+        log(f"products: {products}")
+
+        # Blacklisted tokens
+        started = time.perf_counter()
+        token_base = next_id(TokenBlacklist)
+        all_user_ids = range(user_base, user_base + users)
+
+        def token_rows():
+            for i in range(tokens):
+                yield (
+                    token_base + i,
+                    str(uuid.UUID(int=rng.getrandbits(128))),
+                    "access",
+                    all_user_ids[int(random_float() * users)],
+                    token_stamps[int(random_float() * pick)],
+                    expiry_stamps[int(random_float() * pick)],
+                )
+
+        if tokens and users:
+            bulk_insert(
+                TokenBlacklist.__table__,
+                ("id", "jti", "token_type", "user_id", "revoked_at", "expires_at"),
+                token_rows(),
+                chunk_size,
+            )
+        timings["tokens"] = (tokens, time.perf_counter() - started)
+        log(f"blacklisted tokens: {tokens}")
+
+        # Invoices with their items
+        started = time.perf_counter()
+        invoice_base = next_id(Invoice)
+        item_base = next_id(InvoiceItem)
+        invoice_count = 0
+        item_count = 0
+
+        if invoices and prices and buyers:
+            item_id = item_base
+            for chunk_start in range(0, invoices, chunk_size):
+                invoice_rows = []
+                item_rows = []
+                for i in range(chunk_start, min(invoices, chunk_start + chunk_size)):
+                    quantity = 0
+                    total = 0.0
+                    for _ in range(rng.randint(1, max_items)):
+                        index = rng.randrange(len(prices))
+                        units = rng.randint(1, 3)
+                        quantity += units
+                        total += prices[index] * units
+                        item_rows.append(
+                            (item_id, product_ids[index], invoice_base + i, units,
+                             prices[index], owners[index])
+                        )
+                        item_id += 1
+                    invoice_rows.append(
+                        (
+                            invoice_base + i,
+                            InvoiceStatus.DONE.value,
+                            rng.choice(buyer_ids),
+                            quantity,
+                            round(total, 2),
+                            invoice_stamps[int(random_float() * pick)],
+                        )
+                    )
+                invoice_count += bulk_insert(
+                    Invoice.__table__,
+                    ("id", "status", "owner_id", "quantity", "total_price", "created_at"),
+                    invoice_rows,
+                    chunk_size,
+                )
+                item_count += bulk_insert(
+                    InvoiceItem.__table__,
+                    ("id", "product_id", "buyer_invoice_id", "quantity", "unit_price",
+                     "seller_id"),
+                    item_rows,
+                    chunk_size,
+                )
+        timings["invoices"] = (invoice_count + item_count, time.perf_counter() - started)
+        log(f"invoices: {invoice_count} ({item_count} items)")
+
+        db.session.commit()
+        shards.commit_shards()
+
+    return {
+        "buyer_ids": buyer_ids,
+        "seller_ids": seller_ids,
+        "product_ids": product_ids,
+        "products_by_seller": products_by_seller,
+        "timings": timings,
+    }
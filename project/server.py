@@ -0,0 +1,96 @@
+"""Production WSGI server entry point (gunicorn) with per-worker warmup"""
+
+from project.config.extensions import db
+
+
+def register_warmup(app, hook):
+    """Run ``hook(app)`` inside an app context before a worker takes traffic"""
+    app.extensions.setdefault("warmup", []).append(hook)
+
+
+def warmup(app):
+    """Open pooled connections, compile routes and prime caches"""
+    with app.app_context():
+        # Fill the connection pool up to the number of serving threads
+        size = max(1, app.config.get("SERVER_THREADS", 1))
+        connections = [db.engine.connect() for _ in range(size)]
+        for connection in connections:
+            connection.exec_driver_sql("SELECT 1")
+            connection.close()
+
+        # Build the URL matcher now instead of on the first request
+        app.url_map.bind("localhost").match("/")
+
+        # Compile the statements every authenticated request runs
+        from project.apps.auth.models import User, TokenBlacklist
+        from project.apps.products import shards
+        from project.apps.products.models import Product
+
+        db.session.get(User, 0)
+        TokenBlacklist.is_token_revoked("warmup")
+        for shard in shards.all_shards():
+            shard.session.query(Product).limit(1).all()
+        shards.remove_sessions()
+
+        for hook in app.extensions.get("warmup", []):
+            hook(app)
+
+    # One pass through the full request pipeline (JSON provider, error handlers)
+    with app.test_client() as client:
+        client.get("/")
+
+
+def gunicorn_options(app, bind=None, workers=None, threads=None, backlog=None):
+    config = app.config
+    threads = threads or config["SERVER_THREADS"]
+    return {
+        "bind": bind or config["SERVER_BIND"],
+        "workers": workers or config["SERVER_WORKERS"],
+        "threads": threads,
+        "worker_class": config["SERVER_WORKER_CLASS"]
+        or ("gthread" if threads > 1 else "sync"),
+        "backlog": backlog or config["SERVER_BACKLOG"],
+        "timeout": config["SERVER_TIMEOUT"],
+        "keepalive": config["SERVER_KEEPALIVE"],
+        "preload_app": True,
+        "post_fork": post_fork,
+        "post_worker_init": post_worker_init,
+    }
+
+
+def post_fork(server, worker):
+    # Connections opened by the master must not be shared with children
+    with worker.app.application.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    warmup(worker.app.application)
+    worker.log.info("Worker %s warmed up", worker.pid)
+
+
+def serve(app, **overrides):
+    """Run ``app`` under gunicorn, preloaded in the master and warmed per worker"""
+    from gunicorn.app.base import BaseApplication
+
+    options = gunicorn_options(app, **overrides)
+    app.config["SERVER_THREADS"] = options["threads"]
+    from project import admission
+
+    # The limits were sized when the app was built, maybe for other threads
+    admission.resize(app)
+
+    class Application(BaseApplication):
+        def __init__(self, application):
+            self.application = application
+            super().__init__()
+
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    Application(app).run()
@@ -0,0 +1,266 @@
+"""Product image storage
+
+``IMAGE_STORAGE`` picks the backend: ``local`` (files under
+``UPLOAD_FOLDER``) or ``s3`` (any S3-compatible service; point
+``IMAGE_S3_ENDPOINT_URL`` at MinIO or a moto server for a local stand-in).
+
+Every image is stored under a key derived from its file name alone,
+``ab/cd/<name>`` with ``abcd`` the start of the name's SHA-1, so no
+directory holds more than a sliver of the files and the key of any stored
+``image_path``, old or new, is ``key_for(its base name)``. Images saved
+before this layout sit directly in ``UPLOAD_FOLDER``; they are still served
+from there until ``main.py migrate-images`` moves them.
+"""
+
+import hashlib
+import mimetypes
+import os
+import shutil
+from flask import Response, current_app, redirect, send_from_directory
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # Optional: local storage only
+    boto3 = None
+
+BLOCK_SIZE = 64 * 1024
+EXTENSION_KEY = "image_storage"
+
+
+def key_for(path):
+    """Storage key for an image path or bare file name"""
+    name = os.path.basename(path)
+    if not name or name.startswith("."):
+        raise ValueError(f"Invalid image name {path!r}")
+    digest = hashlib.sha1(name.encode()).hexdigest()
+    return f"{digest[:2]}/{digest[2:4]}/{name}"
+
+
+class LocalStorage:
+    """Files under ``root``, written to a temporary name and renamed into place"""
+
+    def __init__(self, root):
+        self.root = root
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def _commit(self, temporary, key):
+        os.replace(temporary, self.path(key))
+        return key
+
+    def _temporary(self, key):
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        return os.path.join(
+            os.path.dirname(target), f".{os.path.basename(target)}.{os.urandom(4).hex()}"
+        )
+
+    def save(self, stream, name):
+        """Store the readable ``stream`` as ``name``; returns its key"""
+        key = key_for(name)
+        temporary = self._temporary(key)
+        try:
+            with open(temporary, "wb") as file:
+                shutil.copyfileobj(stream, file, BLOCK_SIZE)
+            return self._commit(temporary, key)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+    def move_in(self, source, name):
+        """Take over the local file ``source``; a rename on the same filesystem"""
+        key = key_for(name)
+        temporary = self._temporary(key)
+        shutil.move(source, temporary)
+        return self._commit(temporary, key)
+
+    def exists(self, key):
+        return os.path.isfile(self.path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def response(self, key):
+        """A response serving ``key``, or None if it is not stored"""
+        if not self.exists(key):
+            return None
+        return send_from_directory(os.path.abspath(self.root), key)
+
+
+class S3Storage:
+    """Objects in an S3 bucket under ``prefix``
+
+    Images are streamed through the app, or with ``presign_seconds`` the
+    client is redirected to a presigned URL so no worker stays busy.
+    """
+
+    def __init__(self, bucket, prefix="", endpoint_url=None, region=None, presign_seconds=0):
+        if boto3 is None:
+            raise RuntimeError("IMAGE_STORAGE=s3 needs the boto3 package")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.presign_seconds = presign_seconds
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None, region_name=region or None)
+
+    def object_key(self, key):
+        return self.prefix + key
+
+    def _content_type(self, name):
+        return mimetypes.guess_type(name)[0] or "application/octet-stream"
+
+    def save(self, stream, name):
+        key = key_for(name)
+        # A PUT becomes visible all at once, never partially written
+        self.client.upload_fileobj(
+            stream,
+            self.bucket,
+            self.object_key(key),
+            ExtraArgs={"ContentType": self._content_type(name)},
+        )
+        return key
+
+    def move_in(self, source, name):
+        key = key_for(name)
+        self.client.upload_file(
+            source,
+            self.bucket,
+            self.object_key(key),
+            ExtraArgs={"ContentType": self._content_type(name)},
+        )
+        os.remove(source)
+        return key
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.object_key(key))
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self.object_key(key))
+
+    def response(self, key):
+        if self.presign_seconds:
+            if not self.exists(key):
+                return None
+            return redirect(
+                self.client.generate_presigned_url(
+                    "get_object",
+                    Params={"Bucket": self.bucket, "Key": self.object_key(key)},
+                    ExpiresIn=self.presign_seconds,
+                )
+            )
+        try:
+            stored = self.client.get_object(Bucket=self.bucket, Key=self.object_key(key))
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return Response(
+            stored["Body"].iter_chunks(BLOCK_SIZE),
+            mimetype=stored.get("ContentType") or self._content_type(key),
+            headers={"Content-Length": str(stored["ContentLength"])},
+            direct_passthrough=True,
+        )
+
+
+def create_storage(config):
+    backend = config["IMAGE_STORAGE"]
+    if backend == "local":
+        return LocalStorage(config["UPLOAD_FOLDER"])
+    if backend == "s3":
+        if not config["IMAGE_S3_BUCKET"]:
+            raise ValueError("IMAGE_STORAGE=s3 needs IMAGE_S3_BUCKET")
+        return S3Storage(
+            config["IMAGE_S3_BUCKET"],
+            prefix=config["IMAGE_S3_PREFIX"],
+            endpoint_url=config["IMAGE_S3_ENDPOINT_URL"],
+            region=config["IMAGE_S3_REGION"],
+            presign_seconds=config["IMAGE_S3_PRESIGN_SECONDS"],
+        )
+    raise ValueError(f"Unknown IMAGE_STORAGE {backend}")
+
+
+def init_app(app):
+    app.extensions[EXTENSION_KEY] = create_storage(app.config)
+
+
+def get_storage():
+    return current_app.extensions[EXTENSION_KEY]
+
+
+def legacy_path(name):
+    """Where an image saved before the sharded layout would be"""
+    return os.path.join(current_app.config["UPLOAD_FOLDER"], os.path.basename(name))
+
+
+def save(stream, name):
+    return get_storage().save(stream, name)
+
+
+def move_in(source, name):
+    return get_storage().move_in(source, name)
+
+
+def delete(image_path):
+    """Remove an image, whichever layout it is stored in"""
+    get_storage().delete(key_for(image_path))
+    try:
+        os.remove(legacy_path(image_path))
+    except FileNotFoundError:
+        pass
+
+
+def response(image_path):
+    """A response serving an image, or None
+
+    The old flat location is tried first. ``migrate-images`` stores a file
+    under its key before removing the old copy, so a miss there means the
+    key already exists: the lookup cannot fall between the two.
+    """
+    legacy = legacy_path(image_path)
+    if os.path.isfile(legacy):
+        return send_from_directory(
+            os.path.abspath(os.path.dirname(legacy)), os.path.basename(legacy)
+        )
+    return get_storage().response(key_for(image_path))
+
+
+def legacy_files():
+    """Names of the images still stored flat in ``UPLOAD_FOLDER``"""
+    root = current_app.config["UPLOAD_FOLDER"]
+    if not os.path.isdir(root):
+        return
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_file() and not entry.name.startswith("."):
+                yield entry.name
+
+
+def migrate_file(name):
+    """Store one flat file under its key, then remove the flat copy"""
+    source = legacy_path(name)
+    storage = get_storage()
+    key = key_for(name)
+    if isinstance(storage, LocalStorage):
+        # A hard link publishes the key while the old path still works
+        temporary = storage._temporary(key)
+        try:
+            os.link(source, temporary)
+        except OSError:
+            shutil.copy2(source, temporary)
+        storage._commit(temporary, key)
+    else:
+        with open(source, "rb") as file:
+            storage.save(file, name)
+    os.remove(source)
+    return key
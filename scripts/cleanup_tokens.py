@@ -9,7 +9,8 @@ from project.apps.auth.models import TokenBlacklist
 
 
 def cleanup_expired_tokens():
-    app = create_app()
+    # Only the database is needed, so skip views, bcrypt and JWT
+    app = create_app(register_views=False)
 
     with app.app_context():
         print("Cleaning up expired tokens from blacklist...")
@@ -16,8 +16,11 @@ def create_tables():
         from project.apps.auth.models import User, TokenBlacklist
         from project.apps.products.models import Product
 
-        # Create all tables
+        from project.apps.products import shards
+
+        # Create all tables, plus the product tables on each shard
         db.create_all()
+        shards.create_all()
         print("✓ Database tables created successfully!")
         print("  - users")
         print("  - token_blacklist")
@@ -0,0 +1,96 @@
+import pytest
+from flask_jwt_extended import create_access_token
+from project import create_app, load_models
+from project.config.extensions import db
+from project.apps.products import shards
+from project.config.settings import TestingConfig
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Build an app on a temporary database; keyword overrides go to config
+
+    Apps are DB-only unless ``register_views=True``.
+    """
+
+    def make(register_views=False, **overrides):
+        settings = {
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'app.db'}",
+            "UPLOAD_FOLDER": str(tmp_path / "uploads"),
+            "UPLOAD_STAGING_FOLDER": str(tmp_path / "partial"),
+            "CACHE_SQLITE_PATH": str(tmp_path / "cache.sqlite"),
+        }
+        settings.update(overrides)
+        return create_app(
+            type("Config", (TestingConfig,), settings), register_views=register_views
+        )
+
+    return make
+
+
+class Shop:
+    """A full app with its tables, a test client and quick fixtures"""
+
+    def __init__(self, app):
+        self.app = app
+        self.client = app.test_client()
+
+    def user(self, role="buyer", balance=0.0, status="active"):
+        """Create a user; returns its id and request headers"""
+        from project.apps.auth.models import User
+
+        count = User.query.count()
+        user = User(
+            username=f"{role}{count}",
+            email=f"{role}{count}@shop.test",
+            password_hash="x",
+            role=role,
+            status=status,
+            balance=balance,
+        )
+        db.session.add(user)
+        db.session.commit()
+        token = create_access_token(identity=str(user.id))
+        return user.id, {"Authorization": f"Bearer {token}"}
+
+    def product(self, seller_id, quantity=10, price=10.0):
+        from project.apps.products.models import Product, SellerStats
+
+        shard = shards.for_seller(seller_id)
+        product = Product(
+            title="Lamp", quantity=quantity, price=price, user_id=seller_id
+        )
+        if shards.enabled():
+            product.id = shard.allocate_ids(1)[0]
+        shard.session.add(product)
+        shard.session.flush()
+        SellerStats.record_product(product, session=shard.session)
+        shard.session.commit()
+        return product.id
+
+
+@pytest.fixture
+def make_shop(make_app):
+    """Factory of ``Shop``s; keyword overrides go to config"""
+    contexts = []
+
+    def make(**overrides):
+        app = make_app(register_views=True, **overrides)
+        load_models()
+        context = app.app_context()
+        context.push()
+        contexts.append(context)
+        db.create_all()
+        shards.create_all()
+        return Shop(app)
+
+    yield make
+    for context in reversed(contexts):
+        db.session.remove()
+        shards.remove_sessions()
+        context.pop()
+
+
+@pytest.fixture
+def shop(make_shop):
+    return make_shop()
@@ -0,0 +1,143 @@
+import threading
+import time
+import pytest
+from project import admission
+from project.config.settings import TestingConfig
+
+
+def controller(threads, **overrides):
+    config = {
+        name: getattr(TestingConfig, name)
+        for name in dir(TestingConfig)
+        if name.startswith("ADMISSION_")
+    }
+    config.update(SERVER_THREADS=threads, **overrides)
+    return admission.build_controller(config)
+
+
+def test_limits_are_sized_from_the_threads():
+    sized = controller(4)
+    assert sized.reserve == 1
+    assert {name: limiter.max_limit for name, limiter in sized.limiters.items()} == {
+        "read": 3,
+        "write": 3,
+        "auth": 2,
+        "upload": 2,
+        "checkout": 4,
+    }
+    assert all(limiter.max_limit <= 4 for limiter in controller(4).limiters.values())
+    assert controller(32).limiters["read"].max_limit == 31
+
+
+def test_a_single_thread_has_no_reserve():
+    single = controller(1)
+    assert single.reserve == 0
+    assert single.acquire("read")
+    assert not single.acquire("checkout")
+    single.release("read", 0.01)
+    assert single.acquire("checkout")
+
+
+def test_other_classes_leave_the_reserved_thread_to_checkout():
+    sized = controller(4)
+    assert [sized.acquire("read") for _ in range(3)] == [True, True, True]
+    assert not sized.acquire("write")
+    assert not sized.acquire("read")
+    assert sized.acquire("checkout")
+    assert sized.occupied == 4
+    assert not sized.acquire("checkout")
+
+
+def test_waiting_requests_count_against_the_threads():
+    sized = controller(8, ADMISSION_QUEUE_SECONDS="write=5")
+    limiter = sized.limiters["write"]
+    limiter.limit = 1.0
+    assert sized.acquire("write")
+    results = []
+    waiters = [
+        threading.Thread(target=lambda: results.append(sized.acquire("write")))
+        for _ in range(2)
+    ]
+    for waiter in waiters:
+        waiter.start()
+    deadline = time.monotonic() + 2
+    while limiter.waiting() < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert limiter.waiting() == 2
+    assert sized.occupied == 3
+    # A full class may not wait once its share of the threads is waiting
+    sized.limiters["auth"].limit = 1.0
+    assert sized.acquire("auth")
+    started = time.monotonic()
+    assert not sized.acquire("auth")
+    assert time.monotonic() - started < 0.5
+    sized.release("auth", 0.01)
+    sized.release("write", 0.01)
+    sized.release("write", 0.01)
+    for waiter in waiters:
+        waiter.join(2)
+    sized.release("write", 0.01)
+    assert results == [True, True]
+    assert sized.occupied == 0
+
+
+@pytest.mark.parametrize("threads", [1, 2, 4, 16])
+def test_occupancy_never_exceeds_the_threads(threads):
+    sized = controller(threads, ADMISSION_QUEUE_SECONDS="read=0.05,write=0.05")
+    peak = []
+    lock = threading.Lock()
+
+    def request(name):
+        if sized.acquire(name):
+            with lock:
+                peak.append(sized.occupied)
+            time.sleep(0.01)
+            sized.release(name, 0.01)
+
+    workers = [
+        threading.Thread(target=request, args=(name,))
+        for name in ["read", "write", "auth", "checkout"] * 10
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(5)
+    assert peak and max(peak) <= threads
+    assert sized.occupied == 0
+
+
+def test_streams_are_capped_below_the_threads():
+    sized = controller(4)
+    assert sized.max_streams == 1
+    assert controller(1).max_streams == 0
+    assert controller(2, ADMISSION_STREAM_SHARE=1.0).max_streams == 0
+    assert controller(16, ADMISSION_STREAM_SHARE=1.0).max_streams == 14
+
+    assert sized.acquire_stream()
+    assert not sized.acquire_stream()
+    assert sized.occupied == 1
+    # The stream's thread is not available to other classes
+    assert [sized.acquire("read") for _ in range(3)] == [True, True, False]
+    sized.release("stream", 60.0)
+    assert sized.acquire_stream()
+    assert sized.stats()["stream"] == {"limit": 1, "in_flight": 1, "rejected": 1}
+
+
+def test_stream_over_the_cap_gets_503(make_shop):
+    shop = make_shop(SERVER_THREADS=4, SSE_HEARTBEAT_SECONDS=0.05)
+    seller, _ = shop.user("seller")
+    product = shop.product(seller)
+    _, buyer = shop.user("buyer")
+    url = f"/api/products/stream?ids={product}"
+
+    first = shop.client.get(url, headers=buyer, buffered=False)
+    assert first.status_code == 200
+    assert next(first.response)
+    refused = shop.client.get(url, headers=buyer)
+    assert refused.status_code == 503
+    assert refused.headers["Retry-After"] == "30"
+
+    first.close()
+    second = shop.client.get(url, headers=buyer, buffered=False)
+    assert second.status_code == 200
+    second.close()
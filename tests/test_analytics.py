@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+import pytest
+from project import load_models
+from project.config.extensions import db
+from project.apps.analytics.models import ALL, SalesRollup, fold_invoices
+from project.apps.auth.models import User
+from project.apps.invoices.models import Invoice, InvoiceItem, InvoiceStatus
+from project.apps.products.models import Product
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    load_models()
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def user(name, role):
+    account = User(
+        username=name, email=f"{name}@x.io", password_hash="x", role=role, status="active"
+    )
+    db.session.add(account)
+    db.session.flush()
+    return account
+
+
+def sell(buyer, product_id, seller_id, units, price):
+    invoice = Invoice(
+        status=InvoiceStatus.DONE.value,
+        owner_id=buyer.id,
+        quantity=units,
+        total_price=units * price,
+        created_at=datetime.utcnow() - timedelta(hours=1),
+    )
+    db.session.add(invoice)
+    db.session.flush()
+    db.session.add(
+        InvoiceItem(
+            product_id=product_id,
+            buyer_invoice_id=invoice.id,
+            quantity=units,
+            unit_price=price,
+            seller_id=seller_id,
+        )
+    )
+    db.session.commit()
+
+
+def rollup(seller_id, product_id):
+    row = SalesRollup.query.filter_by(
+        granularity="hour", seller_id=seller_id, product_id=product_id
+    ).one_or_none()
+    return (row.units, row.revenue) if row else None
+
+
+def test_sales_of_a_deleted_product_are_folded(app):
+    seller, buyer = user("seller", "seller"), user("buyer", "buyer")
+    product = Product(title="Lamp", quantity=5, price=10.0, user_id=seller.id)
+    db.session.add(product)
+    db.session.commit()
+    sell(buyer, product.id, seller.id, 2, 10.0)
+    db.session.delete(product)
+    db.session.commit()
+
+    assert fold_invoices(settle_seconds=0) == 1
+    assert rollup(seller.id, product.id) == (2, 20.0)
+    assert rollup(seller.id, ALL) == (2, 20.0)
+    assert rollup(ALL, ALL) == (2, 20.0)
+
+
+def test_items_without_a_seller_fall_back_to_the_product_owner(app):
+    seller, buyer = user("seller", "seller"), user("buyer", "buyer")
+    product = Product(title="Lamp", quantity=5, price=10.0, user_id=seller.id)
+    db.session.add(product)
+    db.session.commit()
+    sell(buyer, product.id, None, 1, 10.0)
+    sell(buyer, 999999, None, 1, 5.0)  # Legacy item of a product long gone
+
+    assert fold_invoices(settle_seconds=0) == 2
+    assert rollup(seller.id, product.id) == (1, 10.0)
+    assert rollup(ALL, ALL) == (1, 10.0)
@@ -0,0 +1,190 @@
+import time
+import pytest
+from project import cache
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def connect(request, tmp_path, monkeypatch):
+    """A factory of stores that all see the same shared data, like workers do"""
+    if request.param == "memory":
+        store = cache.MemoryStore()
+        return lambda: store
+    if request.param == "sqlite":
+        return lambda: cache.SQLiteStore(str(tmp_path / "cache.sqlite"), log_seconds=300)
+    fakeredis = pytest.importorskip("fakeredis")
+    if cache.redis is None:
+        pytest.skip("redis package not installed")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        cache.redis.Redis, "from_url", lambda url: fakeredis.FakeRedis(server=server)
+    )
+    return lambda: cache.RedisStore("redis://localhost")
+
+
+def trim_log(store):
+    """Drop the whole invalidation log, as age-based trimming eventually does"""
+    if isinstance(store, cache.SQLiteStore):
+        store._connection().execute("DELETE FROM invalidations")
+    elif isinstance(store, cache.RedisStore):
+        store.client.delete(store.stream)
+    else:
+        store.log.clear()
+
+
+def worker(connect, **options):
+    options.setdefault("poll_seconds", 0)
+    return cache.TieredCache(connect(), **options)
+
+
+def test_store_get_set_delete(connect):
+    store = connect()
+    assert store.get("k") == (None, None)
+    store.set("k", b"value", 60)
+    value, expires = store.get("k")
+    assert bytes(value) == b"value"
+    assert time.time() < expires <= time.time() + 60
+    store.delete("k")
+    assert store.get("k") == (None, None)
+
+
+def test_store_entries_expire(connect):
+    store = connect()
+    store.set("k", b"value", 0.05)
+    time.sleep(0.1)
+    assert store.get("k") == (None, None)
+    assert store.add("k", b"again", 60)
+    assert bytes(store.get("k")[0]) == b"again"
+
+
+def test_store_add_keeps_a_live_entry(connect):
+    store = connect()
+    assert store.add("k", b"first", 60)
+    assert not store.add("k", b"second", 60)
+    assert bytes(store.get("k")[0]) == b"first"
+    store.set("k", b"third", 60)
+    assert bytes(store.get("k")[0]) == b"third"
+
+
+def test_store_generations_and_log(connect):
+    first, second = connect(), connect()
+    assert first.generation("ns") == 0
+    assert first.bump("ns") == 1
+    assert second.generation("ns") == 1
+    start = second.last_id()
+    first.publish("key:a")
+    first.publish("clear:b")
+    assert [name for _, name in second.since(start)] == ["key:a", "clear:b"]
+    assert second.since(second.last_id()) == []
+
+
+def test_sqlite_store_trims_expired_entries_and_old_log(tmp_path):
+    store = cache.SQLiteStore(str(tmp_path / "cache.sqlite"), log_seconds=0)
+    store.set("gone", b"x", 0.01)
+    store.publish("key:old")
+    time.sleep(0.05)
+    for i in range(1000):
+        store.set(f"k{i}", b"x", 60)
+    connection = store._connection()
+    assert connection.execute("SELECT 1 FROM entries WHERE key = 'gone'").fetchone() is None
+    assert store.since(0) == []
+
+
+def test_values_round_trip(connect):
+    shared = worker(connect)
+    shared.set("ns", "bytes", b"\x00raw", 60)
+    shared.set("ns", "json", {"a": [1, 2]}, 60)
+    assert shared.get("ns", "bytes", local=False) == b"\x00raw"
+    assert shared.get("ns", "json", local=False) == {"a": [1, 2]}
+
+
+def test_delete_reaches_another_worker_through_the_log(connect):
+    first, second = worker(connect), worker(connect)
+    first.set("users", "1", "active", 60)
+    assert second.get("users", "1") == "active"  # Now in second's local tier
+    first.delete("users", "1")
+    assert second.get("users", "1") is None
+
+
+def test_publish_drops_another_workers_local_copy(connect):
+    first, second = worker(connect), worker(connect)
+    first.set("revoked", "jti", False, 60)
+    assert second.get("revoked", "jti") is False
+    first.set("revoked", "jti", True, 60, publish=True)
+    assert second.get("revoked", "jti") is True
+
+
+def test_local_tier_answers_until_the_next_poll(connect):
+    first, second = worker(connect), worker(connect, poll_seconds=60)
+    first.set("users", "1", "active", 60)
+    assert second.get("users", "1") == "active"
+    first.delete("users", "1")
+    assert second.get("users", "1") == "active"
+    second.polled_at -= 60
+    assert second.get("users", "1") is None
+
+
+def test_worker_behind_a_trimmed_log_drops_its_local_tier(connect):
+    first = worker(connect)
+    second = worker(connect, poll_seconds=1, log_seconds=10)
+    first.set("users", "1", "active", 60)
+    assert second.get("users", "1") == "active"
+    first.store.set(first._key("users", "1"), cache.encode("suspended"), 60)
+    first.delete("users", "2")
+    trim_log(first.store)
+    second.polled_at -= 10  # Not polled for longer than half the log's age
+    assert second.get("users", "1") == "suspended"
+    # It resumes from the end of the log
+    first.delete("users", "1")
+    second.polled_at -= 1
+    assert second.get("users", "1") is None
+
+
+def test_clear_bumps_the_generation_for_other_workers(connect):
+    first, second = worker(connect), worker(connect)
+    second.set("catalog", "page", b"old", 60)
+    assert second.generation("catalog") == 0
+    first.clear("catalog")
+    assert second.generation("catalog") == 1
+    assert second.get("catalog", "page") is None
+    assert first.get("catalog", "page") is None
+
+
+def test_generation_bump_seen_by_a_second_cache_on_the_same_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    first = cache.TieredCache(cache.SQLiteStore(path), poll_seconds=0)
+    second = cache.TieredCache(cache.SQLiteStore(path), poll_seconds=0)
+    first.set("catalog", "page", b"old", 60)
+    assert second.get("catalog", "page") == b"old"
+    first.clear("catalog")
+    assert second.get("catalog", "page") is None
+    second.set("catalog", "page", b"new", 60)
+    assert first.get("catalog", "page") == b"new"
+    assert first.stats()["generations"] == {"catalog": 1}
+
+
+def test_add_does_not_replace_a_written_value(connect):
+    first, second = worker(connect), worker(connect)
+    first.set("revoked", "jti", True, 60, publish=True)
+    assert not second.add("revoked", "jti", False, 60)
+    assert second.get("revoked", "jti") is True
+    assert second.add("revoked", "other", False, 60)
+    assert first.get("revoked", "other") is False
+
+
+def test_cached_and_invalidate_helpers(make_app):
+    app = make_app(CACHE_BACKEND="sqlite")
+    loads = []
+
+    def load():
+        loads.append(1)
+        return {"role": "buyer"}
+
+    with app.app_context():
+        assert cache.cached("users", "1", 60, load) == {"role": "buyer"}
+        assert cache.cached("users", "1", 60, load) == {"role": "buyer"}
+        assert len(loads) == 1
+        cache.invalidate("users", "1")
+        cache.cached("users", "1", 60, load)
+        assert len(loads) == 2
+        assert cache.cached("users", "none", 60, lambda: None) is None
+        assert cache.get_cache().get("users", "none", local=False) is None
@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from project.config.extensions import db
+from project.apps.cart.models import Reservation
+from project.apps.products import views as product_views
+from project.apps.products.models import Product
+
+
+def stock(product_id):
+    product = db.session.get(Product, product_id, populate_existing=True)
+    return None if product is None else (product.quantity, product.reserved)
+
+
+def hold(shop, product_id, quantity, headers):
+    return shop.client.post(
+        "/api/cart", json={"product_id": product_id, "quantity": quantity}, headers=headers
+    )
+
+
+def test_hold_then_checkout(shop):
+    seller, _ = shop.user("seller")
+    product = shop.product(seller, quantity=5, price=10.0)
+    _, buyer = shop.user("buyer", balance=100.0)
+
+    response = hold(shop, product, 2, buyer)
+    assert response.status_code == 201
+    assert stock(product) == (5, 2)
+    response = hold(shop, product, 4, buyer)
+    assert response.status_code == 409
+
+    response = shop.client.post("/api/cart/checkout", headers=buyer)
+    assert response.status_code == 201
+    body = response.get_json()
+    assert body["invoice"]["total_price"] == 20.0
+    assert body["items"][0]["seller_id"] == seller
+    assert stock(product) == (3, 0)
+    assert shop.client.post("/api/cart/checkout", headers=buyer).status_code == 400
+
+
+def test_expired_holds_are_released(shop):
+    seller, _ = shop.user("seller")
+    product = shop.product(seller, quantity=5)
+    _, buyer = shop.user("buyer", balance=100.0)
+    hold(shop, product, 3, buyer)
+
+    Reservation.query.update({"expires_at": datetime.utcnow() - timedelta(seconds=1)})
+    db.session.commit()
+    assert Reservation.release_expired() == 1
+    assert stock(product) == (5, 0)
+    assert shop.client.post("/api/cart/checkout", headers=buyer).status_code == 400
+
+
+def test_delete_loses_to_a_hold_committed_after_its_check(shop, monkeypatch):
+    seller, seller_headers = shop.user("seller")
+    product = shop.product(seller, quantity=5)
+    looked_up = product_views.find_product
+
+    def hold_after_lookup(product_id, user_id=None):
+        found = looked_up(product_id, user_id)
+        with db.engine.begin() as connection:  # Another worker's hold
+            table = Product.__table__
+            connection.execute(
+                table.update().where(table.c.id == product_id).values(reserved=1)
+            )
+        return found
+
+    monkeypatch.setattr(product_views, "find_product", hold_after_lookup)
+    response = shop.client.delete(f"/api/products/{product}", headers=seller_headers)
+    assert response.status_code == 409
+    assert stock(product) == (5, 1)
+
+
+def test_checkout_drops_holds_on_deleted_products(shop):
+    seller, _ = shop.user("seller")
+    kept = shop.product(seller, quantity=5, price=4.0)
+    gone = shop.product(seller, quantity=5)
+    _, buyer = shop.user("buyer", balance=100.0)
+    for product in (kept, gone):
+        hold(shop, product, 1, buyer)
+    db.session.execute(Product.__table__.delete().where(Product.id == gone))
+    db.session.commit()
+
+    response = shop.client.post("/api/cart/checkout", headers=buyer)
+    assert response.status_code == 409
+    assert response.get_json()["product_ids"] == [gone]
+    assert [r.product_id for r in Reservation.query] == [kept]
+
+    response = shop.client.post("/api/cart/checkout", headers=buyer)
+    assert response.status_code == 201
+    assert response.get_json()["invoice"]["total_price"] == 4.0
@@ -0,0 +1,63 @@
+import gzip
+import pytest
+from project import cache, compression
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app(COMPRESS_MIN_SIZE=10)
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def workers():
+    """Two workers' page caches over one shared store"""
+    store = cache.MemoryStore()
+    return [
+        compression.PrecompressedCache(
+            shared=cache.TieredCache(store, poll_seconds=0), namespace="pages"
+        )
+        for _ in range(2)
+    ]
+
+
+def serve(app, worker, key, encoding):
+    with app.test_request_context(headers={"Accept-Encoding": encoding}):
+        entry = worker.get(key)
+        if entry is None:
+            return None
+        response = worker.respond(entry)
+        return response.headers.get("Content-Encoding"), response.get_data()
+
+
+def test_other_workers_reuse_the_compressed_body(app, workers, monkeypatch):
+    first, second = workers
+    body = b'{"products": []}' * 20
+    calls = []
+    compress = compression.compress
+
+    def counted(data, encoding, cached=False):
+        calls.append(encoding)
+        return compress(data, encoding, cached)
+
+    monkeypatch.setattr(compression, "compress", counted)
+    first.put("page", body, first.generation)
+
+    encoding, data = serve(app, first, "page", "gzip")
+    assert (encoding, gzip.decompress(data)) == ("gzip", body)
+    assert serve(app, second, "page", "gzip") == (encoding, data)
+    assert serve(app, second, "page", "identity") == (None, body)
+    assert calls == ["gzip"]
+
+
+def test_clear_drops_every_encoding(app, workers):
+    first, second = workers
+    first.put("page", b"x" * 100, first.generation)
+    assert serve(app, second, "page", "gzip")[0] == "gzip"
+
+    second.clear()
+    assert serve(app, first, "page", "gzip") is None
+    first.put("page", b"y" * 100, first.generation)
+    encoding, data = serve(app, second, "page", "gzip")
+    assert gzip.decompress(data) == b"y" * 100
@@ -0,0 +1,118 @@
+import json
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from project.config.extensions import db
+from project.apps.auth import views as auth_views
+from project.apps.auth.models import User
+from project.apps.idempotency.decorators import request_fingerprint
+from project.apps.idempotency.models import IdempotencyKey, IdempotencyStatus
+
+URL = "/api/auth/increase-balance"
+
+
+def credit(shop, headers, amount, key="k1"):
+    return shop.client.post(
+        URL,
+        data=json.dumps({"amount": amount}),
+        content_type="application/json",
+        headers={**headers, "Idempotency-Key": key},
+    )
+
+
+def balance(user_id):
+    return db.session.get(User, user_id, populate_existing=True).balance
+
+
+def leave_in_flight(shop, user_id, amount, key="k1", age=0):
+    """Store a key as if another worker were running the same request"""
+    with shop.app.test_request_context(
+        URL,
+        method="POST",
+        data=json.dumps({"amount": amount}),
+        content_type="application/json",
+    ):
+        fingerprint = request_fingerprint()
+    record = IdempotencyKey.acquire(user_id, key, "auth.increase_balance", fingerprint, 3600)
+    record.locked_at = datetime.utcnow() - timedelta(seconds=age)
+    db.session.commit()
+
+
+def test_replay_returns_the_stored_response(shop):
+    user, headers = shop.user()
+
+    first = credit(shop, headers, 5)
+    assert first.status_code == 200
+    again = credit(shop, headers, 5)
+    assert again.status_code == 200
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert again.get_json() == first.get_json()
+    assert balance(user) == 5.0
+
+
+def test_key_reused_for_another_body(shop):
+    user, headers = shop.user()
+
+    assert credit(shop, headers, 5).status_code == 200
+    assert credit(shop, headers, 7).status_code == 422
+    assert balance(user) == 5.0
+
+
+def test_duplicate_of_in_flight_request(make_shop):
+    shop = make_shop(IDEMPOTENCY_WAIT_SECONDS=0.05)
+    user, headers = shop.user()
+    leave_in_flight(shop, user, 5)
+
+    response = credit(shop, headers, 5)
+    assert response.status_code == 409
+    assert response.headers["Retry-After"] == "1"
+    assert balance(user) == 0.0
+
+
+def test_abandoned_key_is_not_run_again(make_shop):
+    shop = make_shop(IDEMPOTENCY_LOCK_SECONDS=60)
+    user, headers = shop.user()
+    leave_in_flight(shop, user, 5, age=120)
+
+    response = credit(shop, headers, 5)
+    assert response.status_code == 409
+    assert "unknown" in response.get_json()["error"]
+    assert balance(user) == 0.0
+
+
+def test_crash_after_commit_does_not_credit_twice(make_shop, monkeypatch):
+    shop = make_shop(IDEMPOTENCY_LOCK_SECONDS=0)
+    user, headers = shop.user()
+
+    def crash(record_id, response):
+        raise RuntimeError("worker died")
+
+    monkeypatch.setattr(IdempotencyKey, "complete", staticmethod(crash))
+    with pytest.raises(RuntimeError):
+        credit(shop, headers, 5)
+    monkeypatch.undo()
+
+    record = IdempotencyKey.find(user, "k1")
+    db.session.refresh(record)
+    assert record.status == IdempotencyStatus.COMMITTED.value
+    response = credit(shop, headers, 5)
+    assert response.status_code == 409
+    assert balance(user) == 5.0
+
+
+def test_server_error_releases_the_key(shop, monkeypatch):
+    user, headers = shop.user()
+
+    def fail():
+        raise RuntimeError("database unavailable")
+
+    failing = SimpleNamespace(commit=fail, rollback=lambda: db.session.rollback())
+    monkeypatch.setattr(auth_views, "db", SimpleNamespace(session=failing))
+    assert credit(shop, headers, 5).status_code == 500
+    assert IdempotencyKey.find(user, "k1") is None
+
+    monkeypatch.undo()
+    response = credit(shop, headers, 5)
+    assert response.status_code == 200
+    assert "Idempotent-Replayed" not in response.headers
+    assert balance(user) == 5.0
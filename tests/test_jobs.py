@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+import pytest
+from click.testing import CliRunner
+from project.config.extensions import db
+from project.apps.jobs.models import Job, JobStatus
+from project.apps.jobs.registry import task
+from project.apps.jobs.worker import Worker
+
+calls = []
+
+
+@task("tests.flaky", queue="tests", max_attempts=2)
+def flaky(fail):
+    calls.append(fail)
+    if fail:
+        raise RuntimeError("flaky")
+
+
+@pytest.fixture
+def jobs(make_shop):
+    calls.clear()
+    shop = make_shop(JOB_RETRY_BASE_SECONDS=10, JOB_RETRY_MAX_SECONDS=15)
+    shop.worker = Worker(shop.app, {"tests": 1}, 1)
+    return shop
+
+
+def enqueue(fail=False):
+    job = flaky.enqueue(fail=fail)
+    db.session.commit()
+    return job.id
+
+
+def job(job_id):
+    return db.session.get(Job, job_id, populate_existing=True)
+
+
+def run_due(shop):
+    claimed = Job.claim(["tests"], 10, 60)
+    for row in claimed:
+        shop.worker.execute(row)
+    return len(claimed)
+
+
+def test_claim_takes_each_due_job_once(jobs):
+    ids = [enqueue() for _ in range(3)]
+    later = flaky.enqueue(delay=60, fail=False)
+    db.session.commit()
+
+    first = Job.claim(["tests"], 2, 60)
+    second = Job.claim(["tests"], 2, 60)
+    assert [row.id for row in first] == ids[:2]
+    assert [row.id for row in second] == ids[2:]
+    assert Job.claim(["tests"], 2, 60) == []
+    assert Job.claim(["other"], 2, 60) == []
+    assert job(later.id).status == JobStatus.QUEUED.value
+    assert all(job(job_id).attempts == 1 for job_id in ids)
+
+
+def test_failed_attempt_backs_off_then_fails(jobs):
+    job_id = enqueue(fail=True)
+    started = datetime.utcnow()
+
+    assert run_due(jobs) == 1
+    retried = job(job_id)
+    assert retried.status == JobStatus.QUEUED.value
+    assert "flaky" in retried.last_error
+    # Jittered between half and all of JOB_RETRY_BASE_SECONDS
+    assert started + timedelta(seconds=4) < retried.run_at
+    assert retried.run_at < datetime.utcnow() + timedelta(seconds=11)
+    assert run_due(jobs) == 0
+
+    retried.run_at = datetime.utcnow()
+    db.session.commit()
+    assert run_due(jobs) == 1
+    assert job(job_id).status == JobStatus.FAILED.value
+    assert calls == [True, True]
+    assert jobs.worker.processed == {"done": 0, "retried": 1, "failed": 1}
+
+
+def test_visibility_timeout_reclaims_a_dead_workers_job(jobs):
+    job_id = enqueue()
+    (dead,) = Job.claim(["tests"], 1, 60)
+    assert Job.claim(["tests"], 1, 60) == []
+
+    job(job_id).locked_until = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    (retaken,) = Job.claim(["tests"], 1, 60)
+    assert retaken.id == job_id
+    assert retaken.attempts == 2
+    assert retaken.claim_token != dead.claim_token
+
+    # The dead worker's late finish no longer counts
+    assert not Job.complete(dead)
+    assert Job.complete(retaken)
+    assert job(job_id).status == JobStatus.DONE.value
+
+
+def test_retry_failed_jobs_requeues_them(jobs, monkeypatch):
+    import main
+
+    job_id = enqueue(fail=True)
+    assert run_due(jobs) == 1
+    job(job_id).run_at = datetime.utcnow()
+    db.session.commit()
+    assert run_due(jobs) == 1
+    assert job(job_id).status == JobStatus.FAILED.value
+
+    monkeypatch.setattr(main, "command_app_context", jobs.app.app_context)
+    result = CliRunner().invoke(main.cli, ["retry-failed-jobs", "--task", "tests.flaky"])
+    assert result.exit_code == 0, result.output
+    assert "Requeued 1 failed jobs" in result.output
+    requeued = job(job_id)
+    assert (requeued.status, requeued.attempts) == (JobStatus.QUEUED.value, 0)
+
+    requeued.payload = '{"fail": false}'
+    db.session.commit()
+    assert run_due(jobs) == 1
+    assert job(job_id).status == JobStatus.DONE.value
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+from project.config.extensions import db
+from project.apps.products.models import ChangeOp, Product, ProductChange
+
+CREATE, UPDATE, DELETE = ChangeOp.CREATE.value, ChangeOp.UPDATE.value, ChangeOp.DELETE.value
+
+
+def record(product_id, *ops):
+    product = db.session.get(Product, product_id)
+    for op in ops:
+        ProductChange.record(product, op)
+    db.session.commit()
+
+
+def age(change_ids, seconds):
+    ProductChange.query.filter(ProductChange.id.in_(change_ids)).update(
+        {"changed_at": datetime.utcnow() - timedelta(seconds=seconds)},
+        synchronize_session=False,
+    )
+    db.session.commit()
+
+
+def feed():
+    return [
+        (change.product_id, change.op)
+        for change in ProductChange.query.order_by(ProductChange.id)
+    ]
+
+
+def test_pages_follow_the_cursor(shop):
+    seller, _ = shop.user("seller")
+    _, admin = shop.user("admin")
+    products = [shop.product(seller) for _ in range(3)]
+    for product_id in products:
+        record(product_id, CREATE)
+    record(products[0], UPDATE)
+
+    seen, cursor, pages = [], "", 0
+    while True:
+        response = shop.client.get(
+            f"/api/products/changes?since={cursor}&limit=2", headers=admin
+        )
+        assert response.status_code == 200
+        body = response.get_json()
+        seen += [(change["product_id"], change["op"]) for change in body["changes"]]
+        cursor = body["next_cursor"]
+        pages += 1
+        if not body["has_more"]:
+            break
+    assert pages == 2
+    assert seen == [(pid, CREATE) for pid in products] + [(products[0], UPDATE)]
+    response = shop.client.get(f"/api/products/changes?since={cursor}", headers=admin)
+    assert response.get_json()["changes"] == []
+    response = shop.client.get("/api/products/changes?since=x", headers=admin)
+    assert response.status_code == 400
+
+
+def test_young_changes_wait_for_the_settle_window(make_shop):
+    shop = make_shop(PRODUCT_CHANGES_SETTLE_SECONDS=60)
+    seller, _ = shop.user("seller")
+    product = shop.product(seller)
+    record(product, CREATE, UPDATE, UPDATE, UPDATE)
+    ids = [change.id for change in ProductChange.query.order_by(ProductChange.id)]
+
+    rows, has_more = ProductChange.read(0, 10)
+    assert (rows, has_more) == ([], False)
+
+    # A young change holds back the settled ones after it
+    age([ids[0], ids[2], ids[3]], 120)
+    rows, has_more = ProductChange.read(0, 10)
+    assert ([row.id for row in rows], has_more) == ([ids[0]], False)
+
+    age([ids[1]], 120)
+    rows, has_more = ProductChange.read(0, 2)
+    assert ([row.id for row in rows], has_more) == (ids[:2], True)
+    rows, has_more = ProductChange.read(ids[1], 2)
+    assert ([row.id for row in rows], has_more) == (ids[2:], False)
+
+
+def test_compact_keeps_the_latest_change_and_tombstones(shop):
+    seller, _ = shop.user("seller")
+    kept, deleted, old = (shop.product(seller) for _ in range(3))
+    record(kept, CREATE, UPDATE, UPDATE)
+    record(deleted, CREATE, DELETE)
+    record(old, CREATE, DELETE)
+    age([ProductChange.query.order_by(ProductChange.id.desc()).first().id], 3 * 86400)
+
+    assert ProductChange.compact(batch_size=1) == 4
+    assert feed() == [(kept, UPDATE), (deleted, DELETE), (old, DELETE)]
+    assert ProductChange.compact() == 0
+
+    assert ProductChange.compact(tombstone_days=2) == 1
+    assert feed() == [(kept, UPDATE), (deleted, DELETE)]
@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from project.apps.products import events
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    broker = events.ProductEventBroker()
+    monkeypatch.setattr(events, "broker", broker)
+    return broker
+
+
+@pytest.fixture
+def session():
+    with Session(create_engine("sqlite://")) as session:
+        yield session
+
+
+def listen(broker, **options):
+    calls = []
+    broker.add_listener(calls.append, **options)
+    return calls
+
+
+def product(product_id):
+    return {"id": product_id, "quantity": 5, "available": 3, "price": 9.5}
+
+
+def test_hold_only_commit_skips_listing_listeners(broker, session):
+    listing = listen(broker, holds=False)
+    everything = listen(broker)
+    events.queue_product_event(session, product(1), hold=True)
+    session.commit()
+    assert listing == []
+    assert [data["id"] for data in everything[0]] == [1]
+
+
+def test_commit_with_a_listed_change_reaches_listing_listeners(broker, session):
+    listing = listen(broker, holds=False)
+    events.queue_product_event(session, product(1), hold=True)
+    events.queue_product_event(session, product(2))
+    session.commit()
+    assert [sorted(data["id"] for data in published) for published in listing] == [[1, 2]]
+
+
+def test_rollback_discards_queued_events(broker, session):
+    listing = listen(broker, holds=False)
+    session.connection()
+    events.queue_product_event(session, product(1))
+    session.rollback()
+    events.queue_product_event(session, product(2), hold=True)
+    session.commit()
+    assert listing == []
+
+
+def test_remote_events_reach_only_remote_listeners(broker):
+    local = listen(broker, remote=False)
+    tailing = listen(broker, holds=False)
+    broker.publish_many([events.product_event(product(1))], remote=True)
+    assert local == [] and len(tailing) == 1
@@ -0,0 +1,34 @@
+from project.config.extensions import db
+from project.apps.products import related
+from project.apps.products.models import RelatedProduct
+
+
+def lists():
+    found = {}
+    for row in RelatedProduct.query.order_by(RelatedProduct.product_id, RelatedProduct.rank):
+        found.setdefault(row.product_id, []).append(row.related_id)
+    return found
+
+
+def test_full_build_swaps_lists_without_emptying_the_table(shop, monkeypatch):
+    seller, _ = shop.user("seller")
+    products = [shop.product(seller) for _ in range(4)]
+    assert related.build(3, 0.0, 1000) == 4
+    before = lists()
+    assert sorted(before) == products
+    db.session.add(RelatedProduct(product_id=10**6, rank=0, related_id=products[0], score=1))
+    db.session.commit()
+
+    monkeypatch.setattr(related, "CHUNK", 1)
+    write_lists = related.write_lists
+    seen = []
+
+    def checked(new_lists):
+        # Readers between two chunks still find every list not yet swapped
+        seen.append(set(lists()))
+        write_lists(new_lists)
+
+    monkeypatch.setattr(related, "write_lists", checked)
+    assert related.build(3, 0.0, 1000, full=True) == 4
+    assert all(set(products) <= listed for listed in seen)
+    assert lists() == before
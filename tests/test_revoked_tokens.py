@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+import pytest
+from project import cache, load_models
+from project.config.extensions import db
+from project.apps.auth.models import TokenBlacklist, User
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def app(request, make_app):
+    app = make_app(CACHE_BACKEND=request.param)
+    load_models()
+    with app.app_context():
+        db.create_all()
+        user = User(
+            username="buyer", email="b@b.io", password_hash="x", role="buyer", status="active"
+        )
+        db.session.add(user)
+        db.session.commit()
+        yield app
+
+
+def revoke(jti):
+    user = User.query.first()
+    TokenBlacklist.add_token_to_blacklist(
+        jti, "access", user.id, datetime.utcnow() + timedelta(hours=1)
+    )
+
+
+def test_revoke_is_seen_by_a_later_check(app):
+    assert TokenBlacklist.is_token_revoked("jti-1") is False
+    revoke("jti-1")
+    assert TokenBlacklist.is_token_revoked("jti-1") is True
+
+
+def test_check_racing_a_revoke_does_not_cache_not_revoked(app, monkeypatch):
+    looked_up = TokenBlacklist.is_blacklisted
+
+    def revoked_after_lookup(jti):
+        found = looked_up(jti)
+        revoke(jti)  # Commits between this check's query and its cache write
+        return found
+
+    monkeypatch.setattr(TokenBlacklist, "is_blacklisted", revoked_after_lookup)
+    assert TokenBlacklist.is_token_revoked("jti-2") is True
+
+    monkeypatch.setattr(TokenBlacklist, "is_blacklisted", looked_up)
+    assert TokenBlacklist.is_token_revoked("jti-2") is True
+    assert cache.get_cache().get("revoked", "jti-2", local=False) is True
+
+
+def test_revoke_replaces_a_cached_not_revoked(app):
+    shared = cache.get_cache()
+    shared.set("revoked", "jti-3", False, 300)
+    revoke("jti-3")
+    assert shared.get("revoked", "jti-3", local=False) is True
+    assert TokenBlacklist.is_token_revoked("jti-3") is True
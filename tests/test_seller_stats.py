@@ -0,0 +1,77 @@
+from datetime import datetime
+import pytest
+from project import load_models
+from project.config.extensions import db
+from project.apps.auth.models import User
+from project.apps.invoices.models import Invoice, InvoiceItem, InvoiceStatus
+from project.apps.products.models import Product, SellerStats
+
+
+@pytest.fixture
+def app(make_app):
+    app = make_app()
+    load_models()
+    with app.app_context():
+        db.create_all()
+        yield app
+
+
+def stats(user_id):
+    row = db.session.get(SellerStats, user_id)
+    db.session.refresh(row)
+    return {counter: getattr(row, counter) for counter in SellerStats.COUNTERS}
+
+
+def test_delisting_a_product_keeps_the_sellers_sales(app):
+    seller = User(
+        username="seller", email="s@x.io", password_hash="x", role="seller", status="active"
+    )
+    db.session.add(seller)
+    db.session.flush()
+    product = Product(title="Lamp", quantity=5, price=10.0, user_id=seller.id)
+    db.session.add(product)
+    db.session.flush()
+    SellerStats.record_product(product)
+
+    invoice = Invoice(
+        status=InvoiceStatus.DONE.value,
+        owner_id=seller.id,
+        quantity=2,
+        total_price=20.0,
+        created_at=datetime.utcnow(),
+    )
+    db.session.add(invoice)
+    db.session.flush()
+    db.session.add(
+        InvoiceItem(
+            product_id=product.id,
+            buyer_invoice_id=invoice.id,
+            quantity=2,
+            unit_price=10.0,
+            seller_id=seller.id,
+        )
+    )
+    product.quantity -= 2
+    SellerStats.record_sale(seller.id, 2, 10.0)
+    db.session.commit()
+    assert stats(seller.id) == {
+        "product_count": 1,
+        "units_in_stock": 3,
+        "inventory_value": 30.0,
+        "units_sold": 2,
+        "sales_revenue": 20.0,
+    }
+
+    SellerStats.record_product(product, sign=-1)
+    db.session.delete(product)
+    db.session.commit()
+    assert stats(seller.id) == {
+        "product_count": 0,
+        "units_in_stock": 0,
+        "inventory_value": 0.0,
+        "units_sold": 2,
+        "sales_revenue": 20.0,
+    }
+    assert SellerStats.verify() == []
+    SellerStats.rebuild()
+    assert stats(seller.id)["units_sold"] == 2
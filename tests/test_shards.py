@@ -0,0 +1,90 @@
+import pytest
+from project import load_tasks
+from project.config.extensions import db
+from project.apps.jobs.models import Job, JobStatus
+from project.apps.jobs.worker import Worker
+from project.apps.products import shards
+from project.apps.products.models import Product
+
+
+@pytest.fixture
+def sharded(make_shop, tmp_path):
+    binds = {key: f"sqlite:///{tmp_path / key}.db" for key in ("s0", "s1")}
+    yield make_shop(SQLALCHEMY_BINDS=binds, PRODUCT_SHARDS="s0,s1")
+    # Flask-SQLAlchemy keeps a metadata per bind on ``db`` itself; later apps
+    # without these binds would fail to create_all
+    for key in binds:
+        db.metadatas.pop(key, None)
+
+
+def stock(product_id):
+    session = shards.for_product(product_id).session
+    product = session.get(Product, product_id, populate_existing=True)
+    return product.quantity, product.reserved
+
+
+def test_ids_carry_their_shard(sharded):
+    first, second = shards.all_shards()
+    ids = list(first.allocate_ids(3)) + list(first.allocate_ids(shards.ID_BLOCK + 1))
+    assert all(product_id % shards.MAX_SHARDS == 0 for product_id in ids)
+    assert len(set(ids)) == len(ids)
+    assert all(product_id % shards.MAX_SHARDS == 1 for product_id in second.allocate_ids(3))
+
+    # Another worker's allocator on the same database gets its own block
+    other = shards.Shard(first.index, first.key, first.engine)
+    assert not set(other.allocate_ids(3)) & set(ids)
+
+
+def test_products_are_routed_by_seller(sharded):
+    odd, _ = sharded.user("seller")
+    even, _ = sharded.user("seller")
+    odd_product = sharded.product(odd)
+    even_product = sharded.product(even)
+
+    assert shards.for_product(odd_product) is shards.for_seller(odd)
+    assert shards.for_product(even_product) is shards.for_seller(even)
+    assert shards.for_seller(odd) is not shards.for_seller(even)
+    stored = [
+        [product.id for product in shard.session.query(Product)]
+        for shard in shards.all_shards()
+    ]
+    assert stored == [[even_product], [odd_product]]
+
+    found = shards.get_products([odd_product, even_product, 10**6])
+    assert set(found) == {odd_product, even_product}
+    assert set(shards.get_products([odd_product, even_product], user_id=even)) == {
+        even_product
+    }
+
+
+def test_checkout_applies_each_shard_in_a_job(sharded):
+    load_tasks()
+    odd, _ = sharded.user("seller")
+    even, _ = sharded.user("seller")
+    products = [sharded.product(odd, quantity=5), sharded.product(even, quantity=5)]
+    _, buyer = sharded.user("buyer", balance=100.0)
+    for product_id in products:
+        response = sharded.client.post(
+            "/api/cart", json={"product_id": product_id, "quantity": 2}, headers=buyer
+        )
+        assert response.status_code == 201
+
+    response = sharded.client.post("/api/cart/checkout", headers=buyer)
+    assert response.status_code == 201
+    assert [stock(product_id) for product_id in products] == [(5, 2), (5, 2)]
+
+    jobs = Job.claim(["default"], 10, 60)
+    assert sorted(job.task for job in jobs) == ["products.apply_sale"] * 2
+    worker = Worker(sharded.app, {"default": 1}, 1)
+    for job in jobs:
+        worker.execute(job)
+    assert worker.processed["done"] == 2
+    assert [stock(product_id) for product_id in products] == [(3, 0), (3, 0)]
+    assert {job.status for job in Job.query} == {JobStatus.DONE.value}
+
+    # A sale run twice (e.g. after a visibility timeout) applies once
+    Job.query.update({"status": JobStatus.QUEUED.value})
+    db.session.commit()
+    for job in Job.claim(["default"], 10, 60):
+        worker.execute(job)
+    assert [stock(product_id) for product_id in products] == [(3, 0), (3, 0)]
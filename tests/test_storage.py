@@ -0,0 +1,136 @@
+import io
+import os
+import pytest
+from project import storage
+
+moto = pytest.importorskip("moto")
+boto3 = pytest.importorskip("boto3")
+
+BUCKET = "images"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    with moto.mock_aws():
+        boto3.client("s3").create_bucket(Bucket=BUCKET)
+        yield storage.S3Storage(BUCKET, prefix="products")
+
+
+def stored(s3, key):
+    return s3.client.get_object(Bucket=BUCKET, Key=s3.object_key(key))["Body"].read()
+
+
+def test_key_for_uses_the_base_name():
+    key = storage.key_for("uploads/products/photo.jpg")
+    assert key == storage.key_for("photo.jpg")
+    assert key.endswith("/photo.jpg") and len(key.split("/")) == 3
+    with pytest.raises(ValueError):
+        storage.key_for(".hidden")
+
+
+def test_s3_save_and_response(s3, make_app):
+    key = s3.save(io.BytesIO(b"image bytes"), "photo.png")
+    assert key == storage.key_for("photo.png")
+    assert stored(s3, key) == b"image bytes"
+    assert s3.exists(key)
+
+    with make_app().test_request_context():
+        response = s3.response(key)
+        assert response.status_code == 200
+        assert response.mimetype == "image/png"
+        assert response.headers["Content-Length"] == "11"
+        assert b"".join(response.response) == b"image bytes"
+        assert s3.response(storage.key_for("missing.png")) is None
+
+
+def test_s3_presigned_response_redirects(s3, make_app):
+    s3.presign_seconds = 60
+    key = s3.save(io.BytesIO(b"x"), "photo.png")
+    with make_app().test_request_context():
+        response = s3.response(key)
+        assert response.status_code == 302
+        assert s3.object_key(key) in response.headers["Location"]
+        assert s3.response(storage.key_for("missing.png")) is None
+
+
+def test_s3_delete(s3):
+    key = s3.save(io.BytesIO(b"x"), "photo.png")
+    s3.delete(key)
+    assert not s3.exists(key)
+    s3.delete(key)  # Deleting twice is not an error
+
+
+def test_s3_move_in_removes_the_source(s3, tmp_path):
+    source = tmp_path / "upload.part"
+    source.write_bytes(b"assembled")
+    key = s3.move_in(str(source), "photo.jpg")
+    assert stored(s3, key) == b"assembled"
+    assert not source.exists()
+
+
+def test_local_save_is_atomic(tmp_path):
+    local = storage.LocalStorage(str(tmp_path))
+    key = local.save(io.BytesIO(b"first"), "photo.png")
+
+    class Broken(io.BytesIO):
+        def read(self, *args):
+            raise OSError("connection reset")
+
+    with pytest.raises(OSError):
+        local.save(Broken(), "photo.png")
+    # The old file is untouched and no temporary file is left behind
+    assert open(local.path(key), "rb").read() == b"first"
+    assert os.listdir(os.path.dirname(local.path(key))) == ["photo.png"]
+
+
+def test_local_move_in(tmp_path):
+    local = storage.LocalStorage(str(tmp_path / "store"))
+    source = tmp_path / "upload.part"
+    source.write_bytes(b"assembled")
+    key = local.move_in(str(source), "photo.png")
+    assert open(local.path(key), "rb").read() == b"assembled"
+    assert not source.exists()
+
+
+def test_migrate_flat_file_locally(make_app):
+    app = make_app()
+    with app.app_context():
+        flat = storage.legacy_path("old.jpg")
+        os.makedirs(os.path.dirname(flat), exist_ok=True)
+        with open(flat, "wb") as file:
+            file.write(b"legacy")
+        assert list(storage.legacy_files()) == ["old.jpg"]
+
+        key = storage.migrate_file("old.jpg")
+        assert not os.path.exists(flat)
+        assert list(storage.legacy_files()) == []
+        assert open(storage.get_storage().path(key), "rb").read() == b"legacy"
+        with app.test_request_context():
+            assert storage.response("uploads/products/old.jpg").status_code == 200
+
+
+def test_migrate_flat_file_to_s3(make_app, monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    with moto.mock_aws():
+        boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BUCKET)
+        app = make_app(IMAGE_STORAGE="s3", IMAGE_S3_BUCKET=BUCKET, IMAGE_S3_REGION="us-east-1")
+        with app.app_context():
+            flat = storage.legacy_path("old.jpg")
+            os.makedirs(os.path.dirname(flat), exist_ok=True)
+            with open(flat, "wb") as file:
+                file.write(b"legacy")
+
+            key = storage.migrate_file("old.jpg")
+            s3 = storage.get_storage()
+            assert not os.path.exists(flat)
+            assert stored(s3, key) == b"legacy"
+            with app.test_request_context():
+                response = storage.response("old.jpg")
+                assert b"".join(response.response) == b"legacy"
+
+            storage.delete("old.jpg")
+            assert not s3.exists(key)
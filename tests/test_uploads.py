@@ -0,0 +1,35 @@
+from project.apps.uploads.models import Upload
+
+
+def start(shop, headers, size=100, filename="photo.png"):
+    return shop.client.post(
+        "/api/uploads", json={"filename": filename, "size": size}, headers=headers
+    )
+
+
+def test_filename_longer_than_the_column_is_rejected(shop):
+    _, seller = shop.user("seller")
+
+    response = start(shop, seller, filename="a" * 252 + ".png")
+    assert response.status_code == 400
+    assert "255" in response.get_json()["errors"][0]
+    assert start(shop, seller, filename="a" * 251 + ".png").status_code == 201
+
+
+def test_limits_are_checked_by_the_insert(make_shop):
+    shop = make_shop(UPLOAD_MAX_OPEN=2, UPLOAD_USER_QUOTA=1000)
+    user_id, seller = shop.user("seller")
+
+    assert start(shop, seller, size=600).status_code == 201
+    response = start(shop, seller, size=500)
+    assert response.status_code == 413
+    assert response.get_json()["used"] == 600
+    assert start(shop, seller, size=400).status_code == 201
+    assert start(shop, seller, size=1).status_code == 429
+    assert Upload.usage(user_id) == (2, 1000)
+
+    # What a second request that checked usage before the first committed
+    # would have tried: the insert itself refuses it
+    assert Upload.start(user_id, "late.png", 1, 60, 5, 1000) is None
+    assert Upload.start(user_id, "late.png", 1, 60, 2, 5000) is None
+    assert Upload.query.count() == 2
@@ -0,0 +1,48 @@
+import pytest
+from project import cache
+from project.config.extensions import db
+from project.apps.auth.models import User
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def shop(request, make_shop):
+    return make_shop(CACHE_BACKEND=request.param)
+
+
+def suspend(shop, user_id, admin):
+    return shop.client.put(
+        f"/api/auth/user-status?user_id={user_id}&status=suspended", headers=admin
+    )
+
+
+def test_suspension_replaces_cached_access(shop):
+    _, admin = shop.user("admin")
+    buyer, headers = shop.user("buyer")
+
+    assert User.access(buyer).status == "active"
+    assert suspend(shop, buyer, admin).status_code == 200
+    assert User.access(buyer).status == "suspended"
+    response = shop.client.post(
+        "/api/auth/increase-balance", json={"amount": 5}, headers=headers
+    )
+    assert response.status_code == 403
+
+
+def test_load_racing_a_suspension_does_not_cache_active(shop, monkeypatch):
+    _, admin = shop.user("admin")
+    buyer, _ = shop.user("buyer")
+    looked_up = db.session.get
+
+    def suspended_after_lookup(*args, **kwargs):
+        found = looked_up(*args, **kwargs)
+        monkeypatch.undo()
+        db.session.expunge(found)  # The suspension must not update this copy
+        # Commits between this check's query and its cache write
+        assert suspend(shop, buyer, admin).status_code == 200
+        return found
+
+    monkeypatch.setattr(db.session, "get", suspended_after_lookup)
+    assert User.access(buyer).status == "suspended"
+    assert User.access(buyer).status == "suspended"
+    stored = cache.get_cache().get("users", str(buyer), local=False)
+    assert stored[2] == "suspended"